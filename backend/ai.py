@@ -1,40 +1,59 @@
-import google.generativeai as genai
 from PIL import Image
+from io import BytesIO
 import os
 import re   
-import json
-from dotenv import load_dotenv
+import threading
+import time
+import catalog
+import classification_cache
+import gemini_client
+import image_preprocessing
+import pricing
 
-# 4 .Gemini API Classification Function
-def classify_book_damage(image_path):
+# ------------------ CONFIG ------------------
+MAX_CONCURRENT_CLASSIFICATIONS = int(os.getenv("MAX_CONCURRENT_CLASSIFICATIONS", "4"))  # In-flight Gemini calls per process
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "8"))  # Images per model request on batch uploads (1 disables batching)
+# --------------------------------------------
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
     """
-    Uses Gemini API to classify book damage and returns type and severity.
+    Returns the process-wide Gemini client, creating it on first use.
     """
-    load_dotenv()
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    genai.configure(api_key=GEMINI_API_KEY)  # Configure Gemini AI
-    if not GEMINI_API_KEY:
-        print("Gemini API key not loaded.")
-        return None
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+            if not GEMINI_API_KEY:
+                print("Gemini API key not loaded.")
+                return None
+            _classifier = gemini_client.ClassifierClient(GEMINI_API_KEY)
+        return _classifier
 
-    try:
-        model_name = "gemini-2.0-flash"  # Or correct model
-        model = genai.GenerativeModel(model_name)
+def load_image_part(image_path):
+    """
+    Returns (mime_type, bytes) for the image: preprocessed (upright, cropped, downscaled)
+    when enabled, otherwise the raw file, converting formats Gemini does not accept to PNG.
+    """
+    if image_preprocessing.PREPROCESS_ENABLED:
+        return image_preprocessing.preprocess_image(image_path)
+    with Image.open(image_path) as image:
+        image_format = image.format
+        if image_format in ("JPEG", "PNG", "WEBP"):
+            with open(image_path, "rb") as f:
+                return Image.MIME[image_format], f.read()
+        buffer = BytesIO()
+        image.convert("RGB").save(buffer, format="PNG")
+        return "image/png", buffer.getvalue()
 
-        try:
-            image = Image.open(image_path)
-        except FileNotFoundError:
-            print(f"Error: Image not found: {image_path}")
-            return None
-        except Exception as e:
-            print(f"Error reading image: {e}")
-            return None
+DAMAGE_OPTIONS = ["Corner Damage", "Cover Scratches", "Spine Damage", "Water Damage", "Tears or Rips", "Misprints", "Missing Dust Jacket", "Trim Issues"]
 
-        damage_options = ["Corner Damage", "Cover Scratches", "Spine Damage", "Water Damage", "Tears or Rips", "Misprints", "Missing Dust Jacket", "Trim Issues"] # Under score labels
-        # **HIGHLY REFINED PROMPT (Underscore Labels):**
-        prompt = f"""Carefully analyze the image of the book.
+# **HIGHLY REFINED PROMPT:**
+PROMPT = f"""Carefully analyze the image of the book.
         Identify the *single* most significant type of damage present.
-        You *must* choose one of the following damage types (use *exactly* these labels): {', '.join(damage_options)}.
+        You *must* choose one of the following damage types (use *exactly* these labels): {', '.join(DAMAGE_OPTIONS)}.
 
         After identifying the damage type, assess its severity on a scale of 1 to 5, where:
         1: Very Minor Damage
@@ -56,17 +75,139 @@ def classify_book_damage(image_path):
         Book Name: Scarlet
         """
 
-        response = model.generate_content([prompt, image])
+# 4 .Gemini API Classification Function
+def classify_book_damage(image_path, raise_transient=False):
+    """
+    Uses Gemini API to classify book damage and returns type and severity.
+    With raise_transient, rate limits and an open circuit raise
+    gemini_client.RetryableError / CircuitOpenError instead of returning None,
+    so a caller with a retry path can tell them from an unclassifiable image.
+    """
+    classifier = get_classifier()
+    if not classifier:
+        return None
+
+    try:
+        image = load_image_part(image_path)
+    except FileNotFoundError:
+        print(f"Error: Image not found: {image_path}")
+        return None
+    except Exception as e:
+        print(f"Error reading image: {e}")
+        return None
 
+    try:
+        response_text = classifier.generate([PROMPT, image])
         print("Gemini API response received.")
-        print(f"Gemini API response: {response.text}")
-        return response.text
+        print(f"Gemini API response: {response_text}")
+        return response_text
 
-    except Exception as e:
+    except gemini_client.ClassifierError as e:
         print(f"Error calling Gemini API: {e}")
+        if raise_transient and isinstance(e, gemini_client.TRANSIENT_ERRORS):
+            raise
         return None
-    
-    
+
+
+
+BATCH_PROMPT = f"""Carefully analyze each of the {{count}} book images that follow, numbered 1 to {{count}} in the order given.
+        For each image, identify the *single* most significant type of damage present.
+        You *must* choose one of the following damage types (use *exactly* these labels): {', '.join(DAMAGE_OPTIONS)}.
+
+        Assess its severity on a scale of 1 to 5, where:
+        1: Very Minor Damage
+        2: Minor Damage
+        3: Moderate Damage
+        4: Significant Damage
+        5: Severe Damage
+
+        Return one block per image, in order, in *exactly* the following format. Do not include any other text:
+        Image [number]:
+        Damage Type: [damage_type]
+        Severity: [severity_level]
+        Author: [author]
+        Book Name: [book_name]
+
+        Example:
+        Image 1:
+        Damage Type: Corner Damage
+        Severity: 3
+        Author: Marissa Meyer
+        Book Name: Scarlet
+        """
+
+IMAGE_BLOCK_RE = re.compile(r"^\s*Image\s+(\d+)\s*:", re.IGNORECASE | re.MULTILINE)
+
+def parse_batch_response(gemini_response, count):
+    """
+    Splits a batched response into {index: extract_damage_info result} for the
+    indices (0-based) that came back well-formed.
+    """
+    pieces = IMAGE_BLOCK_RE.split(gemini_response)
+    results = {}
+    for number, block in zip(pieces[1::2], pieces[2::2]):
+        index = int(number) - 1
+        if 0 <= index < count and index not in results:
+            damage_info = extract_damage_info(block)
+            if damage_info:
+                results[index] = damage_info
+    return results
+
+def classify_book_damage_batch(image_paths):
+    """
+    Classifies several images in one model request. Returns a list of
+    extract_damage_info results (None where classification failed). If the
+    response is missing or malformed for some images, those are split in
+    half and retried, down to single-image requests. A failed request is not
+    split: the client has already retried it, and under rate limiting more,
+    smaller requests would only make things worse.
+    """
+    if len(image_paths) == 1:
+        response = classify_book_damage(image_paths[0])
+        return [extract_damage_info(response) if response else None]
+
+    classifier = get_classifier()
+    if not classifier:
+        return [None] * len(image_paths)
+
+    results = [None] * len(image_paths)
+    parts = [BATCH_PROMPT.format(count=len(image_paths))]
+    readable = []
+    for index, image_path in enumerate(image_paths):
+        try:
+            parts.append(load_image_part(image_path))
+            readable.append(index)
+        except Exception as e:
+            print(f"Error reading image {image_path}: {e}")
+    if not readable:
+        return results
+    if len(readable) < len(image_paths):
+        # Re-number so the prompt matches the images actually sent
+        sub_results = classify_book_damage_batch([image_paths[i] for i in readable])
+        for index, damage_info in zip(readable, sub_results):
+            results[index] = damage_info
+        return results
+
+    try:
+        response_text = classifier.generate(parts)
+    except gemini_client.ClassifierError as e:
+        print(f"Error calling Gemini API: {e}")
+        return results
+    print(f"Gemini API batch response received for {len(image_paths)} images.")
+    parsed = parse_batch_response(response_text, len(image_paths))
+
+    for index, damage_info in parsed.items():
+        results[index] = damage_info
+    missing = [index for index in range(len(image_paths)) if index not in parsed]
+    if missing:
+        print(f"Batch response malformed for {len(missing)} of {len(image_paths)} images; retrying in halves.")
+        middle = (len(missing) + 1) // 2
+        for half in (missing[:middle], missing[middle:]):
+            if half:
+                for index, damage_info in zip(half, classify_book_damage_batch([image_paths[i] for i in half])):
+                    results[index] = damage_info
+    return results
+
 def extract_damage_info(gemini_response):
     """
     Extracts damage type and severity from the Gemini API response.
@@ -91,43 +232,83 @@ def extract_damage_info(gemini_response):
         print("Could not extract damage type and severity.")
         return None
     
-def calculate_discounted_price(original_price, damage_type, severity):
+def classify_with_cache(image_path, digest=None, raise_transient=False):
+    """
+    Returns extract_damage_info output for the image, checking the classification cache first.
+    Pass the content digest computed at upload time to avoid re-reading the file.
+    raise_transient is passed on to classify_book_damage.
+    """
+    if classification_cache.cache.enabled and not digest:
+        digest = classification_cache.file_digest(image_path)
+    if digest:
+        cached = classification_cache.cache.get(digest, image_path)
+        if cached:
+            print(f"Classification cache hit for {image_path}")
+            return cached
+
+    started = time.perf_counter()
+    gemini_response = classify_book_damage(image_path, raise_transient)
+    if not gemini_response:
+        print("Failed to classify book damage.")
+        return None
+
+    damage_info = extract_damage_info(gemini_response)
+    if not damage_info:
+        print("Failed to extract damage information.")
+        return None
+
+    if digest:
+        classification_cache.cache.put(digest, damage_info, time.perf_counter() - started, image_path)
+    return damage_info
+
+def calculate_discounted_price(original_price, damage_type, severity, publisher=None, devaluation_rate=None):
     """
-    Calculates the discounted price based on damage type and severity.
+    Calculates the discounted price from the publisher's rules for this damage type and severity.
     """
     if not original_price or not damage_type or not severity:
         print("Missing required parameters.")
         return None
-    
-    # Load publisher rules
-    with open('publisher_rules.json', 'r') as f:
-        rules = json.load(f)
-    
-    # Get the discount rate based on damage type and severity
-    discount_rate = rules.get(damage_type, {}).get(str(severity), 0.0)
-    
-    # Calculate the discounted price
-    discounted_price = original_price * (1 - discount_rate)
-    
+
     print(f"Original Price: ${original_price:.2f}")
-    return {"discounted_price": discounted_price, "discount_rate": discount_rate}
+    return pricing.engine.price(original_price, damage_type, severity, publisher, devaluation_rate)
 
-def process_book_return(image_path, original_price, publisher):
+def classify_many_with_cache(image_paths, batch_size=None, digests=None):
     """
-    Processes a book return by classifying damage, calculating the discounted price,
-    and returning the results.
+    Batched counterpart of classify_with_cache: cached images are answered
+    from the cache and the rest are sent batch_size images per model request.
+    """
+    batch_size = batch_size or CLASSIFY_BATCH_SIZE
+    results = [None] * len(image_paths)
+    digests = list(digests) if digests else [None] * len(image_paths)
+    pending = []
+    for index, image_path in enumerate(image_paths):
+        if classification_cache.cache.enabled:
+            digests[index] = digests[index] or classification_cache.file_digest(image_path)
+            results[index] = classification_cache.cache.get(digests[index], image_path)
+        if not results[index]:
+            pending.append(index)
+
+    for start in range(0, len(pending), batch_size):
+        chunk = pending[start:start + batch_size]
+        started = time.perf_counter()
+        infos = classify_book_damage_batch([image_paths[i] for i in chunk])
+        cost_s = (time.perf_counter() - started) / len(chunk)
+        for index, damage_info in zip(chunk, infos):
+            results[index] = damage_info
+            if damage_info and digests[index]:
+                classification_cache.cache.put(digests[index], damage_info, cost_s, image_paths[index])
+    return results
+
+def build_book_entry(image_path, original_price, publisher, damage_info=None, digest=None):
+    """
+    Classifies damage (unless damage_info is given) and prices the book,
+    returning a books.json-shaped entry without writing it to the catalog.
     """ 
-    gemini_response = classify_book_damage(image_path)
-    if not gemini_response:
-        print("Failed to classify book damage.")
-        return None
-    
-    damage_info = extract_damage_info(gemini_response)
+    damage_info = damage_info or classify_with_cache(image_path, digest)
     if not damage_info:
-        print("Failed to extract damage information.")
         return None
     
-    discounted_price = calculate_discounted_price(original_price, damage_info["type"], damage_info["severity"])
+    discounted_price = calculate_discounted_price(original_price, damage_info["type"], damage_info["severity"], publisher)
     print(f"Discounted Price: ${discounted_price['discounted_price']:.2f}")
     if not discounted_price:
         print("Failed to calculate discounted price.")
@@ -143,17 +324,24 @@ def process_book_return(image_path, original_price, publisher):
         "price": discounted_price["discounted_price"],
         "img": f"/static/{image_path.split('/')[-1]}",
         "publisher": publisher,
-        "sold": False
+        "sold": False,
+        "original_price": original_price
     }
+    return book_entry
+
+def process_book_return(image_path, original_price, publisher, digest=None):
+    """
+    Processes a book return by classifying damage, calculating the discounted price,
+    and returning the results.
+    """
+    book_entry = build_book_entry(image_path, original_price, publisher, digest=digest)
+    if not book_entry:
+        return None
 
-    # Add to books.json
+    # Add to the catalog
     try:
-        with open('books.json', 'r') as f:
-            data = json.load(f)
-        data['books'].append(book_entry)  # Access the 'books' array in the dictionary
-        with open('books.json', 'w') as f:
-            json.dump(data, f, indent=2)
+        catalog.add_book(book_entry)
         return book_entry
     except Exception as e:
-        print(f"Failed to update books.json: {e}")
+        print(f"Failed to update catalog: {e}")
         return None
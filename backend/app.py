@@ -1,12 +1,25 @@
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, Request, UploadFile, File, Form, Query, Body
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import json
+from typing import Dict, List, Optional
 import os
-import shutil
 import ai
+import catalog
+import classification_cache
+import fleet_sweep
+import http_cache
+import ingest_queue
+import large_routing
 import logistics
+import revaluation
+import route_cache
+import route_jobs
+import route_updates
+import upload_storage
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,16 +40,86 @@ app.add_middleware(
 
 app.mount("/api/static", StaticFiles(directory="static"), name="static")
 
+books_snapshots = http_cache.SnapshotCache()
+routes_snapshots = http_cache.SnapshotCache(max_entries=64)
+classify_semaphore = asyncio.Semaphore(ai.MAX_CONCURRENT_CLASSIFICATIONS)  # caps in-flight Gemini calls
+SSE_POLL_INTERVAL = 0.5  # Seconds between job status checks on an event stream
+SSE_KEEPALIVE = 15.0     # Seconds of silence before a keep-alive comment
+
 @app.get("/api")
 async def root():
     return {"message": "Hello World"}
 
 @app.get("/api/books")
-async def get_books():
-    with open('books.json', 'r') as f:
-        data = json.load(f)
-    return data
+async def get_books(
+    request: Request,
+    q: Optional[str] = None,
+    name: Optional[str] = None,
+    damage_level: Optional[List[int]] = Query(None),
+    publisher: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sold: Optional[bool] = None,
+    sort: str = "oldest",
+    limit: int = Query(catalog.DEFAULT_PAGE_SIZE, ge=1, le=catalog.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    # Serialized pages are reused until the catalog version changes
+    version, updated_at = await run_in_threadpool(catalog.catalog_version)
+    key = (version, tuple(sorted(request.query_params.multi_items())))
+    snapshot = books_snapshots.get(key)
+    if snapshot is None:
+        try:
+            data = await run_in_threadpool(catalog.query_books, q, name, damage_level, publisher, min_price, max_price, sold, sort, limit, cursor)
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={"error": str(e), "status": "failed"})
+        snapshot = books_snapshots.put(key, http_cache.Snapshot(http_cache.dumps(data), last_modified=updated_at))
+    return http_cache.respond(request, snapshot)
+
 
+@app.get("/api/books/{book_id}")
+async def get_book(book_id: int):
+    book = await run_in_threadpool(catalog.get_book, book_id)
+    if book is None:
+        return JSONResponse(status_code=404, content={"error": "Book not found", "status": "failed"})
+    return JSONResponse(content=book)
+
+@app.patch("/api/books/{book_id}")
+async def update_book(book_id: int, changes: dict = Body(...)):
+    try:
+        book = await run_in_threadpool(catalog.update_book, book_id, changes)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "status": "failed"})
+    if book is None:
+        return JSONResponse(status_code=404, content={"error": "Book not found", "status": "failed"})
+    return JSONResponse(content={"book": book, "status": "success"})
+
+@app.delete("/api/books/{book_id}")
+async def delete_book(book_id: int):
+    book = await run_in_threadpool(catalog.delete_book, book_id)
+    if book is None:
+        return JSONResponse(status_code=404, content={"error": "Book not found", "status": "failed"})
+    await run_in_threadpool(delete_image_if_unused, book)
+    return JSONResponse(content={"book": book, "status": "success"})
+
+@app.post("/api/books/sold")
+async def mark_books_sold(ids: List[int] = Body(..., embed=True), sold: bool = Body(True, embed=True)):
+    """
+    Checkout: marks all the books sold in one write, or none of them if any is
+    unknown or already sold.
+    """
+    try:
+        updated = await run_in_threadpool(catalog.set_sold, ids, sold)
+    except catalog.BookConflict as e:
+        return JSONResponse(status_code=409, content={
+            "error": str(e), "missing": e.missing, "conflicts": e.conflicts, "status": "failed"})
+    return JSONResponse(content={"updated": updated, "status": "success"})
+
+def delete_image_if_unused(book):
+    # Uploads are stored by content hash, so another book may share the file
+    img = book.get("img")
+    if img and not catalog.image_in_use(img):
+        upload_storage.delete_image(img)
 
 @app.post("/api/upload-image")
 async def upload_image(
@@ -45,56 +128,316 @@ async def upload_image(
     file: UploadFile = File(...)
 ):    
     try:
-        # Create static directory if it doesn't exist
-        os.makedirs("static", exist_ok=True)
-        
-        # Save the file to the static directory
-        file_path = os.path.join("static", file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        book_entry = ai.process_book_return(file_path, original_price, publisher)
+        # Stream the file into the static directory under its content hash
+        file_path, digest = await upload_storage.save_upload(file)
+
+        # Decoding, preprocessing and the model call run in the threadpool, off the event loop
+        book_entry = await run_in_threadpool(ai.process_book_return, file_path, original_price, publisher, digest)
         
             
         return JSONResponse(content={"book": book_entry, "status": "success"})
+    except upload_storage.UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e), "status": "failed"})
     except Exception as e:
         return JSONResponse(content={"error": str(e), "status": "failed"})
 
+@app.post("/api/ingest")
+async def ingest_image(
+    publisher: str = Form(...),
+    original_price: float = Form(...),
+    file: UploadFile = File(...)
+):
+    """
+    Queues a return upload and answers immediately; poll /api/ingest/jobs/{job_id}
+    or follow /api/ingest/jobs/{job_id}/events for progress.
+    """
+    try:
+        file_path, digest = await upload_storage.save_upload(file)
+        job_id = await run_in_threadpool(ingest_queue.enqueue, file_path, original_price, publisher, digest, file.filename)
+    except upload_storage.UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"error": str(e), "status": "failed"})
+    except ingest_queue.QueueFull as e:
+        return JSONResponse(status_code=429, content={"error": str(e), "status": "failed"})
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"},
+                        headers={"Location": f"/api/ingest/jobs/{job_id}"})
+
+@app.get("/api/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = await run_in_threadpool(ingest_queue.get_job, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found", "status": "failed"})
+    return JSONResponse(content=job)
+
+@app.get("/api/ingest/jobs/{job_id}/events")
+async def stream_ingest_job(request: Request, job_id: str):
+    """
+    Server-sent events: one "progress" event per stage change, ending after done or failed.
+    """
+    job = await run_in_threadpool(ingest_queue.get_job, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found", "status": "failed"})
+
+    async def events(job):
+        last_seen = None
+        idle = 0.0
+        while True:
+            seen = (job["status"], job["stage"], job["attempts"])
+            if seen != last_seen:
+                last_seen, idle = seen, 0.0
+                yield f"event: progress\ndata: {json.dumps(job)}\n\n"
+            elif idle >= SSE_KEEPALIVE:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            if job["status"] in ingest_queue.FINISHED or await request.is_disconnected():
+                return
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+            idle += SSE_POLL_INTERVAL
+            job = await run_in_threadpool(ingest_queue.get_job, job_id)
+            if job is None:
+                return
+
+    return StreamingResponse(events(job), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/api/upload-images")
+async def upload_images(
+    publisher: List[str] = Form(...),
+    original_price: List[float] = Form(...),
+    files: List[UploadFile] = File(...)
+):
+    """
+    Batch return upload. publisher and original_price are given once for the
+    whole box or once per file, in the same order as files.
+    """
+    for field, values in (("publisher", publisher), ("original_price", original_price)):
+        if len(values) not in (1, len(files)):
+            return JSONResponse(status_code=400, content={"error": f"Expected 1 or {len(files)} values for {field}", "status": "failed"})
+
+    results = [None] * len(files)
+    saved = []  # (index, file_path, digest)
+    for index, file in enumerate(files):
+        try:
+            file_path, digest = await upload_storage.save_upload(file)
+            saved.append((index, file_path, digest))
+        except Exception as e:
+            results[index] = {"filename": file.filename, "status": "failed", "error": str(e)}
+
+    # Several images go into each model request; the semaphore caps requests in flight
+    async def classify(batch):
+        try:
+            async with classify_semaphore:
+                infos = await run_in_threadpool(
+                    ai.classify_many_with_cache, [path for _, path, _ in batch], None, [digest for _, _, digest in batch])
+        except Exception as e:
+            infos = [e] * len(batch)
+        for (index, file_path, _), damage_info in zip(batch, infos):
+            filename = files[index].filename
+            if isinstance(damage_info, Exception):
+                results[index] = {"filename": filename, "status": "failed", "error": str(damage_info)}
+                continue
+            book_entry = await run_in_threadpool(
+                ai.build_book_entry,
+                file_path,
+                original_price[index if len(original_price) > 1 else 0],
+                publisher[index if len(publisher) > 1 else 0],
+                damage_info,
+            ) if damage_info else None
+            if not book_entry:
+                results[index] = {"filename": filename, "status": "failed", "error": "Could not classify book"}
+            else:
+                results[index] = {"filename": filename, "status": "success", "book": book_entry}
+
+    batch_size = max(1, ai.CLASSIFY_BATCH_SIZE)
+    await asyncio.gather(*(classify(saved[start:start + batch_size]) for start in range(0, len(saved), batch_size)))
+
+    # One catalog write for the whole batch
+    books = [result["book"] for result in results if result["status"] == "success"]
+    if books:
+        try:
+            await run_in_threadpool(catalog.add_books, books)
+        except Exception as e:
+            return JSONResponse(content={"error": f"Failed to update catalog: {e}", "results": results, "status": "failed"})
+
+    return JSONResponse(content={
+        "results": results,
+        "succeeded": len(books),
+        "failed": len(results) - len(books),
+        "status": "success" if len(books) == len(results) else "partial" if books else "failed",
+    })
+
+def route_options(mode, multi_depot, capacity, max_route_length):
+    # Keyword options shared by logistics.return_routes and logistics.route_cache_key
+    options = {"multi_depot": multi_depot}
+    if mode == "capacitated":
+        options.update(capacitated=True, capacity=capacity, max_route_length=max_route_length)
+    return options
+
+def trucks_error(mode, num_trucks, capacity):
+    # K-Means needs a cluster count; capacitated routes need trucks to split demand over unless capacity is set
+    needs_trucks = mode == "supervised" or (mode == "capacitated" and not (capacity or logistics.VRP_CAPACITY))
+    if needs_trucks and num_trucks < 1:
+        return JSONResponse(status_code=422, content={"error": f"{mode} routing needs num_trucks >= 1", "status": "failed"})
+    return None
+
 @app.post("/api/routes")
-async def get_routes(mode: str = Form(...), num_trucks: int = Form(...)):
+async def get_routes(request: Request, mode: str = Form(...), num_trucks: int = Form(...), time_budget_ms: int = Form(0),
+                     multi_depot: bool = Form(False), capacity: Optional[float] = Form(None, gt=0),
+                     max_route_length: Optional[float] = Form(None, gt=0)):
+    """
+    mode is "supervised" (K-Means over num_trucks), "unsupervised" (DBSCAN) or
+    "capacitated" (capacity- and length-constrained round trips over num_trucks).
+    """
     print(f"Generating routes for {mode} with {num_trucks} trucks")
-    data = logistics.return_routes(mode == "supervised", num_trucks)
-    return JSONResponse(content={"plot": data["plot"], "report": data["report"]})
+    error = trucks_error(mode, num_trucks, capacity)
+    if error is not None:
+        return error
+    options = route_options(mode, multi_depot, capacity, max_route_length)
+    known_k = mode == "supervised"
+    data = await run_in_threadpool(logistics.cached_routes, known_k, num_trucks, time_budget_ms, **options)
+    if data is None and await run_in_threadpool(logistics.count_delivery_stores) > route_jobs.SYNC_MAX_STOPS:
+        # Large inputs are solved as a background job; poll /api/routes/jobs/{job_id}
+        return await submit_route_job(mode, num_trucks, time_budget_ms, multi_depot, capacity, max_route_length)
+    if data is None:
+        data = await route_jobs.run(known_k, num_trucks, time_budget_ms, **options)
+    # Repairs and sweeps replace the cached plan under the same key; the revision tells them apart
+    cache_key = await run_in_threadpool(logistics.route_cache_key, known_k, num_trucks, time_budget_ms, **options)
+    key = (cache_key, route_cache.routes_cache.revision(cache_key))
+    snapshot = routes_snapshots.get(key) if key[1] is not None else None
+    if snapshot is None:
+        snapshot = http_cache.Snapshot(http_cache.dumps({"plot": data["plot"], "report": data["report"]}))
+        if key[1] is not None:
+            routes_snapshots.put(key, snapshot)
+    return http_cache.respond(request, snapshot)
+
+@app.post("/api/routes/jobs")
+async def submit_route_job(mode: str = Form(...), num_trucks: int = Form(...), time_budget_ms: int = Form(0),
+                           multi_depot: bool = Form(False), capacity: Optional[float] = Form(None, gt=0),
+                           max_route_length: Optional[float] = Form(None, gt=0)):
+    error = trucks_error(mode, num_trucks, capacity)
+    if error is not None:
+        return error
+    options = route_options(mode, multi_depot, capacity, max_route_length)
+    try:
+        job_id = route_jobs.submit(mode == "supervised", num_trucks, time_budget_ms, **options)
+    except route_jobs.JobQueueFull as e:
+        return JSONResponse(status_code=429, content={"error": str(e), "status": "failed"})
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+
+@app.post("/api/routes/sweep")
+async def sweep_fleet_size(min_trucks: int = Form(1, ge=1), max_trucks: int = Form(6, ge=1), eps: str = Form(""),
+                           time_budget_ms: int = Form(0, ge=0)):
+    """
+    Solves K-Means for every truck count in [min_trucks, max_trucks] and DBSCAN
+    for each comma-separated eps value (km, or "auto" for the k-distance knee), in parallel, and returns the candidates
+    with their Pareto front, a recommended plan and that plan's plot and report.
+    """
+    try:
+        eps_values = [None if value.strip().lower() == "auto" else float(value) for value in eps.split(",") if value.strip()]
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "eps must be comma-separated numbers or auto", "status": "failed"})
+    delivery_stores = await run_in_threadpool(logistics.count_delivery_stores)
+    truck_counts = range(min_trucks, min(max_trucks, delivery_stores) + 1)
+    if any(value is not None and value <= 0 for value in eps_values) or not (len(truck_counts) or eps_values):
+        return JSONResponse(status_code=400, content={"error": "Nothing to sweep", "status": "failed"})
+    if len(truck_counts) + len(eps_values) > fleet_sweep.MAX_CANDIDATES:
+        return JSONResponse(status_code=400, content={
+            "error": f"At most {fleet_sweep.MAX_CANDIDATES} candidates per sweep", "status": "failed"})
+    data = await fleet_sweep.sweep(truck_counts, eps_values, time_budget_ms)
+    return Response(content=http_cache.dumps(data), media_type="application/json")
+
+@app.patch("/api/routes/requirements")
+async def update_delivery_requirements(changes: Dict[str, bool] = Body(..., embed=True), mode: str = Body("unsupervised", embed=True),
+                                       num_trucks: int = Body(0, embed=True), time_budget_ms: int = Body(0, embed=True),
+                                       multi_depot: bool = Body(False, embed=True), capacity: Optional[float] = Body(None, embed=True, gt=0),
+                                       max_route_length: Optional[float] = Body(None, embed=True, gt=0)):
+    """
+    Diff-style update: {"changes": {"Store name": true | false}, ...routing options}.
+    Saves the delivery flags, then repairs the last plan for those options
+    in place of a full solve where possible. The result has an "update" entry.
+    """
+    error = trucks_error(mode, num_trucks, capacity)
+    if error is not None:
+        return error
+    options = route_options(mode, multi_depot, capacity, max_route_length)
+    try:
+        data = await route_updates.apply(changes, mode == "supervised", num_trucks, time_budget_ms, **options)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e), "status": "failed"})
+    return Response(content=http_cache.dumps({"plot": data["plot"], "report": data["report"], "update": data["update"]}),
+                    media_type="application/json")
+
+@app.get("/api/routes/jobs/{job_id}")
+async def get_route_job(request: Request, job_id: str):
+    job = route_jobs.get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found", "status": "failed"})
+    return http_cache.respond(request, http_cache.Snapshot(http_cache.dumps(job)))
+
+@app.get("/api/stores/nearby")
+async def get_nearby_stores(lat: float, lon: float, k: Optional[int] = Query(None, ge=1),
+                            radius_km: Optional[float] = Query(None, gt=0), type: Optional[str] = None):
+    """
+    Stores closest to a point: the k nearest, those within radius_km, or both (k nearest within the radius).
+    """
+    if k is None and radius_km is None:
+        return JSONResponse(status_code=400, content={"error": "Give k, radius_km or both", "status": "failed"})
+    stores = await run_in_threadpool(logistics.nearby_stores, lat, lon, k, radius_km, type)
+    return JSONResponse(content={"stores": stores, "status": "success"})
+
+@app.get("/api/metrics")
+async def get_metrics():
+    classifier = ai.get_classifier()
+    return {
+        "classifier": classifier.metrics() if classifier else None,
+        "classification_cache": classification_cache.cache.stats(),
+    }
+
+@app.post("/api/admin/revalue")
+async def revalue_catalog(request: Request, dry_run: bool = Form(False)):
+    """
+    Reprices every unsold book from the current rules and stock age.
+    Set ADMIN_TOKEN to require a matching X-Admin-Token header.
+    """
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if admin_token and request.headers.get("x-admin-token") != admin_token:
+        return JSONResponse(status_code=403, content={"error": "Forbidden", "status": "failed"})
+    try:
+        report = await run_in_threadpool(revaluation.revalue, dry_run)
+    except revaluation.RevaluationRunning as e:
+        return JSONResponse(status_code=409, content={"error": str(e), "status": "failed"})
+    return JSONResponse(content={**report, "status": "success"})
+
+@app.on_event("startup")
+def create_classifier():
+    # One long-lived Gemini client per process instead of one per upload
+    ai.get_classifier()
+
+@app.on_event("startup")
+def start_ingest_workers():
+    # Also resumes jobs left unfinished by a previous run
+    ingest_queue.start()
+
+@app.on_event("shutdown")
+def shutdown_route_workers():
+    route_jobs.shutdown()
+    fleet_sweep.shutdown()
+    large_routing.shutdown()
+
+@app.on_event("shutdown")
+def stop_ingest_workers():
+    ingest_queue.stop()
 
 
 @app.get("/api/delete")
 async def delete_trajelon():
     try:
-        # Read the current books
-        with open('books.json', 'r') as f:
-            books = json.load(f)
-        
-        # Find and remove Trajelon entry, saving the image filename
-        trajelon_entry = None
-        for index, book in enumerate(books['books']):
-            if book.get('name', '').lower() == 'trajelon':
-                trajelon_entry = book
-                books['books'].pop(index)
-                break
-        
+        # Remove the Trajelon entry, keeping it to find the image filename
+        trajelon_entry = catalog.delete_book_by_name('trajelon')
         if not trajelon_entry:
             return JSONResponse(content={"error": "Trajelon entry not found", "status": "failed"})
-            
-        # Save updated books.json
-        with open('books.json', 'w') as f:
-            json.dump(books, f, indent=4)
-            
-        # Delete the image file if it exists
-        image_path = os.path.join("static", trajelon_entry.get('img', ''))
-        if os.path.exists(image_path):
-            os.remove(image_path)
+
+        # Delete the image file unless another book still uses it
+        delete_image_if_unused(trajelon_entry)
             
         return JSONResponse(content={"message": "Trajelon entry and image deleted successfully", "status": "success"})
     except Exception as e:
         return JSONResponse(content={"error": str(e), "status": "failed"})
-
@@ -0,0 +1,76 @@
+'''
+Benchmark: per-book latency and throughput at different classification batch sizes
+
+Classifies a box of books through the local Gemini stub with a fixed number of
+requests in flight, packing batch_size images into each request. The stub
+charges a fixed cost per request plus a smaller cost per image.
+    python benchmarks/bench_batch_classify.py --books 40 --batch-sizes 1 2 4 8 16
+
+'''
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import ai
+import gemini_client
+from gemini_stub import serve_in_thread
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=40)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--concurrency', type=int, default=ai.MAX_CONCURRENT_CLASSIFICATIONS)
+    parser.add_argument('--latency-ms', type=float, default=600, help='fixed cost per request')
+    parser.add_argument('--ms-per-image', type=float, default=60, help='extra cost per image in a request')
+    args = parser.parse_args()
+
+    server, base_url = serve_in_thread(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 10,
+                                       ms_per_image=args.ms_per_image)
+    ai._classifier = gemini_client.ClassifierClient('stub', api_base=base_url, rpm=60000, burst=args.concurrency)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.books):
+            path = os.path.join(tmp, f'book_{i}.jpg')
+            y, x = np.mgrid[0:600, 0:400]
+            pixels = np.stack([x * 255 // 400, y * 255 // 600, np.full_like(x, i * 6)], axis=-1)
+            pixels = np.clip(pixels + rng.normal(0, 6, pixels.shape), 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(path, quality=85)
+            paths.append(path)
+
+        rows = []
+        for batch_size in args.batch_sizes:
+            batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+            started = time.perf_counter()
+
+            def run(batch):
+                results = ai.classify_book_damage_batch(batch)
+                assert all(results), 'stub returned a malformed batch'
+                return time.perf_counter() - started
+
+            with contextlib.redirect_stdout(io.StringIO()):  # ai logs every parsed result
+                with ThreadPoolExecutor(args.concurrency) as pool:
+                    finished = list(pool.map(run, batches))
+            wall = time.perf_counter() - started
+            per_book = sum(done * len(batch) for done, batch in zip(finished, batches)) / len(paths)
+            rows.append((batch_size, len(batches), per_book, wall))
+
+    print(f"{'batch size':>10} {'requests':>9} {'avg per-book latency (s)':>25} {'wall (s)':>9} {'books/s':>8}")
+    for batch_size, requests, per_book, wall in rows:
+        print(f"{batch_size:>10} {requests:>9} {per_book:>25.2f} {wall:>9.2f} {args.books / wall:>8.1f}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
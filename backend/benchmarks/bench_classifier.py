@@ -0,0 +1,57 @@
+'''
+Benchmark: classifier client against the local Gemini stub
+
+Fires concurrent classifications at a stub that injects latency and 429s,
+then prints the client's retry, throttling, breaker and latency metrics.
+    python benchmarks/bench_classifier.py --requests 40 --concurrency 4 --rate-429 0.2
+
+'''
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gemini_client
+from gemini_stub import serve_in_thread
+
+# 1x1 PNG
+TINY_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--rate-429", type=float, default=0.2)
+    parser.add_argument("--rpm", type=float, default=600)
+    args = parser.parse_args()
+
+    server, base_url = serve_in_thread(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 4, rate_429=args.rate_429)
+    gemini_client.BACKOFF_BASE = 0.1  # keep the run short; the shape of the backoff is unchanged
+    client = gemini_client.ClassifierClient("stub", api_base=base_url, rpm=args.rpm, burst=args.concurrency)
+
+    def classify(_):
+        try:
+            client.generate(["Classify this book.", ("image/png", TINY_PNG)])
+            return True
+        except gemini_client.ClassifierError:
+            return False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        succeeded = sum(pool.map(classify, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    print(f"{succeeded}/{args.requests} succeeded in {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+    for key, value in client.metrics().items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+'''
+Benchmark: large-instance routing (chunked ingestion, grid / mini-batch clustering, parallel tours)
+
+Run from the backend directory:
+    python benchmarks/bench_large.py [--sizes 10000 100000 1000000] [--trucks 32] [--time-budget-ms 0] [--baseline-limit 100000]
+
+Each size writes synthetic location and requirement CSVs to a temporary
+directory, then times every stage and records its peak traced memory in this
+process (tracemalloc, which includes NumPy buffers). Worker memory is the
+largest resident set of any child process. The baseline is the DataFrame
+pipeline's full merge and KMeans(n_init=10). It is skipped past
+--baseline-limit points.
+'''
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cost_matrix
+import large_routing
+
+
+def synthetic_files(n, directory, seed=0):
+    # Southern Ontario: most points around a few cities, the rest spread out
+    rng = np.random.default_rng(seed)
+    cities = np.array([[43.65, -79.38], [45.42, -75.70], [43.26, -79.87], [42.98, -81.25], [43.45, -80.49], [44.23, -76.49]])
+    urban = int(n * 0.8)
+    coords = np.vstack((cities[rng.integers(0, len(cities), urban)] + rng.normal(0, 0.08, (urban, 2)),
+                        np.column_stack((rng.uniform(42.0, 45.5, n - urban), rng.uniform(-83.0, -75.5, n - urban)))))
+    names = np.array([f'Store {i}' for i in range(n)], dtype=object)
+    types = np.where(rng.random(n) < 0.01, 'Indigo', 'Retailer')
+    types[0] = 'Indigo'
+    flags = np.where(rng.random(n) < 0.9, 'Yes', 'No')
+    flags[0] = 'Yes'
+    locations, requirements = os.path.join(directory, 'locations.csv'), os.path.join(directory, 'requirements.csv')
+    pd.DataFrame({'Name': names, 'Latitude': coords[:, 0], 'Longitude': coords[:, 1], 'Type': types}).to_csv(locations, index=False)
+    pd.DataFrame({'Name': names, 'RequiresDelivery': flags}).to_csv(requirements, index=False)
+    return locations, requirements
+
+def measured(fn, *args, **kwargs):
+    # (result, seconds, peak traced MB)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    seconds = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+def baseline(locations, requirements, trucks):
+    merged = pd.merge(pd.read_csv(locations), pd.read_csv(requirements), on='Name')
+    stops = merged[merged['RequiresDelivery'] == 'Yes'].copy()
+    stops['Cluster'] = KMeans(n_clusters=trucks, random_state=0, n_init=10).fit(stops[['Latitude', 'Longitude']].values).labels_
+    return [group.to_dict('records') for _, group in stops.groupby('Cluster')]
+
+def bench(n, trucks, time_budget_ms, baseline_limit):
+    with tempfile.TemporaryDirectory() as directory:
+        locations, requirements = synthetic_files(n, directory)
+        rows = []
+        table, seconds, peak = measured(large_routing.load_stores, locations, requirements)
+        rows.append(("chunked ingest", seconds, peak, ""))
+        depot = table.starting_store()
+        stops = table.delivery_stops()
+        stops = stops[stops != depot]
+        coords = table.coords[stops]
+
+        labels = {}
+        for scheme in ("grid", "minibatch"):
+            labels[scheme], seconds, peak = measured(large_routing.cluster, coords, trucks, scheme)
+            sizes = np.bincount(labels[scheme])
+            rows.append((f"cluster ({scheme})", seconds, peak, f"{sizes.min()}-{sizes.max()} stops per cluster"))
+
+        routes, seconds, peak = measured(large_routing.route_clusters, table.coords[depot], coords, labels["grid"], time_budget_ms)
+        km = sum(cost_matrix.haversine_legs_km(np.vstack((table.coords[depot], coords[route]))).sum() for route in routes)
+        rows.append((f"tours ({large_routing.LARGE_WORKERS} workers)", seconds, peak, f"{km:,.0f} km"))
+
+        if n <= baseline_limit:
+            _, seconds, peak = measured(baseline, locations, requirements, trucks)
+            rows.append(("baseline merge + KMeans", seconds, peak, "no tours"))
+
+    worker_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    print(f"\n{n:,} points, {len(stops) + 1:,} need delivery, {trucks} trucks (largest worker so far: {worker_mb:.0f} MB)")
+    print(f"  {'stage':<26} {'time (s)':>9} {'peak (MB)':>10}")
+    for name, seconds, peak, note in rows:
+        print(f"  {name:<26} {seconds:9.2f} {peak:10.1f}  {note}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--trucks', type=int, default=32)
+    parser.add_argument('--time-budget-ms', type=int, default=0, help='tour improvement budget over all clusters')
+    parser.add_argument('--baseline-limit', type=int, default=100_000)
+    args = parser.parse_args()
+    try:
+        for n in args.sizes:
+            bench(n, args.trucks, args.time_budget_ms, args.baseline_limit)
+    finally:
+        large_routing.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+'''
+Benchmark: raw uploads vs preprocessed images sent to the classifier
+
+Generates phone-sized photos (with a uniform border and an EXIF rotation),
+then classifies each through the local Gemini stub twice: once sending the
+raw file, once after image_preprocessing. The stub charges latency per MB
+of request body, approximating upload time plus model input cost.
+    python benchmarks/bench_preprocess.py --images 8 --ms-per-mb 250
+
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import gemini_client
+import image_preprocessing
+from gemini_stub import serve_in_thread
+
+
+def synthetic_photo(path, seed, size=(4032, 3024), border=200):
+    rng = np.random.default_rng(seed)
+    width, height = size
+    # Smooth gradients plus noise compress like a real photo rather than like flat colour
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([(x * 255 // width), (y * 255 // height), ((x + y) * 255 // (width + height))], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 18, base.shape), 0, 255).astype(np.uint8)
+    pixels[:border], pixels[-border:], pixels[:, :border], pixels[:, -border:] = 245, 245, 245, 245
+    image = Image.fromarray(pixels)
+    exif = image.getexif()
+    exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise
+    image.save(path, format='JPEG', quality=92, exif=exif)
+
+
+def raw_part(path):
+    with open(path, 'rb') as f:
+        return 'image/jpeg', f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=400)
+    parser.add_argument('--ms-per-mb', type=float, default=250)
+    args = parser.parse_args()
+
+    server, base_url = serve_in_thread(latency_ms=args.latency_ms, jitter_ms=0, ms_per_mb=args.ms_per_mb)
+    client = gemini_client.ClassifierClient('stub', api_base=base_url, rpm=6000, burst=args.images)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(tmp, f'book_{i}.jpg')
+            synthetic_photo(path, i)
+            paths.append(path)
+
+        print(f"{'path':<14} {'avg bytes sent':>16} {'avg prep (ms)':>14} {'avg end-to-end (ms)':>20}")
+        for label, load in (('raw', raw_part), ('preprocessed', image_preprocessing.preprocess_image)):
+            sent, prep, total = [], [], []
+            for path in paths:
+                started = time.perf_counter()
+                part = load(path)
+                prepared = time.perf_counter()
+                client.generate(['Classify this book.', part])
+                finished = time.perf_counter()
+                sent.append(len(part[1]))
+                prep.append(prepared - started)
+                total.append(finished - started)
+            print(f"{label:<14} {np.mean(sent):16,.0f} {np.mean(prep) * 1000:14.1f} {np.mean(total) * 1000:20.1f}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+Benchmark: KD-tree store lookups vs brute force, and single- vs multi-depot plans
+
+Run from the backend directory:
+    python benchmarks/bench_spatial.py [--sizes 1000 10000 100000] [--queries 1000] [--depots 8] [--stops 2000]
+
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import logistics
+import spatial_index
+import store_table
+
+
+def random_points(n, rng):
+    # Southern Ontario, roughly Windsor to Ottawa
+    return np.column_stack((rng.uniform(42.0, 45.5, n), rng.uniform(-83.0, -75.5, n)))
+
+def brute_force_nearest(stores, points):
+    a, b = spatial_index.to_unit_sphere(points), spatial_index.to_unit_sphere(stores)
+    best = np.empty(len(a), dtype=np.intp)
+    for start in range(0, len(a), 256):  # bounded memory for the distance block
+        block = a[start:start + 256]
+        best[start:start + 256] = np.argmin(((block[:, None, :] - b[None, :, :]) ** 2).sum(axis=2), axis=1)
+    return best
+
+def bench_lookups(sizes, queries, rng):
+    print(f"{'stores':>8} {'build (ms)':>11} {'tree (us/q)':>12} {'brute (us/q)':>13} {'speedup':>9}  same")
+    points = random_points(queries, rng)
+    for n in sizes:
+        stores = random_points(n, rng)
+        t0 = time.perf_counter()
+        index = spatial_index.StoreIndex(stores)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        _, tree = index.nearest(points)
+        tree_us = (time.perf_counter() - t0) / queries * 1e6
+
+        t0 = time.perf_counter()
+        brute = brute_force_nearest(stores, points)
+        brute_us = (time.perf_counter() - t0) / queries * 1e6
+        print(f"{n:>8} {build_ms:11.1f} {tree_us:12.2f} {brute_us:13.2f} {brute_us / tree_us:8.1f}x  {'yes' if (tree == brute).all() else 'NO'}")
+
+def bench_depots(num_depots, num_stops, num_trucks, rng):
+    # Greater Toronto Area, with depots spread over the same area
+    depots = np.column_stack((rng.uniform(43.58, 43.85, num_depots), rng.uniform(-79.64, -79.12, num_depots)))
+    stops = np.column_stack((rng.uniform(43.58, 43.85, num_stops), rng.uniform(-79.64, -79.12, num_stops)))
+    stores = pd.DataFrame({
+        'Name': [f'Depot {i}' for i in range(num_depots)] + [f'Store {i}' for i in range(num_stops)],
+        'Latitude': np.concatenate((depots[:, 0], stops[:, 0])),
+        'Longitude': np.concatenate((depots[:, 1], stops[:, 1])),
+        'Type': ['Indigo'] * num_depots + ['Retailer'] * num_stops,
+        'RequiresDelivery': 'Yes',
+    })
+    table = store_table.StoreTable.from_frame(stores)
+    retailers = np.flatnonzero(~table.rows['indigo'])
+    first_depot = 0
+
+    t0 = time.perf_counter()
+    single = logistics.apply_clustering_and_tsp(table, retailers, 'K', num_trucks, first_depot)
+    single_s = time.perf_counter() - t0
+    single_km = logistics.write_route_report(table, first_depot, single)['total_distance']
+
+    t0 = time.perf_counter()
+    routes, route_depots = logistics.plan_multi_depot(table, 'K', num_trucks)
+    multi_s = time.perf_counter() - t0
+    multi_km = logistics.write_route_report(table, first_depot, routes, route_depots)['total_distance']
+
+    print(f"\n{num_stops} stops, {num_depots} depots, {num_trucks} trucks (distance in km)")
+    print(f"  single depot: {single_km:8.3f}  {single_s:6.2f} s")
+    print(f"  multi-depot:  {multi_km:8.3f}  {multi_s:6.2f} s  ({len(routes)} routes, {(1 - multi_km / single_km) * 100:.1f}% shorter)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--depots', type=int, default=8)
+    parser.add_argument('--stops', type=int, default=2000)
+    parser.add_argument('--trucks', type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    bench_lookups(args.sizes, args.queries, rng)
+    bench_depots(args.depots, args.stops, args.trucks, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+'''
+Benchmark: dict-per-row store records vs the array-backed StoreTable
+
+Run from the backend directory:
+    python benchmarks/bench_stores.py [--sizes 1000 10000 100000] [--trucks 64]
+
+Both paths start from the same merged stores DataFrame and the same K-Means
+labels. They build nearest-neighbour routes per cluster, then the per-route
+legs and stop names a report needs. The dict path materializes
+to_dict('records') per cluster and reads Latitude / Longitude per stop, the
+way the pipeline used to. The table path uses logistics.solve_tsp over index
+arrays. For each path the table shows:
+
+- peak traced memory (tracemalloc, which includes NumPy buffers);
+- memory and Python allocator blocks still held by the routes afterwards;
+- wall time, measured separately with tracing off.
+'''
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cost_matrix
+import logistics
+import routing
+import store_table
+
+
+def synthetic_stores(n, seed=0):
+    # Greater Toronto Area, one Indigo store per hundred
+    rng = np.random.default_rng(seed)
+    types = np.where(np.arange(n) % 100 == 0, 'Indigo', 'Retailer')
+    return pd.DataFrame({
+        'Name': [f'Store {i}' for i in range(n)],
+        'Latitude': rng.uniform(43.58, 43.85, n),
+        'Longitude': rng.uniform(-79.64, -79.12, n),
+        'Type': types,
+        'RequiresDelivery': np.where(rng.random(n) < 0.9, 'Yes', 'No'),
+    })
+
+def dict_pipeline(stores_df, labels):
+    delivery_stores = stores_df[stores_df['RequiresDelivery'] == 'Yes'].copy()
+    depot = delivery_stores[delivery_stores['Type'] == 'Indigo'].iloc[0].to_dict()
+    delivery_stores['Cluster'] = labels
+    routes = {}
+    for label in set(delivery_stores['Cluster']):
+        records = delivery_stores[delivery_stores['Cluster'] == label].to_dict('records')
+        coords = np.array([(r['Latitude'], r['Longitude']) for r in records], dtype=float)
+        routes[label] = [records[i] for i in routing.nearest_neighbour_order(coords)]
+    legs = {}
+    for label, route in routes.items():
+        points = [depot] + route
+        legs[label] = (cost_matrix.haversine_legs_km([(p['Latitude'], p['Longitude']) for p in points]), [r['Name'] for r in route])
+    return routes, legs
+
+def table_pipeline(stores_df, labels):
+    table = store_table.StoreTable.from_frame(stores_df)
+    stops = table.delivery_stops()
+    depot = table.starting_store()
+    routes = {int(label): logistics.solve_tsp(table, stops[labels == label]) for label in np.unique(labels)}
+    legs = {label: (cost_matrix.haversine_legs_km(table.coords[logistics.tour_points(depot, route)]), table.names[route].tolist())
+            for label, route in routes.items()}
+    return (table, routes), legs
+
+def measure(pipeline, stores_df, labels):
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result, legs = pipeline(stores_df, labels)
+    del legs
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    held_blocks = sys.getallocatedblocks() - blocks
+    del result
+    gc.collect()
+
+    t0 = time.perf_counter()
+    pipeline(stores_df, labels)
+    return peak / 2**20, held / 2**20, held_blocks, time.perf_counter() - t0
+
+def bench(n, trucks):
+    stores_df = synthetic_stores(n)
+    coords = stores_df.loc[stores_df['RequiresDelivery'] == 'Yes', ['Latitude', 'Longitude']].to_numpy()
+    labels = KMeans(n_clusters=trucks, random_state=0, n_init=1).fit(coords).labels_
+
+    print(f"\n{n:,} stores, {len(coords):,} need delivery, {trucks} routes")
+    print(f"  {'path':<12} {'peak (MB)':>10} {'held (MB)':>10} {'held blocks':>12} {'time (s)':>9}")
+    for name, pipeline in (("dict rows", dict_pipeline), ("StoreTable", table_pipeline)):
+        peak, held, blocks, seconds = measure(pipeline, stores_df, labels)
+        print(f"  {name:<12} {peak:10.1f} {held:10.1f} {blocks:12,d} {seconds:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--trucks', type=int, default=64)
+    args = parser.parse_args()
+    for n in args.sizes:
+        bench(n, args.trucks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+Benchmark: list-based nearest-neighbour TSP vs the distance-matrix engine
+
+Run from the backend directory:
+    python benchmarks/bench_tsp.py [--sizes 1000 10000 50000] [--legacy-limit 10000]
+
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import routing
+
+
+# Original solve_tsp from logistics.py, kept here as the baseline
+def legacy_calculate_distance(coord1, coord2):
+    return np.sqrt((coord1[0] - coord2[0])**2 + (coord1[1] - coord2[1])**2)
+
+def legacy_solve_tsp(retailers):
+    if not retailers:
+        return []
+    start = retailers[0]
+    path = [start]
+    must_visit = retailers[1:]
+    while must_visit:
+        nearest = min(must_visit, key=lambda x: legacy_calculate_distance(
+            (path[-1]['Latitude'], path[-1]['Longitude']), (x['Latitude'], x['Longitude'])))
+        path.append(nearest)
+        must_visit.remove(nearest)
+    return path
+
+
+def synthetic_stores(n, seed=0):
+    # Stores scattered over roughly the Greater Toronto Area
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(43.58, 43.85, n)
+    lon = rng.uniform(-79.64, -79.12, n)
+    return [{'Name': f'Store {i}', 'Latitude': lat[i], 'Longitude': lon[i]} for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='largest size to time the legacy solver on; larger sizes are extrapolated (O(n^2))')
+    args = parser.parse_args()
+
+    print(f"{'stops':>8} {'legacy (s)':>14} {'matrix (s)':>12} {'speedup':>10}  same route")
+    last_legacy = None  # (n, seconds) of the largest measured legacy run
+    for n in args.sizes:
+        stores = synthetic_stores(n)
+        coords = np.array([(s['Latitude'], s['Longitude']) for s in stores])
+
+        t0 = time.perf_counter()
+        order = routing.nearest_neighbour_order(coords)
+        engine_s = time.perf_counter() - t0
+
+        if n <= args.legacy_limit:
+            t0 = time.perf_counter()
+            legacy_path = legacy_solve_tsp(list(stores))
+            legacy_s = time.perf_counter() - t0
+            last_legacy = (n, legacy_s)
+            same = [s['Name'] for s in legacy_path] == [stores[i]['Name'] for i in order]
+            legacy_text = f"{legacy_s:14.3f}"
+            same_text = 'yes' if same else 'NO'
+        elif last_legacy:
+            legacy_s = last_legacy[1] * (n / last_legacy[0]) ** 2
+            legacy_text = f"{legacy_s:9.1f} est."
+            same_text = '-'
+        else:
+            legacy_s = None
+            legacy_text = f"{'skipped':>14}"
+            same_text = '-'
+
+        speedup = f"{legacy_s / engine_s:9.1f}x" if legacy_s else f"{'-':>10}"
+        print(f"{n:>8} {legacy_text} {engine_s:12.3f} {speedup}  {same_text}")
+
+
+if __name__ == '__main__':
+    main()
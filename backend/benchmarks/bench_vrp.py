@@ -0,0 +1,85 @@
+'''
+Benchmark: K-Means + TSP vs capacity-constrained routing (Clarke-Wright + local search)
+
+Run from the backend directory:
+    python benchmarks/bench_vrp.py [--sizes 100 1000 5000] [--trucks 16] [--max-route-km 0]
+
+Every plan is measured as round trips in haversine km over the same matrix.
+Loads use random demands of 1-4 units per stop; capacity is an even split
+over the trucks plus logistics.VRP_CAPACITY_SLACK.
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cost_matrix
+import logistics
+import store_table
+import vrp
+
+
+def synthetic_instance(n, seed=0):
+    # Depot downtown, stops scattered over roughly the Greater Toronto Area
+    rng = np.random.default_rng(seed)
+    stops = pd.DataFrame({
+        'Name': [f'Store {i}' for i in range(n)],
+        'Latitude': rng.uniform(43.58, 43.85, n),
+        'Longitude': rng.uniform(-79.64, -79.12, n),
+        logistics.DEMAND_COLUMN: rng.integers(1, 5, n),
+    })
+    depot = {'Name': 'Depot', 'Latitude': 43.6544, 'Longitude': -79.3807}
+    return depot, stops
+
+def describe(routes, dist, demand, capacity):
+    # Routes of indices into dist, where stop i is row i
+    loads = np.array([demand[route].sum() for route in routes])
+    km = sum(vrp.route_length(route, dist) for route in routes)
+    return km, len(routes), loads.max() / capacity, loads.min() / capacity
+
+def bench(n, trucks, max_route_km):
+    depot, stops = synthetic_instance(n)
+    table = store_table.StoreTable(['Depot'] + stops['Name'].tolist(),
+                                   np.vstack(([(depot['Latitude'], depot['Longitude'])], stops[['Latitude', 'Longitude']].to_numpy())),
+                                   np.arange(n + 1) == 0, demand=np.concatenate(([0], stops[logistics.DEMAND_COLUMN].to_numpy(dtype=float))))
+    dist = cost_matrix.haversine_km(table.coords, table.coords)
+    demand = table.rows['demand']
+    capacity = logistics.truck_capacity(demand.sum(), trucks)
+
+    rows = []
+    t0 = time.perf_counter()
+    kmeans = logistics.apply_clustering_and_tsp(table, np.arange(1, n + 1), 'K', trucks, 0)
+    rows.append(("K-Means + TSP", time.perf_counter() - t0, describe(kmeans.values(), dist, demand, capacity)))
+
+    t0 = time.perf_counter()
+    neighbours = vrp.neighbour_lists(dist)
+    savings = vrp.clarke_wright(dist, demand, capacity, max_route_km or np.inf, neighbours)
+    cw_s = time.perf_counter() - t0
+    rows.append(("Clarke-Wright", cw_s, describe(savings, dist, demand, capacity)))
+
+    t0 = time.perf_counter()
+    improved = vrp.improve(savings, dist, demand, capacity, max_route_km or np.inf, neighbours=neighbours)
+    rows.append(("  + relocate/exchange", cw_s + time.perf_counter() - t0, describe(improved, dist, demand, capacity)))
+
+    print(f"\n{n} stops, {trucks} trucks, capacity {capacity:.0f} units")
+    print(f"  {'plan':<22} {'km':>10} {'routes':>7} {'max load':>9} {'min load':>9} {'time (s)':>9}")
+    for name, seconds, (km, count, max_load, min_load) in rows:
+        print(f"  {name:<22} {km:10.1f} {count:7d} {max_load:8.0%} {min_load:8.0%} {seconds:9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--trucks', type=int, default=16)
+    parser.add_argument('--max-route-km', type=float, default=0, help='longest round trip allowed; 0 for no limit')
+    args = parser.parse_args()
+    for n in args.sizes:
+        bench(n, args.trucks, args.max_route_km)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+'''
+Local stand-in for the Gemini generateContent endpoint
+
+Simulates latency and rate limiting so the classifier client can be exercised
+without a real API key:
+    python benchmarks/gemini_stub.py --port 8765 --latency-ms 800 --rate-429 0.2
+    GEMINI_API_BASE=http://127.0.0.1:8765 GEMINI_API_KEY=stub uvicorn app:app
+
+'''
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RESPONSE = """Damage Type: Corner Damage
+Severity: 3
+Author: Marissa Meyer
+Book Name: Scarlet"""
+
+
+def make_handler(latency_ms, jitter_ms, rate_429, retry_after, ms_per_mb=0.0, ms_per_image=0.0):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the client's connection pool is exercised
+
+        def do_POST(self):
+            size = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(size)
+            images = body.count(b'"inline_data"')
+            # Larger payloads and more images take longer to process, as with the real model
+            delay_ms = latency_ms + random.uniform(-jitter_ms, jitter_ms) + ms_per_mb * size / 1e6 + ms_per_image * images
+            time.sleep(max(0.0, delay_ms) / 1000)
+            if random.random() < rate_429:
+                payload = json.dumps({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}).encode()
+                self.send_response(429)
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+            else:
+                try:
+                    parts = json.loads(body)["contents"][0]["parts"]
+                except (ValueError, KeyError, IndexError):
+                    parts = []
+                images = sum(1 for part in parts if "inline_data" in part)
+                # Batched requests get one numbered block per image
+                text = CANNED_RESPONSE if images <= 1 else "\n\n".join(
+                    f"Image {number}:\n{CANNED_RESPONSE}" for number in range(1, images + 1))
+                payload = json.dumps({"candidates": [{"content": {"parts": [{"text": text}]}}]}).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def serve_in_thread(port=0, latency_ms=500, jitter_ms=100, rate_429=0.0, retry_after=None, ms_per_mb=0.0, ms_per_image=0.0):
+    """
+    Starts the stub on a background thread; returns (server, base_url).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(latency_ms, jitter_ms, rate_429, retry_after, ms_per_mb, ms_per_image))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--ms-per-mb", type=float, default=0.0, help="extra latency per MB of request body")
+    parser.add_argument("--ms-per-image", type=float, default=0.0, help="extra latency per image in the request")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port),
+                                 make_handler(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after,
+                                              args.ms_per_mb, args.ms_per_image))
+    print(f"Gemini stub listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
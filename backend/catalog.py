@@ -0,0 +1,370 @@
+'''
+Book catalog storage (SQLite)
+
+Replaces the whole-file reads and rewrites of books.json with an indexed
+table. WAL mode lets request threads read while a write is in progress.
+books.json is imported once, the first time the database is created.
+'''
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from search_index import BookSearchIndex
+
+# ------------------ CONFIG ------------------
+CATALOG_DB = os.getenv("CATALOG_DB", "books.db")
+SEED_JSON = 'books.json'  # One-time import source
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# --------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    author TEXT,
+    publisher TEXT,
+    type TEXT,
+    damage_level INTEGER,
+    discount REAL,
+    price REAL,
+    img TEXT,
+    sold INTEGER NOT NULL DEFAULT 0,
+    original_price REAL,
+    added_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_books_name ON books (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_books_author ON books (author COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_books_publisher ON books (publisher);
+CREATE INDEX IF NOT EXISTS idx_books_damage_level ON books (damage_level);
+CREATE INDEX IF NOT EXISTS idx_books_sold ON books (sold);
+CREATE INDEX IF NOT EXISTS idx_books_img ON books (img);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# books.json field -> column
+FIELDS = {
+    "name": "name",
+    "damage-level": "damage_level",
+    "author": "author",
+    "type": "type",
+    "discount": "discount",
+    "price": "price",
+    "img": "img",
+    "publisher": "publisher",
+    "sold": "sold",
+    "original_price": "original_price",
+}
+COLUMNS = ", ".join(FIELDS.values())
+INSERT_SQL = f"INSERT INTO books ({COLUMNS}, added_at) VALUES ({', '.join('?' * len(FIELDS))}, ?)"
+
+# Fields a PATCH may change; img follows the uploaded file
+EDITABLE_FIELDS = [field for field in FIELDS if field != "img"]
+
+# Columns added after the first release: name -> type, added to older databases on open
+ADDED_COLUMNS = {
+    "original_price": "REAL",
+    "added_at": "REAL",
+}
+
+# sort name -> (SQL expression, descending)
+SORTS = {
+    "oldest": ("id", False),
+    "newest": ("id", True),
+    "name": ("IFNULL(name, '') COLLATE NOCASE", False),
+    "-name": ("IFNULL(name, '') COLLATE NOCASE", True),
+    "price": ("IFNULL(price, 0)", False),
+    "-price": ("IFNULL(price, 0)", True),
+    "damage-level": ("IFNULL(damage_level, 0)", False),
+    "-damage-level": ("IFNULL(damage_level, 0)", True),
+}
+
+class BookConflict(Exception):
+    def __init__(self, message, missing=(), conflicts=()):
+        super().__init__(message)
+        self.missing = list(missing)
+        self.conflicts = list(conflicts)
+
+
+search_index = BookSearchIndex()
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()  # database paths whose schema and seed import are done
+
+def get_connection(db_path=None):
+    """
+    Returns this thread's connection, creating the schema on first use.
+    """
+    db_path = db_path or CATALOG_DB
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        connections[db_path] = conn
+        with _init_lock:
+            if db_path not in _initialized:
+                conn.executescript(SCHEMA)
+                _migrate(conn)
+                import_books_json(conn)
+                _initialized.add(db_path)
+    return conn
+
+def _migrate(conn):
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(books)")}
+    missing = [column for column in ADDED_COLUMNS if column not in existing]
+    if not missing:
+        return
+    with conn:
+        for column in missing:
+            conn.execute(f"ALTER TABLE books ADD COLUMN {column} {ADDED_COLUMNS[column]}")
+        # Books already in the catalog start ageing from now
+        conn.execute("UPDATE books SET added_at = ? WHERE added_at IS NULL", (time.time(),))
+
+def row_to_book(row):
+    book = {"id": row["id"]}
+    book.update((field, row[column]) for field, column in FIELDS.items())
+    book["sold"] = bool(book["sold"])
+    return book
+
+def _book_values(book, added_at):
+    return tuple(bool(book.get(field, False)) if field == "sold" else book.get(field) for field in FIELDS) + (added_at,)
+
+def import_books_json(conn, path=SEED_JSON):
+    """
+    Copies books.json into an empty catalog. Runs at most once per database.
+    """
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'books_json_imported'").fetchone():
+        return 0
+    books = []
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            books = json.load(f).get('books', [])
+    with conn:
+        now = time.time()
+        conn.executemany(INSERT_SQL, [_book_values(book, now) for book in books])
+        conn.execute("INSERT INTO meta (key, value) VALUES ('books_json_imported', ?)", (str(len(books)),))
+        _bump_version(conn)
+    print(f"Imported {len(books)} books from {path}")
+    return len(books)
+
+def _bump_version(conn):
+    # Called inside every write transaction; readers use it to invalidate cached responses
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('version', '1') "
+        "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('updated_at', ?)", (str(time.time()),))
+
+def catalog_version():
+    """
+    Returns (version, updated_at). The version changes on every write to the catalog.
+    """
+    conn = get_connection()
+    meta = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('version', 'updated_at')").fetchall())
+    return int(meta.get('version', 0)), float(meta.get('updated_at', 0))
+
+def list_books():
+    conn = get_connection()
+    rows = conn.execute(f"SELECT id, {COLUMNS} FROM books ORDER BY id").fetchall()
+    return {"books": [row_to_book(row) for row in rows]}
+
+def insert_books(conn, books):
+    """
+    Inserts books inside the caller's open transaction, setting each book's
+    "id". Call search_index.refresh(conn) once it has committed.
+    """
+    now = time.time()
+    for book in books:
+        book["id"] = conn.execute(INSERT_SQL, _book_values(book, now)).lastrowid
+    _bump_version(conn)
+
+def update_prices(conn, updates):
+    """
+    Applies (price, discount, original_price, id) updates inside the caller's open transaction.
+    """
+    conn.executemany("UPDATE books SET price = ?, discount = ?, original_price = ? WHERE id = ?", updates)
+    _bump_version(conn)
+
+def add_books(books):
+    """
+    Inserts several books in one transaction.
+    """
+    conn = get_connection()
+    with conn:
+        insert_books(conn, books)
+    search_index.refresh(conn)
+
+def add_book(book):
+    add_books([book])
+    return book
+
+def _encode_cursor(value, book_id):
+    return base64.urlsafe_b64encode(json.dumps([value, book_id]).encode()).decode()
+
+def _decode_cursor(cursor):
+    try:
+        value, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return value, int(book_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def query_books(q=None, name=None, damage_levels=None, publisher=None, min_price=None, max_price=None,
+                sold=None, sort="oldest", limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Filtered, sorted page of books with keyset (cursor) pagination.
+    Returns {"books": [...], "next_cursor": str or None}.
+    """
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort '{sort}', expected one of: {', '.join(SORTS)}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    conn = get_connection()
+
+    where, params = [], []
+    if q:
+        search_index.refresh(conn)
+        ids = search_index.search(q)
+        if ids is not None:
+            if not ids:
+                return {"books": [], "next_cursor": None}
+            where.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(sorted(ids)))
+    if name is not None:
+        where.append("name = ? COLLATE NOCASE")
+        params.append(name)
+    if damage_levels:
+        where.append(f"damage_level IN ({', '.join('?' * len(damage_levels))})")
+        params.extend(damage_levels)
+    if publisher is not None:
+        where.append("publisher = ?")
+        params.append(publisher)
+    if min_price is not None:
+        where.append("price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("price <= ?")
+        params.append(max_price)
+    if sold is not None:
+        where.append("sold = ?")
+        params.append(int(bool(sold)))
+
+    expr, descending = SORTS[sort]
+    op = "<" if descending else ">"
+    if cursor:
+        value, last_id = _decode_cursor(cursor)
+        if expr == "id":
+            where.append(f"id {op} ?")
+            params.append(last_id)
+        else:
+            where.append(f"({expr} {op} ? OR ({expr} = ? AND id {op} ?))")
+            params.extend([value, value, last_id])
+
+    direction = "DESC" if descending else "ASC"
+    order = "id" if expr == "id" else f"{expr} {direction}, id"
+    sql = (f"SELECT id, {COLUMNS}, {expr} AS sort_value FROM books"
+           f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+           f" ORDER BY {order} {direction} LIMIT ?")
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["sort_value"], rows[-1]["id"])
+    return {"books": [row_to_book(row) for row in rows], "next_cursor": next_cursor}
+
+def get_book(book_id):
+    row = get_connection().execute(f"SELECT id, {COLUMNS} FROM books WHERE id = ?", (book_id,)).fetchone()
+    return row_to_book(row) if row else None
+
+def update_book(book_id, changes):
+    """
+    Applies {field: value} changes and returns the updated book, or None if the ID is unknown.
+    Raises ValueError for fields that cannot be edited.
+    """
+    unknown = [field for field in changes if field not in EDITABLE_FIELDS]
+    if unknown:
+        raise ValueError(f"Cannot edit {', '.join(unknown)}; editable fields: {', '.join(EDITABLE_FIELDS)}")
+    if not changes:
+        return get_book(book_id)
+    values = [bool(value) if field == "sold" else value for field, value in changes.items()]
+
+    conn = get_connection()
+    with conn:
+        old = conn.execute("SELECT name, author FROM books WHERE id = ?", (book_id,)).fetchone()
+        if old is None:
+            return None
+        conn.execute(f"UPDATE books SET {', '.join(f'{FIELDS[field]} = ?' for field in changes)} WHERE id = ?",
+                     values + [book_id])
+        _bump_version(conn)
+        row = conn.execute(f"SELECT id, {COLUMNS} FROM books WHERE id = ?", (book_id,)).fetchone()
+    if (old["name"], old["author"]) != (row["name"], row["author"]):
+        search_index.remove(book_id, old["name"], old["author"])
+        search_index.add(book_id, row["name"], row["author"])
+    return row_to_book(row)
+
+def set_sold(book_ids, sold=True):
+    """
+    Marks every book sold (or unsold) in one transaction and returns how many
+    changed. Raises BookConflict, changing nothing, if any ID is unknown or
+    already in that state.
+    """
+    ids = sorted({int(book_id) for book_id in book_ids})
+    conn = get_connection()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        found = dict(conn.execute(
+            "SELECT id, sold FROM books WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(ids),)
+        ).fetchall())
+        missing = [book_id for book_id in ids if book_id not in found]
+        conflicts = [book_id for book_id in ids if book_id in found and bool(found[book_id]) == sold]
+        if missing or conflicts:
+            raise BookConflict(f"{len(missing)} unknown and {len(conflicts)} already {'sold' if sold else 'unsold'}",
+                               missing, conflicts)
+        conn.execute("UPDATE books SET sold = ? WHERE id IN (SELECT value FROM json_each(?))", (int(sold), json.dumps(ids)))
+        _bump_version(conn)
+    return len(ids)
+
+def image_in_use(img):
+    return get_connection().execute("SELECT 1 FROM books WHERE img = ? LIMIT 1", (img,)).fetchone() is not None
+
+def _delete_row(conn, row):
+    conn.execute("DELETE FROM books WHERE id = ?", (row["id"],))
+    _bump_version(conn)
+
+def delete_book(book_id):
+    """
+    Deletes the book and returns it, or None if the ID is unknown.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute(f"SELECT id, {COLUMNS} FROM books WHERE id = ?", (book_id,)).fetchone()
+        if row is None:
+            return None
+        _delete_row(conn, row)
+    search_index.remove(row["id"], row["name"], row["author"])
+    return row_to_book(row)
+
+def delete_book_by_name(name):
+    """
+    Deletes the first book with this name (case-insensitive) and returns it, or None.
+    """
+    conn = get_connection()
+    with conn:
+        row = conn.execute(
+            f"SELECT id, {COLUMNS} FROM books WHERE name = ? COLLATE NOCASE ORDER BY id LIMIT 1", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        _delete_row(conn, row)
+    search_index.remove(row["id"], row["name"], row["author"])
+    return row_to_book(row)
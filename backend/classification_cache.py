@@ -0,0 +1,214 @@
+'''
+Classification cache: skip Gemini for images we have already seen
+
+Parsed extract_damage_info results are stored on disk (SQLite) keyed by the
+SHA-256 of the image bytes. In "perceptual" mode a 64-bit difference hash
+(dHash) is stored too, so re-scans of the same book that differ in bytes
+still hit. Near-duplicate lookups use multi-index hashing: the hash is split
+into 8 byte-sized bands, and any image within 7 bits must share at least one
+band exactly, so only those candidates are compared.
+'''
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+# ------------------ CONFIG ------------------
+CACHE_DB = os.getenv("CLASSIFICATION_CACHE_DB", "classification_cache.db")
+CACHE_MODE = os.getenv("CLASSIFICATION_CACHE_MODE", "exact")  # "exact", "perceptual" or "off"
+CACHE_TTL = float(os.getenv("CLASSIFICATION_CACHE_TTL_DAYS", "30")) * 86400
+CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "20000"))
+PHASH_MAX_DISTANCE = 6        # Hamming distance (bits) still treated as the same photo
+PHASH_BANDS = 8               # 8 bands of 8 bits; guarantees recall up to 7 bits
+EVICT_EVERY = 100             # Puts between eviction sweeps
+PHASH_MEMO_SIZE = 256         # dHashes of missed images kept for the put that follows
+# --------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS classifications (
+    digest TEXT PRIMARY KEY,
+    phash INTEGER,
+    result TEXT NOT NULL,
+    cost_s REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications (last_used);
+CREATE TABLE IF NOT EXISTS phash_bands (
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_phash_bands ON phash_bands (band, value);
+CREATE INDEX IF NOT EXISTS idx_phash_bands_digest ON phash_bands (digest);
+"""
+
+def file_digest(image_path, chunk_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def perceptual_hash(image_path):
+    """
+    64-bit dHash: compares horizontally adjacent pixels of a 9x8 grayscale thumbnail.
+    """
+    with Image.open(image_path) as image:
+        pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value - (1 << 63)  # store as signed so it fits SQLite's INTEGER
+
+def _bands(phash):
+    unsigned = phash + (1 << 63)
+    return [(band, (unsigned >> (8 * band)) & 0xFF) for band in range(PHASH_BANDS)]
+
+def _distance(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+
+class ClassificationCache:
+    def __init__(self, db_path=CACHE_DB, mode=CACHE_MODE, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._phashes = {}  # digest -> dHash computed by a missed get, in insertion order
+        self._counters = {"hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "saved_s": 0.0}
+
+    @property
+    def enabled(self):
+        return self.mode in ("exact", "perceptual")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _phash(self, digest, image_path):
+        # A missed get is usually followed by a put for the same image; hash it once for both
+        with self._lock:
+            phash = self._phashes.get(digest)
+        if phash is None:
+            phash = perceptual_hash(image_path)
+            with self._lock:
+                self._phashes[digest] = phash
+                if len(self._phashes) > PHASH_MEMO_SIZE:
+                    del self._phashes[next(iter(self._phashes))]
+        return phash
+
+    def _forget_phash(self, digest):
+        with self._lock:
+            self._phashes.pop(digest, None)
+
+    def get(self, digest, image_path=None):
+        """
+        Returns the cached damage info for this image, or None on a miss.
+        image_path is only needed in perceptual mode.
+        """
+        if not self.enabled:
+            return None
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute(
+            "SELECT digest, result, cost_s FROM classifications WHERE digest = ? AND created_at > ?",
+            (digest, now - self.ttl),
+        ).fetchone()
+        counter = "hits"
+        if row is None and self.mode == "perceptual" and image_path:
+            row = self._nearest(conn, self._phash(digest, image_path), now)
+            counter = "near_hits"
+        if row is None:
+            self._count("misses")
+            return None
+        self._forget_phash(digest)
+        with conn:
+            conn.execute("UPDATE classifications SET last_used = ? WHERE digest = ?", (now, row[0]))
+        self._count(counter)
+        self._count("saved_s", row[2])
+        return json.loads(row[1])
+
+    def _nearest(self, conn, phash, now):
+        bands = _bands(phash)
+        candidates = conn.execute(
+            "SELECT DISTINCT c.digest, c.result, c.cost_s, c.phash FROM phash_bands b "
+            "JOIN classifications c ON c.digest = b.digest "
+            f"WHERE ({' OR '.join('(b.band = ? AND b.value = ?)' for _ in bands)}) AND c.created_at > ?",
+            [v for band in bands for v in band] + [now - self.ttl],
+        ).fetchall()
+        best = None
+        for candidate in candidates:
+            distance = _distance(phash, candidate[3])
+            if distance <= PHASH_MAX_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, candidate[:3])
+        return best[1] if best else None
+
+    def put(self, digest, result, cost_s=0.0, image_path=None):
+        if not self.enabled or not result:
+            return
+        with self._lock:
+            phash = self._phashes.pop(digest, None)
+        if phash is None and self.mode == "perceptual" and image_path:
+            phash = perceptual_hash(image_path)
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO classifications (digest, phash, result, cost_s, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, phash, json.dumps(result), cost_s, now, now),
+            )
+            conn.execute("DELETE FROM phash_bands WHERE digest = ?", (digest,))
+            if phash is not None:
+                conn.executemany("INSERT INTO phash_bands (band, value, digest) VALUES (?, ?, ?)",
+                                 [(band, value, digest) for band, value in _bands(phash)])
+        self._count("stores")
+        with self._lock:
+            self._puts += 1
+            sweep = self._puts % EVICT_EVERY == 0
+        if sweep:
+            self.evict()
+
+    def evict(self):
+        """
+        Drops expired entries, then the least recently used ones beyond max_entries.
+        """
+        conn = self._conn()
+        with conn:
+            expired = conn.execute("DELETE FROM classifications WHERE created_at <= ?", (time.time() - self.ttl,)).rowcount
+            overflow = conn.execute(
+                "DELETE FROM classifications WHERE digest IN ("
+                "SELECT digest FROM classifications ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            conn.execute("DELETE FROM phash_bands WHERE digest NOT IN (SELECT digest FROM classifications)")
+        self._count("evictions", expired + overflow)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["near_hits"] + stats["misses"]
+        stats["saved_s"] = round(stats["saved_s"], 3)
+        stats["hit_rate"] = round((stats["hits"] + stats["near_hits"]) / lookups, 3) if lookups else None
+        stats["mode"] = self.mode
+        return stats
+
+
+cache = ClassificationCache()
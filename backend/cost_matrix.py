@@ -0,0 +1,207 @@
+'''
+Travel-cost matrices shared by every worker process
+
+A full matrix is computed once per location set with the configured metric:
+great-circle (haversine) km, equirectangular-projected km, raw Euclidean
+degrees, or travel times imported from a square CSV. It is saved as a .npy
+file named by a hash of the metric and the locations. Processes open it with
+mmap, so they share one copy in the page cache instead of each holding its
+own. Routing and reporting then slice sub-matrices out of it instead of
+recomputing distances.
+'''
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import cdist
+
+import routing
+import spatial_index
+
+# ------------------ CONFIG ------------------
+COST_METRIC = os.getenv("COST_METRIC", "haversine")  # haversine, equirectangular, euclidean or matrix
+TRAVEL_TIME_MATRIX = os.getenv("TRAVEL_TIME_MATRIX", "static/logistics/travel_times.csv")  # Used by the "matrix" metric
+MATRIX_DIR = os.getenv("COST_MATRIX_DIR", "static/logistics/cost_matrices")
+MATRIX_FILES_KEPT = 32        # Oldest .npy files beyond this are deleted
+OPEN_MATRICES_KEPT = 16       # Memory maps kept open per process
+# --------------------------------------------
+
+UNITS = {"haversine": "km", "equirectangular": "km", "euclidean": "degrees", "matrix": "time"}
+
+def _haversine(lat1, lon1, lat2, lon2):
+    # Arguments in radians; broadcasts
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * spatial_index.EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
+
+def haversine_km(a, b):
+    """
+    Pairwise great-circle distances in km between (latitude, longitude) arrays a (n, 2) and b (m, 2).
+    """
+    a, b = np.radians(np.asarray(a, dtype=float)), np.radians(np.asarray(b, dtype=float))
+    return _haversine(a[:, None, 0], a[:, None, 1], b[None, :, 0], b[None, :, 1])
+
+def haversine_legs_km(points):
+    """
+    Distances in km between consecutive (latitude, longitude) points.
+    """
+    p = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    return _haversine(p[:-1, 0], p[:-1, 1], p[1:, 0], p[1:, 1])
+
+def equirectangular_km(a, b):
+    """
+    Pairwise distances in km after projecting onto a plane at the mean latitude.
+    """
+    a, b = np.radians(np.asarray(a, dtype=float)), np.radians(np.asarray(b, dtype=float))
+    scale = np.cos(np.concatenate((a[:, 0], b[:, 0])).mean())
+    project = lambda p: spatial_index.EARTH_RADIUS_KM * np.column_stack((p[:, 1] * scale, p[:, 0]))
+    return cdist(project(a), project(b))
+
+def euclidean_degrees(a, b):
+    return cdist(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+
+METRICS = {"haversine": haversine_km, "equirectangular": equirectangular_km, "euclidean": euclidean_degrees}
+
+
+_travel_times = {}  # (path, mtime, size) -> (positions, matrix)
+
+def load_travel_times(path=TRAVEL_TIME_MATRIX):
+    """
+    Reads a square CSV of travel times whose header row and first column are store names.
+    Returns (name -> row, matrix).
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _travel_times:
+        frame = pd.read_csv(path, index_col=0)
+        missing = [name for name in frame.index if name not in frame.columns]
+        if missing:
+            raise ValueError(f"{path} has no column for: {', '.join(map(str, missing[:5]))}")
+        matrix = frame[list(frame.index)].to_numpy(dtype=float)
+        _travel_times.clear()
+        _travel_times[key] = ({name: i for i, name in enumerate(frame.index)}, matrix)
+    return _travel_times[key]
+
+def _travel_time_submatrix(names):
+    positions, matrix = load_travel_times()
+    missing = [name for name in names if name not in positions]
+    if missing:
+        raise KeyError(f"No travel times for: {', '.join(missing[:5])}")
+    idx = np.array([positions[name] for name in names], dtype=np.intp)
+    return matrix[np.ix_(idx, idx)]
+
+def compute(coords, names=None, metric=COST_METRIC):
+    if metric == "matrix":
+        return _travel_time_submatrix(names)
+    return METRICS[metric](coords, coords)
+
+
+_open = OrderedDict()  # path -> memory-mapped matrix
+_lock = threading.Lock()
+
+def matrix_key(coords, names=None, metric=COST_METRIC):
+    sha = hashlib.sha256(metric.encode())
+    sha.update(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+    if metric == "matrix":
+        stat = os.stat(TRAVEL_TIME_MATRIX)
+        sha.update(f"{TRAVEL_TIME_MATRIX}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+        sha.update("\0".join(names).encode())
+    return sha.hexdigest()
+
+def get_matrix(coords, names=None, metric=COST_METRIC):
+    """
+    Full cost matrix for the locations, read-only and memory-mapped from disk.
+    names are required by the "matrix" metric.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    path = os.path.join(MATRIX_DIR, f"{metric}-{matrix_key(coords, names, metric)[:32]}.npy")
+    with _lock:
+        matrix = _open.get(path)
+        if matrix is not None:
+            _open.move_to_end(path)
+            return matrix
+    if not os.path.exists(path):
+        _save(path, compute(coords, names, metric))
+    matrix = np.load(path, mmap_mode='r')
+    with _lock:
+        _open[path] = matrix
+        while len(_open) > OPEN_MATRICES_KEPT:
+            _open.popitem(last=False)
+    return matrix
+
+def _save(path, matrix):
+    os.makedirs(MATRIX_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(matrix, dtype=np.float64))
+    os.replace(tmp_path, path)  # other processes see the whole file or none of it
+    files = sorted((entry for entry in os.scandir(MATRIX_DIR) if entry.name.endswith('.npy')),
+                   key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in files[MATRIX_FILES_KEPT:]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+class CostMatrix:
+    """
+    Costs between stores, looked up by row: the *_at methods take index arrays
+    in the order of names / coords. Location sets too large for a full matrix
+    compute each requested sub-matrix on demand instead.
+    """
+    def __init__(self, names, coords, metric=COST_METRIC):
+        self.names = list(names)
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.metric = metric
+        self.unit = UNITS[metric]
+        self.matrix = get_matrix(self.coords, self.names, metric) if len(self.names) <= routing.MATRIX_MAX_STOPS else None
+
+    def sub_at(self, idx):
+        """
+        Cost matrix between the given rows, in the given order, or None past routing.MATRIX_MAX_STOPS.
+        """
+        idx = np.asarray(idx, dtype=np.intp)
+        if len(idx) > routing.MATRIX_MAX_STOPS:
+            return None
+        if self.matrix is not None:
+            return np.asarray(self.matrix[np.ix_(idx, idx)])
+        return compute(self.coords[idx], [self.names[i] for i in idx], self.metric)
+
+    def between_at(self, a, b):
+        """
+        Costs from each row in a to each row in b, as a (len(a), len(b)) array.
+        """
+        a, b = np.asarray(a, dtype=np.intp), np.asarray(b, dtype=np.intp)
+        if self.matrix is not None:
+            return np.asarray(self.matrix[np.ix_(a, b)])
+        if self.metric == "matrix":
+            positions, matrix = load_travel_times()
+            rows = lambda idx: np.array([positions[self.names[i]] for i in idx], dtype=np.intp)
+            return matrix[np.ix_(rows(a), rows(b))]
+        return METRICS[self.metric](self.coords[a], self.coords[b])
+
+    def legs_at(self, idx):
+        """
+        Cost of each consecutive leg along the rows.
+        """
+        idx = np.asarray(idx, dtype=np.intp)
+        if self.matrix is not None:
+            return np.asarray(self.matrix[idx[:-1], idx[1:]])
+        if self.metric == "haversine":
+            return haversine_legs_km(self.coords[idx])
+        if self.metric == "matrix":
+            positions, matrix = load_travel_times()
+            rows = np.array([positions[self.names[i]] for i in idx], dtype=np.intp)
+            return matrix[rows[:-1], rows[1:]]
+        points = self.coords[idx]
+        return np.array([METRICS[self.metric](points[i:i + 1], points[i + 1:i + 2])[0, 0] for i in range(len(points) - 1)])
+
+def for_table(table, metric=COST_METRIC):
+    """
+    CostMatrix whose rows follow a store_table.StoreTable, so its *_at methods take table indices.
+    """
+    return CostMatrix(table.names, table.coords, metric)
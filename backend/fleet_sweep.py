@@ -0,0 +1,124 @@
+'''
+Fleet-size sweep
+
+Solves the delivery plan for a range of truck counts (K-Means) and DBSCAN
+eps values (km, or None for the k-distance knee) in one request, one candidate per worker process. Each candidate
+is scored with the figures write_route_report produces: total distance,
+longest route, detour surcharge and stops per truck. Candidates that no other
+candidate beats on every objective form the Pareto set. The recommendation
+is the Pareto candidate with the lowest daily cost: TRUCK_DAY_COST per truck,
+plus COST_PER_KM, plus surcharges, among plans that leave no store unrouted.
+Only the recommended plan is plotted, and it is cached like a normal
+/api/routes result.
+'''
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import logistics
+import route_cache
+
+# ------------------ CONFIG ------------------
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 2)))  # Candidates solved in parallel
+MAX_CANDIDATES = 32           # K values plus eps values per sweep
+TRUCK_DAY_COST = float(os.getenv("TRUCK_DAY_COST", "120"))  # Fixed cost of one truck for a day
+COST_PER_KM = float(os.getenv("COST_PER_KM", "0.75"))       # Fuel and wear per km driven
+OBJECTIVES = ("trucks", "total_distance", "longest_route", "surcharge_total", "unrouted")  # all minimised
+# --------------------------------------------
+
+_executor = None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=SWEEP_WORKERS)
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def evaluate(known_k, num_trucks=None, eps=None, time_budget_ms=0):
+    """
+    Solves one candidate without plotting. Returns its metrics, report and plan summary.
+    """
+    planned = logistics.plan_routes(known_k, num_trucks, time_budget_ms, eps=eps)
+    report = planned["report"]
+    stops = [len(route["stops"]) for route in report["routes"]]
+    return {
+        "mode": "K-Means" if known_k else "DBSCAN",
+        "num_trucks": num_trucks if known_k else None,
+        "eps": None if known_k else report["eps_km"],
+        "requested_eps": None if known_k else eps,
+        "trucks": len(stops),
+        "total_distance": report["total_distance"],
+        "longest_route": max((route["total_distance"] for route in report["routes"]), default=0.0),
+        "surcharge_total": round(float(sum(route["surcharge_total"] for route in report["routes"])), 2),
+        "stops_per_truck": round(sum(stops) / len(stops), 2) if stops else 0.0,
+        "max_stops_per_truck": max(stops, default=0),
+        "unrouted": logistics.count_delivery_stores() - sum(stops),
+        "reassigned": report.get("reassigned_stores", 0),  # DBSCAN noise inserted into routes
+        "report": report,
+        "plan": planned["plan"],
+    }
+
+def daily_cost(candidate):
+    return round(TRUCK_DAY_COST * candidate["trucks"] + COST_PER_KM * candidate["total_distance"] + candidate["surcharge_total"], 2)
+
+def pareto_front(candidates):
+    """
+    Indices of the candidates not dominated on OBJECTIVES.
+    """
+    values = [tuple(c[objective] for objective in OBJECTIVES) for c in candidates]
+    return [i for i, v in enumerate(values)
+            if not any(all(o <= x for o, x in zip(other, v)) and other != v for other in values)]
+
+def recommend(candidates, front):
+    complete = [i for i in front if candidates[i]["unrouted"] == 0] or front
+    return min(complete, key=lambda i: (candidates[i]["cost"], candidates[i]["trucks"])) if complete else None
+
+
+def sweep_key(truck_counts, eps_values, time_budget_ms):
+    return route_cache.make_key(logistics.input_fingerprint(), sweep=True, truck_counts=truck_counts, eps_values=eps_values,
+                                time_budget_ms=time_budget_ms, truck_day_cost=TRUCK_DAY_COST, cost_per_km=COST_PER_KM)
+
+async def sweep(truck_counts=(), eps_values=(), time_budget_ms=0):
+    """
+    Evaluates every truck count and eps value in parallel. Returns
+    {"candidates", "pareto", "recommended", "plot", "report"}, where pareto
+    and recommended index into candidates. Hashing the CSVs and the route
+    cache's disk tier run in threads, off the event loop.
+    """
+    truck_counts = sorted(set(truck_counts))
+    eps_values = sorted(set(eps_values), key=lambda eps: (eps is not None, eps or 0))  # None (auto) first
+    key = await asyncio.to_thread(sweep_key, truck_counts, eps_values, time_budget_ms)
+    cached = await asyncio.to_thread(route_cache.routes_cache.get, key)
+    if cached is not None:
+        return cached
+
+    executor = get_executor()
+    jobs = [executor.submit(evaluate, True, k, None, time_budget_ms) for k in truck_counts]
+    jobs += [executor.submit(evaluate, False, None, eps, time_budget_ms) for eps in eps_values]
+    candidates = list(await asyncio.gather(*(asyncio.wrap_future(job) for job in jobs)))
+    for candidate in candidates:
+        candidate["cost"] = daily_cost(candidate)
+    front = pareto_front(candidates)
+    best = recommend(candidates, front)
+
+    result = {"candidates": [], "pareto": front, "recommended": best, "plot": None, "report": None}
+    for i, candidate in enumerate(candidates):
+        report, plan = candidate.pop("report"), candidate.pop("plan")
+        candidate["pareto"] = i in front
+        result["candidates"].append(candidate)
+        if i == best:
+            # Cache the chosen plan as a normal routing result, so /api/routes for it is a hit
+            route_key = await asyncio.to_thread(logistics.route_cache_key, candidate["mode"] == "K-Means", candidate["num_trucks"],
+                                                time_budget_ms, eps=candidate["requested_eps"])
+            plot = await asyncio.wrap_future(executor.submit(logistics.plot_plan, plan, route_cache.plot_path(route_key)))
+            await asyncio.to_thread(route_cache.routes_cache.put, route_key, {"plot": plot, "report": report, "plan": plan})
+            result["plot"], result["report"] = plot, report
+    await asyncio.to_thread(route_cache.routes_cache.put, key, result)
+    return result
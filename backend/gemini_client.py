@@ -0,0 +1,221 @@
+'''
+Long-lived Gemini client for book damage classification
+
+Talks to the generateContent REST endpoint over a pooled requests.Session.
+Every call goes through a token-bucket rate limiter and a circuit breaker.
+Retryable errors (429, 5xx, timeouts) get jittered exponential backoff, and
+each attempt's latency is recorded. GEMINI_API_BASE can point at a local
+stub server (see benchmarks/gemini_stub.py).
+'''
+import base64
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+# ------------------ CONFIG ------------------
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))          # Requests per minute allowed by our quota
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "5"))         # Requests that may go out back to back
+MAX_RETRIES = 4               # Retries after the first attempt
+BACKOFF_BASE = 0.5            # Seconds; doubled per retry, full jitter
+BACKOFF_CAP = 8.0             # Longest single backoff sleep
+MAX_RETRY_AFTER = 30.0        # Longest Retry-After honoured between attempts; longer waits are the caller's to schedule
+BREAKER_THRESHOLD = 5         # Consecutive failed attempts that open the circuit
+BREAKER_RESET = 30.0          # Seconds the circuit stays open before a trial call
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+POOL_SIZE = 10                # Pooled HTTP connections
+LATENCY_SAMPLES = 1000        # Recent attempt latencies kept for percentiles
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# --------------------------------------------
+
+class ClassifierError(Exception):
+    pass
+
+class CircuitOpenError(ClassifierError):
+    pass
+
+class RetryableError(ClassifierError):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Errors that say nothing about the request itself; it may succeed later
+TRANSIENT_ERRORS = (RetryableError, CircuitOpenError)
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a token is available. Returns the seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True  # half-open: let a single trial call through
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class ClassifierClient:
+    def __init__(self, api_key, model=GEMINI_MODEL, api_base=GEMINI_API_BASE, rpm=GEMINI_RPM, burst=GEMINI_BURST,
+                 max_retries=MAX_RETRIES, breaker=None):
+        self.api_key = api_key
+        self.url = f"{api_base.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self.max_retries = max_retries
+        self.limiter = TokenBucket(rpm / 60.0, burst)
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counters = {"calls": 0, "attempts": 0, "successes": 0, "failures": 0, "retries": 0,
+                          "rate_limited": 0, "circuit_rejections": 0, "throttle_wait_s": 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def generate(self, parts):
+        """
+        Sends one generateContent request and returns the response text.
+        parts is a list of prompt strings and (mime_type, bytes) images.
+        """
+        payload = {"contents": [{"parts": [_encode_part(part) for part in parts]}]}
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count("circuit_rejections")
+                self._count("failures")
+                raise CircuitOpenError("Gemini circuit breaker is open; skipping call")
+            self._count("throttle_wait_s", self.limiter.acquire())
+            self._count("attempts")
+            started = time.perf_counter()
+            try:
+                text = self._post(payload)
+            except RetryableError as e:
+                self._record_latency(started)
+                self.breaker.record_failure()
+                if attempt == self.max_retries or (e.retry_after or 0) > MAX_RETRY_AFTER:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                time.sleep(max(delay, e.retry_after or 0))
+                continue
+            except ClassifierError:
+                self._record_latency(started)
+                self.breaker.record_success()  # the service answered; the request itself was bad
+                self._count("failures")
+                raise
+            self._record_latency(started)
+            self.breaker.record_success()
+            self._count("successes")
+            return text
+
+    def _post(self, payload):
+        try:
+            response = self.session.post(self.url, headers={"x-goog-api-key": self.api_key}, json=payload,
+                                         timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(f"Gemini request failed: {e}")
+        if response.status_code in RETRYABLE_STATUS:
+            if response.status_code == 429:
+                self._count("rate_limited")
+            retry_after = response.headers.get("Retry-After")
+            raise RetryableError(f"Gemini returned HTTP {response.status_code}",
+                                 float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.status_code != 200:
+            raise ClassifierError(f"Gemini returned HTTP {response.status_code}: {response.text[:200]}")
+        try:
+            candidate = response.json()["candidates"][0]
+            return "".join(part.get("text", "") for part in candidate["content"]["parts"])
+        except (ValueError, KeyError, IndexError) as e:
+            raise ClassifierError(f"Unexpected Gemini response: {e}")
+
+    def _record_latency(self, started):
+        with self._lock:
+            self._latencies.append(time.perf_counter() - started)
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counters = dict(self._counters)
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+        counters["throttle_wait_s"] = round(counters["throttle_wait_s"], 3)
+        return {
+            **counters,
+            "circuit": self.breaker.state,
+            "latency_ms": {"p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99),
+                           "samples": len(latencies)},
+        }
+
+
+def _encode_part(part):
+    if isinstance(part, str):
+        return {"text": part}
+    mime_type, data = part
+    return {"inline_data": {"mime_type": mime_type, "data": base64.b64encode(data).decode()}}
@@ -0,0 +1,131 @@
+'''
+Serialized response snapshots with conditional GET and compression
+
+A Snapshot holds an encoded JSON body plus its ETag, and lazily keeps
+gzip/brotli variants, so repeat requests skip serialization and compression
+entirely. respond() answers If-None-Match / If-Modified-Since with 304.
+'''
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ------------------ CONFIG ------------------
+COMPRESS_MIN_BYTES = 1024   # Smaller bodies are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+SNAPSHOTS_KEPT = 256        # LRU bound per SnapshotCache
+# --------------------------------------------
+
+def dumps(data):
+    """
+    Encodes to JSON bytes, handling the NumPy scalars found in route reports.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY, default=_to_builtin)
+    return json.dumps(data, default=_to_builtin, separators=(',', ':')).encode()
+
+def _to_builtin(value):
+    if hasattr(value, 'item'):  # NumPy scalar
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class Snapshot:
+    def __init__(self, body, etag=None, last_modified=None):
+        self.body = body
+        self.etag = etag or f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.last_modified = last_modified  # unix timestamp, or None
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        with self._lock:
+            if encoding not in self._encoded:
+                if encoding == 'br':
+                    self._encoded[encoding] = brotli.compress(self.body, quality=BROTLI_QUALITY)
+                else:
+                    self._encoded[encoding] = gzip.compress(self.body, compresslevel=GZIP_LEVEL)
+            return self._encoded[encoding]
+
+
+class SnapshotCache:
+    def __init__(self, max_entries=SNAPSHOTS_KEPT):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+            return snapshot
+
+    def put(self, key, snapshot):
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+
+def _not_modified(request, snapshot):
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in tags or snapshot.etag in tags or f'W/{snapshot.etag}' in tags
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since and snapshot.last_modified is not None:
+        try:
+            return int(snapshot.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _pick_encoding(request, size):
+    if size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = {part.split(';')[0].strip().lower() for part in request.headers.get('accept-encoding', '').split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+def respond(request, snapshot, status_code=200):
+    """
+    Sends the snapshot, compressed when the client accepts it. Validators
+    (ETag, Last-Modified) are only sent for GET / HEAD, the only methods
+    that can be answered with 304.
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+    if request.method in ('GET', 'HEAD'):
+        headers['ETag'] = snapshot.etag
+        headers['Cache-Control'] = 'no-cache'  # always revalidate; a match costs a 304
+        if snapshot.last_modified is not None:
+            headers['Last-Modified'] = formatdate(snapshot.last_modified, usegmt=True)
+        if _not_modified(request, snapshot):
+            return Response(status_code=304, headers=headers)
+
+    body = snapshot.body
+    encoding = _pick_encoding(request, len(body))
+    if encoding:
+        body = snapshot.encoded(encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(content=body, status_code=status_code, media_type='application/json', headers=headers)
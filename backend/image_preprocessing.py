@@ -0,0 +1,50 @@
+'''
+Image preprocessing before classification
+
+Phone photos arrive at full camera resolution. Before a photo is sent to
+Gemini it is rotated upright from its EXIF orientation, cropped of any
+uniform border, downscaled to PREPROCESS_MAX_EDGE and re-encoded compactly.
+The stored upload is left untouched. This code runs in the request
+threadpool, never on the event loop.
+'''
+import os
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageOps
+
+# ------------------ CONFIG ------------------
+PREPROCESS_ENABLED = os.getenv("PREPROCESS_IMAGES", "1") == "1"
+PREPROCESS_MAX_EDGE = int(os.getenv("PREPROCESS_MAX_EDGE", "1024"))  # Longest side sent to the model, in pixels
+PREPROCESS_FORMAT = os.getenv("PREPROCESS_FORMAT", "WEBP")           # WEBP or JPEG
+PREPROCESS_QUALITY = 80
+BORDER_TOLERANCE = 12         # Per-channel difference from the corner colour still counted as border
+# --------------------------------------------
+
+def crop_uniform_border(image, tolerance=BORDER_TOLERANCE):
+    """
+    Crops away a border whose colour matches the top-left pixel (within tolerance).
+    """
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background)
+    if tolerance:
+        diff = ImageChops.subtract(diff, Image.new(image.mode, image.size, (tolerance,) * len(image.getbands())))
+    bbox = diff.getbbox()
+    if not bbox or bbox == (0, 0) + image.size:
+        return image
+    return image.crop(bbox)
+
+def preprocess_image(image_path, max_edge=PREPROCESS_MAX_EDGE, image_format=PREPROCESS_FORMAT, quality=PREPROCESS_QUALITY):
+    """
+    Returns (mime_type, bytes) ready to send to the model.
+    """
+    with Image.open(image_path) as image:
+        # Let the JPEG decoder downscale by a power of two while decoding
+        image.draft('RGB', (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+    image = crop_uniform_border(image)
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return Image.MIME[image_format], buffer.getvalue()
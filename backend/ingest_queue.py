@@ -0,0 +1,291 @@
+'''
+Durable upload ingestion queue
+
+An upload is saved to disk and recorded as a job row in the catalog
+database, and the client gets a job ID back right away. A pool of worker
+threads claims jobs with a lease, classifies and prices them, and marks the
+job done in the same transaction that adds the book. A crash therefore never
+adds a book twice. Jobs left running by a crashed process are picked up again
+once their lease expires, so the queue survives restarts. A worker renews
+its lease while the job runs, and its writes only apply while it still
+holds the claim, so a worker whose job was reclaimed cannot add it again.
+'''
+import json
+import os
+import threading
+import time
+import uuid
+
+import ai
+import catalog
+import gemini_client
+
+# ------------------ CONFIG ------------------
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))   # Worker threads processing uploads
+MAX_PENDING_JOBS = int(os.getenv("INGEST_MAX_PENDING", "1000"))  # Queued + running jobs before new uploads are rejected
+MAX_ATTEMPTS = 3              # Claims per job before it is failed for good
+LEASE_SECONDS = 300           # A running job not touched for this long is assumed orphaned
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3  # A worker renews its lease this often while the job runs
+RETRY_DELAY = 5.0             # Seconds before a job that hit an unexpected error is retried; doubled per attempt
+POLL_INTERVAL = 1.0           # Idle workers re-check the table this often (other processes may enqueue)
+FINISHED_JOBS_TTL = 7 * 86400 # Finished jobs are kept this long for status polling
+# --------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    digest TEXT,
+    filename TEXT,
+    original_price REAL NOT NULL,
+    publisher TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, available_at);
+"""
+
+# Columns returned by get_job
+PUBLIC_FIELDS = ("job_id", "status", "stage", "filename", "attempts", "created_at", "updated_at", "result", "error")
+FINISHED = ("done", "failed")
+
+class QueueFull(Exception):
+    pass
+
+class IngestError(Exception):
+    pass
+
+class LeaseLost(Exception):
+    # The job's lease expired and another worker claimed it; this worker must not touch it again
+    pass
+
+
+_schema_lock = threading.Lock()
+_schema_ready = set()  # database paths with the ingest_jobs table
+_wakeup = threading.Condition()
+_stop = threading.Event()
+_workers = []
+
+def _conn():
+    conn = catalog.get_connection()
+    db_path = catalog.CATALOG_DB
+    if db_path not in _schema_ready:
+        with _schema_lock:
+            if db_path not in _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready.add(db_path)
+    return conn
+
+def enqueue(image_path, original_price, publisher, digest=None, filename=None):
+    """
+    Records an upload that is already saved at image_path and returns its job ID.
+    Raises QueueFull when too many jobs are pending.
+    """
+    conn = _conn()
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    with conn:
+        pending = conn.execute("SELECT COUNT(*) FROM ingest_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+        if pending >= MAX_PENDING_JOBS:
+            raise QueueFull(f"Too many uploads waiting to be processed (limit {MAX_PENDING_JOBS})")
+        conn.execute(
+            "INSERT INTO ingest_jobs (job_id, status, stage, image_path, digest, filename, original_price, publisher, "
+            "available_at, created_at, updated_at) VALUES (?, 'queued', 'queued', ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, image_path, digest, filename, original_price, publisher, now, now, now),
+        )
+        conn.execute("DELETE FROM ingest_jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                     (now - FINISHED_JOBS_TTL,))
+    with _wakeup:
+        _wakeup.notify()
+    return job_id
+
+def get_job(job_id):
+    """
+    Returns the job's status, progress stage and result, or None if the ID is unknown.
+    """
+    row = _conn().execute(f"SELECT {', '.join(PUBLIC_FIELDS)} FROM ingest_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def _claim():
+    """
+    Atomically takes the oldest runnable job: queued and due, or running with an expired lease.
+    """
+    conn = _conn()
+    now = time.time()
+    with conn:
+        row = conn.execute(
+            "UPDATE ingest_jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? "
+            "WHERE job_id = (SELECT job_id FROM ingest_jobs "
+            "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_until < ?) "
+            "ORDER BY created_at LIMIT 1) "
+            "RETURNING job_id, image_path, digest, original_price, publisher, attempts",
+            (now + LEASE_SECONDS, now, now, now),
+        ).fetchone()
+    return dict(row) if row else None
+
+# Every write by a worker is fenced on its claim: the job must still be running
+# under the attempt number it was claimed with. A worker whose lease expired
+# and whose job was claimed again therefore changes nothing.
+CLAIMED = "job_id = ? AND status = 'running' AND attempts = ?"
+
+def _set_stage(job, stage):
+    # Each stage change also renews the lease
+    now = time.time()
+    conn = _conn()
+    with conn:
+        updated = conn.execute(f"UPDATE ingest_jobs SET stage = ?, lease_until = ?, updated_at = ? WHERE {CLAIMED}",
+                               (stage, now + LEASE_SECONDS, now, job["job_id"], job["attempts"])).rowcount
+    if not updated:
+        raise LeaseLost(f"Lost the lease on job {job['job_id']}")
+
+def _renew_lease(job):
+    conn = _conn()
+    with conn:
+        return conn.execute(f"UPDATE ingest_jobs SET lease_until = ? WHERE {CLAIMED}",
+                            (time.time() + LEASE_SECONDS, job["job_id"], job["attempts"])).rowcount == 1
+
+class _Heartbeat:
+    """
+    Renews the job's lease every HEARTBEAT_SECONDS while the block runs, so a
+    slow classification (retries, Retry-After, throttling) is not reclaimed.
+    """
+    def __init__(self, job):
+        self.job = job
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"ingest-heartbeat-{job['job_id'][:8]}", daemon=True)
+
+    def _beat(self):
+        while not self._done.wait(HEARTBEAT_SECONDS):
+            if not _renew_lease(self.job):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+def _fail(job, error):
+    conn = _conn()
+    with conn:
+        conn.execute(f"UPDATE ingest_jobs SET status = 'failed', lease_until = NULL, error = ?, updated_at = ? WHERE {CLAIMED}",
+                     (error, time.time(), job["job_id"], job["attempts"]))
+
+def _retry_later(job, error, delay=None, refund=False):
+    """
+    Requeues the job after delay seconds (exponential backoff by default).
+    refund gives back the attempt, for failures that were not the job's fault.
+    """
+    now = time.time()
+    if delay is None:
+        delay = RETRY_DELAY * 2 ** (job["attempts"] - 1)
+    conn = _conn()
+    with conn:
+        conn.execute(
+            "UPDATE ingest_jobs SET status = 'queued', stage = 'queued', lease_until = NULL, available_at = ?, "
+            f"attempts = attempts - ?, error = ?, updated_at = ? WHERE {CLAIMED}",
+            (now + delay, int(refund), error, now, job["job_id"], job["attempts"]),
+        )
+
+def _transient_delay(error):
+    # Wait out the server's Retry-After, or the breaker's cool-down
+    if isinstance(error, gemini_client.CircuitOpenError):
+        return gemini_client.BREAKER_RESET
+    return max(RETRY_DELAY, error.retry_after or 0)
+
+def process(job):
+    with _Heartbeat(job):
+        _set_stage(job, "classifying")
+        damage_info = ai.classify_with_cache(job["image_path"], job["digest"], raise_transient=True)
+        if not damage_info:
+            raise IngestError("Could not classify book")
+
+        _set_stage(job, "pricing")
+        book_entry = ai.build_book_entry(job["image_path"], job["original_price"], job["publisher"], damage_info)
+        if not book_entry:
+            raise IngestError("Could not price book")
+
+    _set_stage(job, "saving")
+    conn = _conn()
+    with conn:
+        # The book and the job's completion commit together, and only while this worker still holds the claim
+        done = conn.execute(
+            "UPDATE ingest_jobs SET status = 'done', stage = 'done', lease_until = NULL, result = ?, error = NULL, "
+            f"updated_at = ? WHERE {CLAIMED}",
+            (json.dumps(book_entry), time.time(), job["job_id"], job["attempts"]),
+        ).rowcount
+        if not done:
+            raise LeaseLost(f"Lost the lease on job {job['job_id']}")  # rolls the transaction back
+        catalog.insert_books(conn, [book_entry])
+    catalog.search_index.refresh(conn)
+    return book_entry
+
+def _run_job(job):
+    """
+    Processes one claimed job: done, requeued for a retry, or failed for good.
+    """
+    if job["attempts"] > MAX_ATTEMPTS:
+        _fail(job, f"Gave up after {MAX_ATTEMPTS} attempts")
+        return
+    try:
+        process(job)
+    except LeaseLost as e:
+        print(f"Ingest job {job['job_id']} abandoned: {e}")
+    except IngestError as e:
+        _fail(job, str(e))
+    except gemini_client.TRANSIENT_ERRORS as e:
+        # The classifier is rate limited or unavailable: wait, without using up an attempt
+        print(f"Ingest job {job['job_id']} deferred: {e}")
+        _retry_later(job, str(e), _transient_delay(e), refund=True)
+    except Exception as e:
+        print(f"Ingest job {job['job_id']} failed: {e}")
+        if job["attempts"] < MAX_ATTEMPTS:
+            _retry_later(job, str(e))
+        else:
+            _fail(job, str(e))
+
+def _work():
+    while not _stop.is_set():
+        job = _claim()
+        if job is None:
+            with _wakeup:
+                _wakeup.wait(POLL_INTERVAL)
+            continue
+        _run_job(job)
+
+def start(workers=INGEST_WORKERS):
+    """
+    Starts the worker threads. Safe to call more than once.
+    """
+    if _workers:
+        return
+    _stop.clear()
+    _conn()
+    for index in range(workers):
+        thread = threading.Thread(target=_work, name=f"ingest-worker-{index}", daemon=True)
+        thread.start()
+        _workers.append(thread)
+
+def stop(timeout=5.0):
+    """
+    Asks the workers to finish their current job and exit. Unfinished jobs stay in the table.
+    """
+    _stop.set()
+    with _wakeup:
+        _wakeup.notify_all()
+    for thread in _workers:
+        thread.join(timeout)
+    _workers.clear()
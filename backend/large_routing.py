@@ -0,0 +1,185 @@
+'''
+Large-instance routing for province-wide store and customer lists
+
+Both stages work on compact NumPy arrays rather than DataFrames:
+
+- load_stores reads the location and requirement CSVs in chunks of
+  INGEST_CHUNK_ROWS rows straight into a store_table.StoreTable, so the full
+  files are never merged in memory. logistics.load_table uses it at every
+  size.
+- Past LARGE_INSTANCE_STOPS delivery points, plan() replaces K-Means routing.
+  Clustering is hierarchical. Points are binned into a grid on the unit
+  sphere, GRID_CELL_KM wide. Full K-Means then runs on the occupied cell
+  centres, weighted by how many points each cell holds, so its cost follows
+  the number of cells rather than points. Each point finally joins its
+  nearest centre. The "minibatch" scheme runs MiniBatchKMeans on the points
+  instead.
+- Each cluster's tour is solved in a worker process from its coordinate array
+  alone. Up to EXACT_TOUR_STOPS stops get a nearest-neighbour tour with full
+  2-opt / Or-opt. Longer tours follow a Hilbert curve, improved a window at a
+  time.
+
+Tours are ordered by great-circle distance; the configured cost metric is
+not consulted.
+'''
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from sklearn.cluster import KMeans, MiniBatchKMeans
+
+import cost_matrix
+import routing
+import spatial_index
+import store_table
+
+# ------------------ CONFIG ------------------
+LARGE_INSTANCE_STOPS = int(os.getenv("LARGE_INSTANCE_STOPS", "20000"))  # Delivery points before the large-instance path is used
+LARGE_WORKERS = int(os.getenv("LARGE_WORKERS", str(os.cpu_count() or 2)))  # Cluster tours solved in parallel
+CLUSTERING_SCHEME = os.getenv("LARGE_CLUSTERING", "grid")  # grid (coarse grid -> K-Means) or minibatch
+INGEST_CHUNK_ROWS = 100_000   # CSV rows read at a time
+GRID_CELL_KM = 2.0            # Starting cell width; halved until there are enough cells
+GRID_CELLS_PER_CLUSTER = 50   # Occupied cells wanted per cluster before K-Means
+MIN_GRID_CELL_KM = 0.05
+MINIBATCH_SIZE = 4096
+EXACT_TOUR_STOPS = 2000       # Largest cluster given a nearest-neighbour tour over a full matrix
+# --------------------------------------------
+
+_executor = None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=LARGE_WORKERS)
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def load_stores(locations_csv, requirements_csv, demand_column=None, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Reads both CSVs chunk by chunk into a StoreTable of the stores listed in
+    both, in the order of the locations file, as an inner merge on Name would.
+    Demand comes from demand_column when the requirements file has it.
+    """
+    header = pd.read_csv(requirements_csv, nrows=0).columns
+    columns = ['Name', 'RequiresDelivery'] + ([demand_column] if demand_column in header else [])
+    required, flags, demand = [], [], []
+    for chunk in pd.read_csv(requirements_csv, usecols=columns, chunksize=chunk_rows):
+        required.append(chunk['Name'].to_numpy(dtype=object))
+        flags.append((chunk['RequiresDelivery'] == 'Yes').to_numpy())
+        demand.append(pd.to_numeric(chunk[demand_column], errors='coerce').to_numpy() if len(columns) > 2 else np.ones(len(chunk)))
+    required = pd.Index(np.concatenate(required) if required else [], dtype=object)
+    flags = np.concatenate(flags) if flags else np.empty(0, dtype=bool)
+    demand = np.concatenate(demand) if demand else np.empty(0)
+    first = ~required.duplicated()  # a store listed twice keeps its first row
+    required, flags, demand = required[first], flags[first], demand[first]
+
+    names, coords, indigo, rows = [], [], [], []
+    for chunk in pd.read_csv(locations_csv, usecols=['Name', 'Latitude', 'Longitude', 'Type'], chunksize=chunk_rows):
+        found = required.get_indexer(chunk['Name'])
+        keep = found >= 0
+        chunk = chunk[keep]
+        names.append(chunk['Name'].to_numpy(dtype=object))
+        coords.append(chunk[['Latitude', 'Longitude']].to_numpy(dtype=float))
+        indigo.append((chunk['Type'] == 'Indigo').to_numpy())
+        rows.append(found[keep])
+    if not names:
+        return store_table.StoreTable([], np.empty((0, 2)), [])
+    rows = np.concatenate(rows)
+    return store_table.StoreTable(np.concatenate(names), np.concatenate(coords), np.concatenate(indigo), flags[rows],
+                                  demand[rows] if len(columns) > 2 else None)
+
+
+# Clustering on the unit sphere, so distances are the same anywhere in the province
+def grid_cells(xyz, cell_km):
+    """
+    Returns (cell of each point, number of occupied cells, points per cell).
+    """
+    cells = np.floor(xyz / spatial_index.km_to_chord(cell_km)).astype(np.int64)
+    cells -= cells.min(axis=0)
+    dims = cells.max(axis=0) + 1
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    return inverse.ravel(), len(counts), counts
+
+def cluster(coords, k, scheme=CLUSTERING_SCHEME, seed=0):
+    """
+    Labels 0..k-1 for (latitude, longitude) coords. Some labels may end up unused.
+    """
+    xyz = spatial_index.to_unit_sphere(coords)
+    k = max(1, min(int(k), len(xyz)))
+    if scheme == "minibatch":
+        return MiniBatchKMeans(n_clusters=k, batch_size=MINIBATCH_SIZE, n_init=3, random_state=seed).fit(xyz).labels_
+
+    cell_km = GRID_CELL_KM
+    inverse, occupied, counts = grid_cells(xyz, cell_km)
+    while occupied < min(len(xyz), GRID_CELLS_PER_CLUSTER * k) and cell_km / 2 >= MIN_GRID_CELL_KM:
+        cell_km /= 2
+        inverse, occupied, counts = grid_cells(xyz, cell_km)
+    centres = np.column_stack([np.bincount(inverse, weights=xyz[:, axis], minlength=occupied) for axis in range(3)]) / counts[:, None]
+    model = KMeans(n_clusters=min(k, occupied), n_init=10, random_state=seed).fit(centres, sample_weight=counts)
+    _, labels = cKDTree(model.cluster_centers_).query(xyz)
+    return labels
+
+
+# Per-cluster tours, run in worker processes
+def tour_from_depot(depot, coords, seconds=0.0):
+    """
+    Open tour from depot (latitude, longitude) through every row of coords.
+    Returns the visiting order as an index array into coords.
+    """
+    deadline = time.perf_counter() + seconds
+    latlon = np.vstack((np.reshape(depot, (1, 2)), coords))
+    points = spatial_index.to_unit_sphere(latlon)
+    if len(coords) <= EXACT_TOUR_STOPS:
+        dist = routing.build_distance_matrix(points)
+        order = routing.nearest_neighbour_order(points, dist)
+        if seconds > 0:
+            order = routing.improve_tour(order, dist, deadline)
+        return order[1:] - 1
+
+    # Longitude scaled to the cluster's latitude, so the curve sees true proportions
+    plane = np.column_stack((coords[:, 0], coords[:, 1] * np.cos(np.radians(coords[:, 0].mean()))))
+    order = routing.hilbert_order(plane) + 1
+    first, last = points[order[0]], points[order[-1]]
+    if np.sum((points[0] - last) ** 2) < np.sum((points[0] - first) ** 2):
+        order = order[::-1]  # start at the end of the curve nearer the depot
+    order = np.concatenate(([0], order))
+    if seconds > 0:
+        order = routing.improve_windows(order, points, deadline)
+    return order[1:] - 1
+
+def route_clusters(depot, coords, labels, time_budget_ms=0, executor=None):
+    """
+    Solves every cluster's tour in parallel. Returns a list of index arrays
+    into coords, one per non-empty cluster, in label order.
+    """
+    executor = executor or get_executor()
+    order = np.argsort(labels, kind='stable')
+    sizes = np.bincount(labels)
+    members = [part for part in np.split(order, np.cumsum(sizes)[:-1]) if len(part)]
+    # Clusters run LARGE_WORKERS at a time, so each gets that share of the budget
+    seconds = time_budget_ms / 1000 * min(LARGE_WORKERS, len(members)) / max(len(members), 1)
+    jobs = [executor.submit(tour_from_depot, depot, coords[part], seconds) for part in members]
+    return [part[job.result()] for part, job in zip(members, jobs)]
+
+def plan(table, depot, stops, num_trucks, time_budget_ms=0, scheme=CLUSTERING_SCHEME):
+    """
+    Clusters the stops (table indices) into num_trucks groups and routes each
+    from the depot. Returns one index array into table per non-empty cluster.
+    """
+    stops = np.asarray(stops, dtype=np.intp)
+    stops = stops[stops != depot]
+    if not len(stops):
+        return []
+    coords = table.coords[stops]
+    labels = cluster(coords, num_trucks, scheme)
+    return [stops[route] for route in route_clusters(table.coords[depot], coords, labels, time_budget_ms)]
@@ -49,7 +49,7 @@ Logistics Optimizer code
 #     return clusters
 
 # # Function to plot the optimized delivery pathways
-# def plot_routes(starting_indigo, retailer_routes, mode):
+# def plot_routes(starting_indigo, retailer_routes, mode, output_path='static/logistics/optimized_routes.png'):
 #     plt.figure(figsize=(10, 8))
 #     colors = ['red', 'green', 'purple', 'orange', 'cyan', 'magenta']
     
@@ -92,159 +92,611 @@ from io import BytesIO
 import matplotlib.pyplot as plt
 from sklearn.cluster import KMeans, DBSCAN
 from scipy.spatial.distance import cdist
+from concurrent.futures import ThreadPoolExecutor
+import math
 import os
+import threading
+import time
+import cost_matrix
+import large_routing
+import routing
+import route_cache
+import spatial_index
+import store_table
+import vrp
 
 # ------------------ CONFIG ------------------
 SURCHARGE_PER_3KM = 1.50  # $1.50 per 3 km
 OUTLIER_THRESHOLD = 2.0   # Leg is outlier if > 2× average leg length
+LOCATIONS_CSV = 'static/logistics/bookstore_locations.csv'
+REQUIREMENTS_CSV = 'static/logistics/delivery_requirements.csv'
+DBSCAN_EPS = float(os.getenv("DBSCAN_EPS_KM", "0")) or None  # Neighbourhood radius in km for Dynamic K; None picks it from the k-distance knee
+DBSCAN_MIN_SAMPLES = 2
+DEPOT_WORKERS = int(os.getenv("DEPOT_WORKERS", "4"))  # Depots planned in parallel in multi-depot mode
+DEMAND_COLUMN = 'Demand'  # Optional delivery requirements column; stores without it count one unit
+VRP_CAPACITY = float(os.getenv("VRP_CAPACITY", "0"))  # Truck capacity in demand units; 0 splits demand over the trucks
+VRP_CAPACITY_SLACK = 0.15 # Headroom over an even split when capacity comes from the number of trucks
+VRP_MAX_ROUTE_LENGTH = float(os.getenv("VRP_MAX_ROUTE_LENGTH", "0"))  # Longest round trip in cost units (km by default); 0 for no limit
 # --------------------------------------------
 
-# Load and merge data from CSV files
-locations_df = pd.read_csv('static/logistics/bookstore_locations.csv')
-requirements_df = pd.read_csv('static/logistics/delivery_requirements.csv')
-merged_df = pd.merge(locations_df, requirements_df, on='Name')
-delivery_stores = merged_df[merged_df['RequiresDelivery'] == 'Yes'].copy()
+# Cost sub-matrix between stores, sliced from the shared matrix (None without one)
+def store_costs(costs, stores):
+    return costs.sub_at(stores) if costs is not None else None
 
-# Euclidean distance function
-def calculate_distance(coord1, coord2):
-    return np.sqrt((coord1[0] - coord2[0])**2 + (coord1[1] - coord2[1])**2)
+# Depot, then the route's stops (and the depot again for round trips), as table indices
+def tour_points(depot, route, round_trip=False):
+    return np.concatenate(([depot], route, [depot] if round_trip else [])).astype(np.intp)
 
-# TSP solver
-def solve_tsp(retailers):
-    if not retailers:
+# TSP solver (nearest neighbour over a precomputed distance matrix)
+def solve_tsp(table, retailers, costs=None):
+    retailers = np.asarray(retailers, dtype=np.intp)
+    if not len(retailers):
+        return retailers
+    order = routing.nearest_neighbour_order(table.coords[retailers], store_costs(costs, retailers))
+    return retailers[order]
+
+# Route improvement: 2-opt / Or-opt from the starting store, bounded by a deadline
+def improve_route(table, starting_indigo, route, deadline, costs=None):
+    route = np.asarray(route, dtype=np.intp)
+    if len(route) < 2 or len(route) + 1 > routing.MATRIX_MAX_STOPS:
+        return route
+    points = tour_points(starting_indigo, route)
+    dist = store_costs(costs, points)
+    if dist is None:
+        dist = routing.build_distance_matrix(table.coords[points])
+    order = routing.improve_tour(np.arange(len(points)), dist, deadline)
+    return points[order[1:]]
+
+# Capacity-constrained routing: Clarke-Wright savings, then relocate / exchange between routes
+def store_demand(table, stores):
+    return table.rows['demand'][stores]
+
+def truck_capacity(total_demand, num_trucks=None, capacity=None):
+    if capacity:
+        return capacity
+    if VRP_CAPACITY:
+        return VRP_CAPACITY
+    if num_trucks:
+        return math.ceil(total_demand / num_trucks * (1 + VRP_CAPACITY_SLACK))
+    return None
+
+def vrp_sectors(table, depot, stops, max_stops):
+    """
+    Splits stops into angular sectors around the depot of at most max_stops
+    each. Round trips in different sectors never share a stop, so each sector
+    is solved on its own cost matrix.
+    """
+    if len(stops) <= max_stops:
+        return [stops]
+    lat, lon = np.radians(table.coords[stops]).T
+    depot_lat, depot_lon = np.radians(table.coords[depot])
+    angle = np.arctan2(lat - depot_lat, (lon - depot_lon) * np.cos(depot_lat))
+    return np.array_split(stops[np.argsort(angle, kind='stable')], math.ceil(len(stops) / max_stops))
+
+def solve_vrp(table, depot, stops, num_trucks=None, capacity=None, max_route_length=None, deadline=None, costs=None):
+    """
+    Round trips from the depot that keep each truck within capacity and
+    max_route_length. Returns a list of routes, each an index array into table.
+    Past routing.MATRIX_MAX_STOPS the stops are solved sector by sector, so no
+    cost matrix is larger than that. The deadline bounds each sector's solve;
+    building a sector's cost matrix is not covered by it.
+    """
+    stops = np.asarray(stops, dtype=np.intp)
+    stops = stops[stops != depot]
+    if not len(stops):
         return []
-    start = retailers[0]
-    path = [start]
-    must_visit = retailers[1:]
-    while must_visit:
-        nearest = min(must_visit, key=lambda x: calculate_distance(
-            (path[-1]['Latitude'], path[-1]['Longitude']), (x['Latitude'], x['Longitude'])))
-        path.append(nearest)
-        must_visit.remove(nearest)
-    return path
+    capacity = truck_capacity(store_demand(table, stops).sum(), num_trucks, capacity)
+    max_route_length = max_route_length or VRP_MAX_ROUTE_LENGTH
+    sectors = vrp_sectors(table, depot, stops, routing.MATRIX_MAX_STOPS - 1)
+    routes = []
+    for done, sector in enumerate(sectors):
+        # Sectors share what is left of the time budget
+        sector_deadline = None if deadline is None else time.perf_counter() + (deadline - time.perf_counter()) / (len(sectors) - done)
+        points = tour_points(depot, sector)
+        dist = store_costs(costs, points)
+        if dist is None:
+            dist = cost_matrix.compute(table.coords[points], list(table.names[points]), costs.metric if costs is not None else cost_matrix.COST_METRIC)
+        demand = np.concatenate(([0.0], store_demand(table, sector)))
+        routes.extend(points[route] for route in vrp.solve(dist, demand, capacity, max_route_length, sector_deadline))
+    return routes
+
+# DBSCAN over great-circle distance, with eps from the k-distance knee unless given
+def knee_eps(coords, min_samples=DBSCAN_MIN_SAMPLES):
+    """
+    Sorts every store's distance to its (min_samples - 1)-th nearest neighbour and
+    returns the distance in km where that curve bends most sharply, i.e. the point
+    furthest below the line joining its ends. Dense cities and sparse regions
+    each get a radius that fits their own spacing.
+    """
+    distances = np.sort(spatial_index.StoreIndex(coords).neighbour_distances(min_samples - 1))
+    span = distances[-1] - distances[0]
+    if span <= 0:
+        return float(max(distances[0], 1e-3))
+    x = np.linspace(0.0, 1.0, len(distances))
+    knee = int(np.argmax(x - (distances - distances[0]) / span))
+    return float(max(distances[knee], 1e-3))
+
+def dbscan_labels(coords, eps=None):
+    """
+    Returns (labels, eps_km); label -1 marks noise.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) <= DBSCAN_MIN_SAMPLES:
+        return np.zeros(len(coords), dtype=int), eps
+    eps = eps or knee_eps(coords)
+    model = DBSCAN(eps=float(spatial_index.km_to_chord(eps)), min_samples=DBSCAN_MIN_SAMPLES)
+    return model.fit(spatial_index.to_unit_sphere(coords)).labels_, eps
+
+# Cheapest insertion of one store into a tour that starts at the depot (and ends there for round trips)
+def insertion_costs(points, store, costs, round_trip=False):
+    """
+    Extra cost of inserting store after each of points (table indices); the
+    last entry of an open tour is appending after the last stop.
+    """
+    to_store = costs.between_at(points, [store])[:, 0]
+    from_store = costs.between_at([store], points)[0]
+    extra = to_store[:-1] + from_store[1:] - costs.legs_at(points)
+    return extra if round_trip else np.append(extra, to_store[-1])
+
+def reassign_noise(table, depot, routes, noise, costs=None):
+    """
+    Inserts each DBSCAN noise store into the route holding its nearest routed
+    store, at the cheapest position. routes is a {label: route} dict updated
+    in place. Returns the number of stores reassigned.
+    """
+    if not len(noise):
+        return 0
+    if not any(len(route) for route in routes.values()):
+        routes[len(routes)] = solve_tsp(table, noise, costs)
+        return len(noise)
+    labels = [label for label, route in routes.items() for _ in range(len(route))]
+    routed = np.concatenate(list(routes.values()))
+    costs = costs if costs is not None else load_costs(table)
+    _, nearest = spatial_index.StoreIndex(table.coords[routed]).nearest(table.coords[noise])
+    for store, i in zip(noise, nearest):
+        route = routes[labels[i]]
+        position = int(np.argmin(insertion_costs(tour_points(depot, route), store, costs)))
+        routes[labels[i]] = np.insert(route, position, store)
+    return len(noise)
 
 # Apply clustering and TSP
-def apply_clustering_and_tsp(delivery_stores, clustering_type, num_clusters=None):
-    coords = delivery_stores[['Latitude', 'Longitude']].values
+def apply_clustering_and_tsp(table, delivery_stores, clustering_type, num_clusters=None, starting_indigo=None, time_budget_ms=0, costs=None,
+                             capacity=None, max_route_length=None, eps=None, stats=None):
+    """
+    Routes the delivery_stores rows of table. Returns {label: index array}.
+    DBSCAN fills stats, when given, with "eps_km" and "reassigned_stores".
+    """
+    delivery_stores = np.asarray(delivery_stores, dtype=np.intp)
+    stats = {} if stats is None else stats
+    if clustering_type == 'VRP':
+        deadline = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms > 0 else None
+        routes = solve_vrp(table, starting_indigo, delivery_stores, num_clusters, capacity, max_route_length, deadline, costs)
+        return dict(enumerate(routes))
+
+    if clustering_type == 'K' and starting_indigo is not None and len(delivery_stores) > large_routing.LARGE_INSTANCE_STOPS:
+        # Grid -> K-Means clustering, with the cluster tours solved and improved in worker processes
+        routes = large_routing.plan(table, starting_indigo, delivery_stores, num_clusters, time_budget_ms)
+        return dict(enumerate(routes))
+    coords = table.coords[delivery_stores]
     if clustering_type == 'K':
-        cluster_model = KMeans(n_clusters=num_clusters, random_state=0, n_init=10).fit(coords)
+        labels = KMeans(n_clusters=num_clusters, random_state=0, n_init=10).fit(coords).labels_
     else:
-        cluster_model = DBSCAN(eps=0.025, min_samples=2).fit(coords)
-    delivery_stores['Cluster'] = cluster_model.labels_
+        labels, stats['eps_km'] = dbscan_labels(coords, eps)
 
     optimized_routes = {}
-    for cluster_label in set(delivery_stores['Cluster']):
+    for cluster_label in np.unique(labels):
         if cluster_label != -1:
-            cluster_data = delivery_stores[delivery_stores['Cluster'] == cluster_label]
-            optimized_routes[cluster_label] = solve_tsp(cluster_data.to_dict('records'))
+            optimized_routes[int(cluster_label)] = solve_tsp(table, delivery_stores[labels == cluster_label], costs)
+
+    # Noise stores still need a delivery; they join the nearest route before it is improved
+    if starting_indigo is not None:
+        stats['reassigned_stores'] = reassign_noise(table, starting_indigo, optimized_routes, delivery_stores[labels == -1], costs)
+
+    # Optional improvement stage; each remaining route gets an equal share of what is left of the budget
+    if starting_indigo is not None and time_budget_ms > 0:
+        budget_end = time.perf_counter() + time_budget_ms / 1000
+        labels = list(optimized_routes)
+        for idx, cluster_label in enumerate(labels):
+            now = time.perf_counter()
+            if now >= budget_end:
+                break
+            deadline = now + (budget_end - now) / (len(labels) - idx)
+            optimized_routes[cluster_label] = improve_route(table, starting_indigo, optimized_routes[cluster_label], deadline, costs)
     return optimized_routes
 
+# Multi-depot planning: every retailer is served from its nearest Indigo store
+def allocate_trucks(stop_counts, num_trucks):
+    """
+    Splits num_trucks across depots in proportion to their stops (largest remainder),
+    giving every depot with stops at least one truck and none more trucks than stops.
+    """
+    counts = np.asarray(stop_counts, dtype=int)
+    total = max(int(num_trucks or 0), int((counts > 0).sum()))
+    share = counts / max(counts.sum(), 1) * total
+    trucks = np.where(counts > 0, np.maximum(np.floor(share), 1), 0).astype(int)
+    while trucks.sum() > total:
+        trucks[np.argmax(np.where(trucks > 1, trucks - share, -np.inf))] -= 1
+    while trucks.sum() < total and (trucks < counts).any():
+        trucks[np.argmax(np.where(trucks < counts, share - trucks, -np.inf))] += 1
+    return np.minimum(trucks, counts)
+
+def route_from_depot(table, depot, stops, deadline=None, costs=None):
+    """
+    Nearest-neighbour tour that starts at the depot, then 2-opt / Or-opt until the deadline.
+    """
+    points = tour_points(depot, stops)
+    coords = table.coords[points]
+    dist = store_costs(costs, points)
+    if dist is None and len(coords) <= routing.MATRIX_MAX_STOPS:
+        dist = routing.build_distance_matrix(coords)
+    order = routing.nearest_neighbour_order(coords, dist)
+    if deadline is not None and dist is not None and len(stops) >= 2:
+        order = routing.improve_tour(order, dist, deadline)
+    return points[order[1:]]
+
+def plan_depot(table, depot, stops, clustering_type, num_trucks=None, budget_end=None, costs=None, capacity=None, max_route_length=None,
+               eps=None, stats=None):
+    if clustering_type == 'VRP':
+        return solve_vrp(table, depot, stops, num_trucks, capacity, max_route_length, budget_end, costs)
+    coords = table.coords[stops]
+    if clustering_type == 'K':
+        labels = KMeans(n_clusters=num_trucks, random_state=0, n_init=10).fit(coords).labels_ if num_trucks > 1 else np.zeros(len(coords), dtype=int)
+    else:
+        labels, _ = dbscan_labels(coords, eps)
+    clusters = [stops[labels == label] for label in np.unique(labels) if label != -1]
+
+    routes = []
+    for idx, cluster in enumerate(clusters):
+        deadline = None
+        if budget_end is not None:
+            now = time.perf_counter()
+            deadline = now + max(0.0, budget_end - now) / (len(clusters) - idx)
+        routes.append(route_from_depot(table, depot, cluster, deadline, costs))
+
+    labelled = dict(enumerate(routes))
+    reassigned = reassign_noise(table, depot, labelled, stops[labels == -1], costs)
+    if stats is not None:
+        stats['reassigned_stores'] = reassigned
+    return list(labelled.values())
+
+def plan_multi_depot(table, clustering_type, num_clusters=None, time_budget_ms=0, costs=None, capacity=None, max_route_length=None, eps=None,
+                     stats=None):
+    """
+    Assigns each retailer needing delivery to its nearest Indigo store, then
+    clusters and routes each depot's retailers in parallel.
+    Returns (routes, route_depots), both keyed by route label; route_depots holds table indices.
+    """
+    stats = {} if stats is None else stats
+    depots = np.flatnonzero(table.rows['indigo'])
+    stops = np.flatnonzero(~table.rows['indigo'] & table.rows['delivery'])
+    _, nearest = spatial_index.StoreIndex(table.coords[depots]).nearest(table.coords[stops])
+    counts = np.bincount(nearest, minlength=len(depots))
+    trucks = allocate_trucks(counts, num_clusters) if clustering_type in ('K', 'VRP') else counts
+    active = np.flatnonzero(counts)
+    if clustering_type == 'DBSCAN':
+        # One radius for every depot, from the density of all the stops
+        eps = stats['eps_km'] = eps or (knee_eps(table.coords[stops]) if len(stops) > DBSCAN_MIN_SAMPLES else None)
+    depot_stats = {d: {} for d in active}
+    budget_end = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms > 0 else None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(DEPOT_WORKERS, len(active)))) as pool:
+        futures = [(d, pool.submit(plan_depot, table, int(depots[d]), stops[nearest == d], clustering_type, int(trucks[d]), budget_end, costs,
+                                          capacity, max_route_length, eps, depot_stats[d]))
+                   for d in active]
+    routes, route_depots = {}, {}
+    for d, future in futures:
+        for route in future.result():
+            label = len(routes)
+            routes[label] = route
+            route_depots[label] = int(depots[d])
+    stats['reassigned_stores'] = sum(s.get('reassigned_stores', 0) for s in depot_stats.values())
+    return routes, route_depots
+
+# Spatial index per store type, rebuilt when the CSVs change
+_store_indexes = {}
+
+def store_index(store_type=None):
+    """
+    Returns (StoreIndex, stores DataFrame) over all stores, or only those of store_type.
+    """
+    key = (route_cache.file_fingerprint(LOCATIONS_CSV, REQUIREMENTS_CSV), store_type)
+    if key not in _store_indexes:
+        stores = pd.merge(pd.read_csv(LOCATIONS_CSV), pd.read_csv(REQUIREMENTS_CSV), on='Name', how='left')
+        if store_type is not None:
+            stores = stores[stores['Type'].str.lower() == store_type.lower()]
+        stores = stores.reset_index(drop=True)
+        if any(cached[0] != key[0] for cached in _store_indexes):
+            _store_indexes.clear()
+        _store_indexes[key] = (spatial_index.StoreIndex(stores[['Latitude', 'Longitude']].values), stores)
+    return _store_indexes[key]
+
+def nearby_stores(lat, lon, k=None, radius_km=None, store_type=None):
+    """
+    The k nearest stores to a point, those within radius_km, or the k nearest within radius_km.
+    """
+    index, stores = store_index(store_type)
+    if k is not None:
+        distances, indices = index.k_nearest((lat, lon), k)
+        if radius_km is not None:
+            keep = distances <= radius_km
+            distances, indices = distances[keep], indices[keep]
+    else:
+        distances, indices = index.within_radius((lat, lon), radius_km)
+    return [
+        {
+            "name": stores.at[i, 'Name'],
+            "type": stores.at[i, 'Type'],
+            "latitude": float(stores.at[i, 'Latitude']),
+            "longitude": float(stores.at[i, 'Longitude']),
+            "requires_delivery": stores.at[i, 'RequiresDelivery'] == 'Yes',
+            "distance_km": round(float(d), 3),
+        }
+        for d, i in zip(distances, indices)
+    ]
+
 # Plotting function
-def plot_routes(starting_indigo, retailer_routes, mode):
+def plot_routes(table, starting_indigo, retailer_routes, mode, output_path='static/logistics/optimized_routes.png', route_depots=None, round_trip=False):
+    # One text artist per stop dominates rendering on large instances, and is unreadable there anyway
+    label_stops = sum(len(route) for route in retailer_routes.values()) <= large_routing.LARGE_INSTANCE_STOPS
     plt.figure(figsize=(10, 8))
     colors = ['red', 'green', 'purple', 'orange', 'cyan', 'magenta']
-    plt.scatter(starting_indigo['Longitude'], starting_indigo['Latitude'], color='blue', marker='s', s=300, label='Starting Indigo Store')
-    plt.text(starting_indigo['Longitude'], starting_indigo['Latitude'] + 0.002, starting_indigo['Name'], fontsize=9, ha='center')
-    for idx, route in enumerate(retailer_routes.values()):
+    depots = list(dict.fromkeys((route_depots or {}).values())) or [starting_indigo]
+    for idx, depot in enumerate(depots):
+        label = ('Indigo Depot' if route_depots else 'Starting Indigo Store') if idx == 0 else None
+        lat, lon = table.coords[depot]
+        plt.scatter(lon, lat, color='blue', marker='s', s=300, label=label)
+        plt.text(lon, lat + 0.002, table.names[depot], fontsize=9, ha='center')
+    for idx, (cluster_id, route) in enumerate(retailer_routes.items()):
         route_color = colors[idx % len(colors)]
-        route_points = [(starting_indigo['Latitude'], starting_indigo['Longitude'])] + [(r['Latitude'], r['Longitude']) for r in route]
-        for j in range(len(route_points) - 1):
-            plt.plot(
-                [route_points[j][1], route_points[j + 1][1]],
-                [route_points[j][0], route_points[j + 1][0]],
-                color=route_color, linestyle='-', linewidth=2
-            )
-        for retailer in route:
-            plt.scatter(retailer['Longitude'], retailer['Latitude'], color=route_color, marker='o', s=100)
-            plt.text(retailer['Longitude'], retailer['Latitude'] - 0.002, retailer['Name'], fontsize=8, ha='center')
+        depot = (route_depots or {}).get(cluster_id, starting_indigo)
+        path = table.coords[tour_points(depot, route, round_trip)]
+        plt.plot(path[:, 1], path[:, 0], color=route_color, linestyle='-', linewidth=2)
+        stops = table.coords[route]
+        plt.scatter(stops[:, 1], stops[:, 0], color=route_color, marker='o', s=100)
+        if label_stops:
+            for name, (lat, lon) in zip(table.names[route], stops):
+                plt.text(lon, lat - 0.002, name, fontsize=8, ha='center')
     plt.xlabel('Longitude')
     plt.ylabel('Latitude')
     plt.title(f"Optimized Delivery Routes ({mode})")
     plt.legend()
     plt.grid(True)
-    # Save to bytes buffer instead of file
-    plt.savefig('static/logistics/optimized_routes.png')
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    plt.savefig(output_path)
     plt.close()
-    return '/static/logistics/optimized_routes.png'
+    return '/' + output_path.replace(os.sep, '/')
 
-# Route report as JSON
-def write_route_report(starting_indigo, retailer_routes):
+# Route report as JSON; distances are great-circle km unless costs holds km already.
+# round_trip adds the leg back to the depot, as capacity-constrained routes end there.
+def write_route_report(table, starting_indigo, retailer_routes, route_depots=None, costs=None, round_trip=False):
     report_data = {
         "title": "Delivery Summary Report",
+        "distance_unit": "km",
         "routes": []
     }
     
     for cluster_id, route in retailer_routes.items():
+        depot = (route_depots or {}).get(cluster_id, starting_indigo)
         route_data = {
             "route_number": cluster_id + 1,
-            "starting_point": starting_indigo['Name'],
+            "starting_point": table.names[depot],
             "total_distance": 0,
             "stops": [],
             "surcharge_total": 0
         }
         
-        points = [starting_indigo] + route
-        leg_distances = []
+        points = tour_points(depot, route, round_trip)
 
         # Calculate distances
-        for i in range(len(points) - 1):
-            d = calculate_distance(
-                (points[i]['Latitude'], points[i]['Longitude']),
-                (points[i+1]['Latitude'], points[i+1]['Longitude'])
-            )
-            leg_distances.append(d)
-            route_data["total_distance"] += d
-
-        avg_leg = np.mean(leg_distances)
+        if costs is not None and costs.unit == "km":
+            leg_distances = costs.legs_at(points)
+        else:
+            leg_distances = cost_matrix.haversine_legs_km(table.coords[points])
+        route_data["total_distance"] = float(leg_distances.sum())
+        if costs is not None and costs.unit == "time":
+            route_data["total_travel_time"] = round(float(costs.legs_at(points).sum()), 3)
+
+        avg_leg = np.mean(leg_distances) if len(leg_distances) else 0.0
         
-        # Process stops
-        for i in range(len(route)):
-            stop_data = {
+        # Process stops; a stop's leg is the one that reaches it
+        legs = np.asarray(leg_distances[:len(route)], dtype=float)
+        detours = legs > avg_leg * OUTLIER_THRESHOLD
+        surcharges = np.where(detours, legs / 3 * SURCHARGE_PER_3KM, 0.0)
+        for i, name in enumerate(table.names[route]):
+            route_data["stops"].append({
                 "stop_number": i + 1,
-                "name": route[i]['Name'],
-                "surcharge": 0,
-                "has_detour": False
-            }
-            
-            if i < len(leg_distances):
-                leg = leg_distances[i]
-                if leg > avg_leg * OUTLIER_THRESHOLD:
-                    extra_km = leg * 111  # approx conversion: 1 degree ≈ 111 km
-                    surcharge = (extra_km / 3) * SURCHARGE_PER_3KM
-                    stop_data["surcharge"] = round(surcharge, 2)
-                    stop_data["has_detour"] = True
-                    route_data["surcharge_total"] += surcharge
-            
-            route_data["stops"].append(stop_data)
+                "name": name,
+                "surcharge": round(float(surcharges[i]), 2) if detours[i] else 0,
+                "has_detour": bool(detours[i])
+            })
+        route_data["surcharge_total"] = float(surcharges.sum())
         
         route_data["total_distance"] = round(route_data["total_distance"], 3)
         route_data["surcharge_total"] = round(route_data["surcharge_total"], 2)
         report_data["routes"].append(route_data)
-    
+
+    report_data["total_distance"] = round(sum(route["total_distance"] for route in report_data["routes"]), 3)
     return report_data
 
-# Main function
-def return_routes(known_k=True, num_clusters=None):
-    locations_df = pd.read_csv('static/logistics/bookstore_locations.csv')
-    requirements_df = pd.read_csv('static/logistics/delivery_requirements.csv')
-    merged_df = pd.merge(locations_df, requirements_df, on='Name')
-    delivery_stores = merged_df[merged_df['RequiresDelivery'] == 'Yes'].copy()
-    starting_indigo = merged_df[(merged_df['Type'] == 'Indigo') & (merged_df['RequiresDelivery'] == 'Yes')].iloc[0].to_dict()
-
-    if known_k:
-        routes = apply_clustering_and_tsp(delivery_stores, 'K', num_clusters)
+# Hash of every file a plan depends on
+def input_fingerprint():
+    inputs = [LOCATIONS_CSV, REQUIREMENTS_CSV]
+    if cost_matrix.COST_METRIC == "matrix" and os.path.exists(cost_matrix.TRAVEL_TIME_MATRIX):
+        inputs.append(cost_matrix.TRAVEL_TIME_MATRIX)
+    return route_cache.file_fingerprint(*inputs)
+
+# Cache key for a routing request; the CSV hash invalidates stale entries
+def route_cache_key(known_k=True, num_clusters=None, time_budget_ms=0, multi_depot=False, capacitated=False, capacity=None,
+                    max_route_length=None, eps=None):
+    return route_cache.make_key(
+        input_fingerprint(),
+        metric=cost_matrix.COST_METRIC,
+        known_k=known_k,
+        num_clusters=num_clusters if known_k or capacitated else None,
+        time_budget_ms=time_budget_ms,
+        multi_depot=multi_depot,
+        capacitated=capacitated,
+        capacity=(capacity or VRP_CAPACITY) if capacitated else None,
+        max_route_length=(max_route_length or VRP_MAX_ROUTE_LENGTH) if capacitated else None,
+        eps=(eps or DBSCAN_EPS) if not (known_k or capacitated) else None,
+    )
+
+def cached_routes(known_k=True, num_clusters=None, time_budget_ms=0, **options):
+    return route_cache.routes_cache.get(route_cache_key(known_k, num_clusters, time_budget_ms, **options))
+
+# Number of stores flagged for delivery, memoised per version of the requirements CSV
+_delivery_counts = {}
+
+def count_delivery_stores():
+    fingerprint = route_cache.file_fingerprint(REQUIREMENTS_CSV)
+    if fingerprint not in _delivery_counts:
+        flags = pd.read_csv(REQUIREMENTS_CSV, usecols=['RequiresDelivery'])['RequiresDelivery']
+        _delivery_counts.clear()
+        _delivery_counts[fingerprint] = int((flags == 'Yes').sum())
+    return _delivery_counts[fingerprint]
+
+# Delivery flag edits, written atomically so concurrent readers never see a partial CSV
+_requirements_lock = threading.Lock()
+
+def set_delivery_flags(changes):
+    """
+    Sets RequiresDelivery for {store name: bool} in the requirements CSV.
+    Returns (added, removed), the stores whose flag actually changed.
+    Raises ValueError for unknown stores.
+    """
+    with _requirements_lock:
+        requirements = pd.read_csv(REQUIREMENTS_CSV)
+        current = dict(zip(requirements['Name'], requirements['RequiresDelivery'] == 'Yes'))
+        unknown = [name for name in changes if name not in current]
+        if unknown:
+            raise ValueError(f"Unknown stores: {', '.join(unknown[:5])}")
+        added = [name for name, flag in changes.items() if flag and not current[name]]
+        removed = [name for name, flag in changes.items() if not flag and current[name]]
+        if added or removed:
+            flags = {**current, **{name: bool(flag) for name, flag in changes.items()}}
+            requirements['RequiresDelivery'] = ['Yes' if flags[name] else 'No' for name in requirements['Name']]
+            tmp_path = f"{REQUIREMENTS_CSV}.tmp"
+            requirements.to_csv(tmp_path, index=False)
+            os.replace(tmp_path, REQUIREMENTS_CSV)
+        return added, removed
+
+# Store table for the current CSVs, built once per version of them
+_tables = {}
+
+def load_table():
+    fingerprint = route_cache.file_fingerprint(LOCATIONS_CSV, REQUIREMENTS_CSV)
+    table = _tables.get(fingerprint)
+    if table is None:
+        table = large_routing.load_stores(LOCATIONS_CSV, REQUIREMENTS_CSV, DEMAND_COLUMN)
+        _tables.clear()
+        _tables[fingerprint] = table
+    return table
+
+# Compact plan kept with each result so route_updates can repair it instead of re-solving
+def route_plan(table, routes, route_depots, report, mode_text, round_trip=False, capacity=None, max_route_length=None, repairable=True):
+    stops = sum(len(route) for route in routes.values())
+    return {
+        "mode": mode_text,
+        "routes": [table.names[route].tolist() for route in routes.values()],
+        "depots": [table.names[route_depots[label]] for label in routes],
+        "round_trip": round_trip,
+        "capacity": capacity,
+        "max_route_length": max_route_length,
+        "repairable": repairable,
+        "distance_per_stop": report["total_distance"] / stops if stops else 0.0,  # at the last full solve
+        "changed_stores": 0,                                                        # flag changes repaired since
+    }
+
+# Shared cost matrix for every store, in table order; an unusable travel-time file falls back to haversine
+def load_costs(table):
+    try:
+        return cost_matrix.for_table(table)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Cost matrix unavailable ({e}); using haversine distances")
+        return cost_matrix.for_table(table, "haversine")
+
+# Plot of a plan summary from route_plan, without solving again
+def plot_plan(plan, output_path, multi_depot=False):
+    table = load_table()
+    routes = {label: table.indices(route) for label, route in enumerate(plan["routes"])}
+    depots = {label: int(depot) for label, depot in enumerate(table.indices(plan["depots"]))}
+    starting_indigo = depots[0] if depots else table.starting_store()
+    return plot_routes(table, starting_indigo, routes, plan["mode"], output_path, depots if multi_depot else None, plan["round_trip"])
+
+# Solve without plotting
+def plan_routes(known_k=True, num_clusters=None, time_budget_ms=0, multi_depot=False, capacitated=False, capacity=None,
+                max_route_length=None, eps=None):
+    """
+    Returns {"table", "starting_indigo", "routes", "route_depots", "mode", "report", "plan"};
+    stores, routes and depots are indices into table.
+    capacitated replaces clustering with capacity-constrained routing (round trips);
+    num_clusters is then the number of trucks the demand is split over. eps
+    overrides DBSCAN_EPS, in km.
+    """
+    table = load_table()
+    delivery_stores = table.delivery_stops()
+    starting_indigo = None if multi_depot else table.starting_store()
+    costs = load_costs(table)
+    stats = {}
+
+    route_depots = None
+    if multi_depot:
+        clustering_type = 'VRP' if capacitated else 'K' if known_k else 'DBSCAN'
+        routes, route_depots = plan_multi_depot(table, clustering_type, num_clusters, time_budget_ms, costs, capacity, max_route_length, eps, stats)
+        # Every Indigo store is a depot here, so none has to be flagged for delivery
+        starting_indigo = next(iter(route_depots.values())) if route_depots else table.starting_store()
+        clustering_text = f"Capacitated, {len(routes)} routes" if capacitated else f"K-Means, K={len(routes)}" if known_k else "DBSCAN, Dynamic K"
+        mode_text = f"Multi-depot, {clustering_text}"
+    elif capacitated:
+        routes = apply_clustering_and_tsp(table, delivery_stores, 'VRP', num_clusters, starting_indigo, time_budget_ms, costs, capacity, max_route_length)
+        mode_text = f"Capacitated (Clarke-Wright, {len(routes)} routes)"
+    elif known_k:
+        routes = apply_clustering_and_tsp(table, delivery_stores, 'K', num_clusters, starting_indigo, time_budget_ms, costs)
         mode_text = f"Unsupervised (K-Means, K={num_clusters})"
     else:
-        routes = apply_clustering_and_tsp(delivery_stores, 'DBSCAN')
+        routes = apply_clustering_and_tsp(table, delivery_stores, 'DBSCAN', starting_indigo=starting_indigo, time_budget_ms=time_budget_ms,
+                                          costs=costs, eps=eps, stats=stats)
         mode_text = "Unsupervised (DBSCAN, Dynamic K)"
 
-    plot_path = plot_routes(starting_indigo, routes, mode_text)
-    route_report = write_route_report(starting_indigo, routes)
-    
-    
+    route_report = write_route_report(table, starting_indigo, routes, route_depots, costs, capacitated)
+    if not (known_k or capacitated):
+        route_report["eps_km"] = None if stats.get('eps_km') is None else round(stats['eps_km'], 3)
+        route_report["reassigned_stores"] = stats.get('reassigned_stores', 0)
+
+    # Capacity of the single-depot plan; multi-depot capacities differ per depot and are not kept
+    plan_capacity = None
+    if capacitated and not multi_depot:
+        stops = delivery_stores[delivery_stores != starting_indigo]
+        plan_capacity = truck_capacity(store_demand(table, stops).sum(), num_clusters, capacity)
     return {
-        "plot": plot_path,
-        "report": route_report
+        "table": table,
+        "starting_indigo": starting_indigo,
+        "routes": routes,
+        "route_depots": route_depots,
+        "mode": mode_text,
+        "report": route_report,
+        "plan": route_plan(table, routes, route_depots or {label: starting_indigo for label in routes}, route_report, mode_text,
+                           capacitated, plan_capacity, max_route_length or VRP_MAX_ROUTE_LENGTH or None,
+                           repairable=not (capacitated and multi_depot)),
     }
 
+# Main function
+def return_routes(known_k=True, num_clusters=None, time_budget_ms=0, multi_depot=False, capacitated=False, capacity=None,
+                  max_route_length=None, eps=None):
+    """
+    Solved plan with its plot, cached per request; see plan_routes for the options.
+    """
+    cache_key = route_cache_key(known_k, num_clusters, time_budget_ms, multi_depot, capacitated, capacity, max_route_length, eps)
+    cached = route_cache.routes_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
+    planned = plan_routes(known_k, num_clusters, time_budget_ms, multi_depot, capacitated, capacity, max_route_length, eps)
+    result = {
+        "plot": plot_routes(planned["table"], planned["starting_indigo"], planned["routes"], planned["mode"], route_cache.plot_path(cache_key),
+                            planned["route_depots"], capacitated),
+        "report": planned["report"],
+        "plan": planned["plan"],
+    }
+    route_cache.routes_cache.put(cache_key, result)
+    return result
@@ -0,0 +1,171 @@
+'''
+Pricing engine for returned books
+
+publisher_rules.json is compiled once into a dense NumPy table of discount
+rates indexed by (publisher, damage type, severity). Every price is then a
+table lookup, and many books can be priced in one vectorized call. The file
+is recompiled when its mtime changes. The file may be the flat
+{damage type: {severity: rate}} map used for every publisher, or:
+
+    {
+        "default": {"Corner Damage": {"1": 0.05, ...}, ...},
+        "devaluation_rate": 0.0,
+        "age_curve": [[0, 0.0], [180, 0.1], [365, 0.2]],
+        "publishers": {
+            "Penguin": {"devaluation_rate": 0.02, "Water Damage": {"1": 0.15}}
+        }
+    }
+
+Publisher rules override the defaults per (damage type, severity) and fall
+back to them otherwise. A devaluation rate scales the discount down:
+rate * (1 - devaluation_rate). Unknown damage types and severities get no
+discount. The age curve maps days in stock to the further share of value
+lost, interpolated linearly between points; it is applied at revaluation.
+'''
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# ------------------ CONFIG ------------------
+RULES_PATH = os.getenv("PUBLISHER_RULES", "publisher_rules.json")
+MAX_SEVERITY = 5
+AGE_CURVE = [[0, 0.0], [90, 0.05], [180, 0.10], [365, 0.20], [730, 0.30]]  # (days in stock, value lost) unless the rules file sets age_curve
+RELOAD_CHECK_INTERVAL = 1.0   # Seconds between mtime checks of the rules file
+# --------------------------------------------
+
+def _normalize(name):
+    # "corner_damage", "Corner Damage " and "CORNER DAMAGE" are the same key
+    return " ".join(str(name).replace("_", " ").split()).lower() if name is not None else ""
+
+
+def _lookup_indices(values, lookup):
+    # Normalizes each distinct value once, however many books share it
+    values = np.asarray(values, dtype=object).astype(str)
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.array([lookup(value) for value in unique], dtype=np.intp)[inverse]
+
+
+class CompiledRules:
+    """
+    rates[publisher, damage type, severity]. Publisher 0 holds the defaults;
+    the last damage type row and severity column are all-zero sinks for
+    unknown values.
+    """
+    def __init__(self, rules):
+        if "default" in rules or "publishers" in rules:
+            default = rules.get("default", {})
+            publishers = rules.get("publishers", {})
+            default_devaluation = float(rules.get("devaluation_rate", 0.0))
+        else:
+            default, publishers, default_devaluation = rules, {}, 0.0
+        age_curve = sorted(rules.get("age_curve") or AGE_CURVE)
+        self.age_days = np.array([float(days) for days, _ in age_curve])
+        self.age_rates = np.array([float(rate) for _, rate in age_curve])
+
+        tables = [default] + [{k: v for k, v in p.items() if k != "devaluation_rate"} for p in publishers.values()]
+        self.damage_types = {}
+        for table in tables:
+            for damage_type in table:
+                self.damage_types.setdefault(_normalize(damage_type), len(self.damage_types))
+        self.publishers = {_normalize(name): index + 1 for index, name in enumerate(publishers)}
+
+        self.rates = np.zeros((len(publishers) + 1, len(self.damage_types) + 1, MAX_SEVERITY + 2))
+        self._fill(0, default)
+        for index, publisher_rules in enumerate(publishers.values(), start=1):
+            self.rates[index] = self.rates[0]
+            self._fill(index, publisher_rules)
+
+        self.devaluation = np.full(len(publishers) + 1, default_devaluation)
+        for index, publisher_rules in enumerate(publishers.values(), start=1):
+            self.devaluation[index] = float(publisher_rules.get("devaluation_rate", default_devaluation))
+
+    def _fill(self, publisher_index, table):
+        for damage_type, severities in table.items():
+            if not isinstance(severities, dict):
+                continue
+            row = self.damage_types[_normalize(damage_type)]
+            for severity, rate in severities.items():
+                if 1 <= int(severity) <= MAX_SEVERITY:
+                    self.rates[publisher_index, row, int(severity)] = float(rate)
+
+    def publisher_index(self, publisher):
+        return self.publishers.get(_normalize(publisher), 0)
+
+    def damage_type_index(self, damage_type):
+        return self.damage_types.get(_normalize(damage_type), len(self.damage_types))
+
+
+class PricingEngine:
+    def __init__(self, path=RULES_PATH):
+        self.path = path
+        self._compiled = None
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def rules(self):
+        """
+        Returns the compiled rules, recompiling if the file changed since the last check.
+        """
+        now = time.monotonic()
+        if self._compiled is not None and now - self._checked < RELOAD_CHECK_INTERVAL:
+            return self._compiled
+        with self._lock:
+            self._checked = now
+            mtime = os.stat(self.path).st_mtime_ns
+            if self._compiled is None or mtime != self._mtime:
+                with open(self.path, 'r') as f:
+                    self._compiled = CompiledRules(json.load(f))
+                self._mtime = mtime
+            return self._compiled
+
+    def discount_rate(self, damage_type, severity, publisher=None, devaluation_rate=None):
+        rules = self.rules()
+        publisher_index = rules.publisher_index(publisher)
+        try:
+            severity = int(severity)
+        except (TypeError, ValueError):
+            severity = MAX_SEVERITY + 1
+        if not 1 <= severity <= MAX_SEVERITY:
+            severity = MAX_SEVERITY + 1
+        rate = rules.rates[publisher_index, rules.damage_type_index(damage_type), severity]
+        if devaluation_rate is None:
+            devaluation_rate = rules.devaluation[publisher_index]
+        return float(rate * (1 - devaluation_rate))
+
+    def price(self, original_price, damage_type, severity, publisher=None, devaluation_rate=None):
+        """
+        Returns {"discounted_price", "discount_rate"} for one book.
+        """
+        discount_rate = self.discount_rate(damage_type, severity, publisher, devaluation_rate)
+        return {"discounted_price": original_price * (1 - discount_rate), "discount_rate": discount_rate}
+
+    def price_many(self, original_prices, damage_types, severities, publishers=None, devaluation_rate=None, ages_days=None):
+        """
+        Prices many books at once. Arguments are equal-length sequences; publishers
+        may be None for the defaults and devaluation_rate a scalar or sequence
+        overriding the rules. ages_days applies the age curve on top of the damage
+        discount. Returns (discounted_prices, discount_rates) arrays.
+        """
+        rules = self.rules()
+        original_prices = np.asarray(original_prices, dtype=float)
+        type_index = _lookup_indices(damage_types, rules.damage_type_index)
+        publisher_index = (np.zeros(len(original_prices), dtype=np.intp) if publishers is None
+                           else _lookup_indices(publishers, rules.publisher_index))
+        severity = np.asarray(severities, dtype=float)  # None becomes NaN
+        valid = (severity >= 1) & (severity <= MAX_SEVERITY) & (severity == np.floor(severity))
+        severity_index = np.where(valid, np.nan_to_num(severity), MAX_SEVERITY + 1).astype(np.intp)
+
+        rates = rules.rates[publisher_index, type_index, severity_index]
+        devaluation = rules.devaluation[publisher_index] if devaluation_rate is None else np.asarray(devaluation_rate, dtype=float)
+        discount_rates = rates * (1 - devaluation)
+        if ages_days is not None:
+            age_rates = np.interp(np.nan_to_num(np.asarray(ages_days, dtype=float)), rules.age_days, rules.age_rates)
+            discount_rates = 1 - (1 - discount_rates) * (1 - age_rates)
+        return original_prices * (1 - discount_rates), discount_rates
+
+
+engine = PricingEngine()
@@ -0,0 +1,135 @@
+'''
+Bulk catalog revaluation
+
+Prices are fixed at upload time, so they go stale when publisher rules
+change or stock ages. This job walks the unsold books in id order, CHUNK_SIZE
+rows at a time, and reprices each chunk with one vectorized pricing call
+using the current rules and the age curve. Only rows whose price or discount
+moved are written back. Each chunk is read and written in its own IMMEDIATE
+transaction, so a concurrent edit is never overwritten with a stale price. A
+dry run writes nothing and returns the diff.
+
+    python revaluation.py [--dry-run] [--chunk-size N] [--diff-limit N]
+'''
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import catalog
+import pricing
+
+# ------------------ CONFIG ------------------
+CHUNK_SIZE = 5000             # Books read, repriced and written per transaction
+DIFF_LIMIT = 100              # Changed books listed in the report
+PRICE_TOLERANCE = 0.005       # Price moves below half a cent are not written
+RATE_TOLERANCE = 1e-6
+# --------------------------------------------
+
+READ_COLUMNS = ["id", "name", "publisher", "type", "damage_level", "discount", "price", "original_price", "added_at"]
+NUMERIC_COLUMNS = ["damage_level", "discount", "price", "original_price", "added_at"]
+
+class RevaluationRunning(Exception):
+    pass
+
+
+_running = threading.Lock()
+
+def reprice_chunk(chunk, now):
+    """
+    Adds new_price, new_discount and changed columns to a DataFrame of catalog rows.
+    Books stored before original_price was recorded get it back from price and discount.
+    """
+    chunk[NUMERIC_COLUMNS] = chunk[NUMERIC_COLUMNS].astype(float)
+    discount = chunk["discount"].fillna(0.0)
+    recovered = chunk["original_price"].isna() & chunk["price"].notna() & (discount < 1)
+    chunk.loc[recovered, "original_price"] = chunk["price"] / (1 - discount)
+
+    ages_days = (now - chunk["added_at"].fillna(now)).clip(lower=0) / 86400
+    prices, rates = pricing.engine.price_many(
+        chunk["original_price"].fillna(0.0), chunk["type"], chunk["damage_level"], chunk["publisher"], ages_days=ages_days)
+    chunk["new_price"] = prices
+    chunk["new_discount"] = rates
+
+    priceable = chunk["original_price"].notna()
+    moved = (
+        chunk["price"].isna() | chunk["discount"].isna()
+        | ((chunk["new_price"] - chunk["price"]).abs() > PRICE_TOLERANCE)
+        | ((chunk["new_discount"] - chunk["discount"]).abs() > RATE_TOLERANCE)
+    )
+    chunk["changed"] = priceable & (moved | recovered)
+    return chunk
+
+def _read_chunk(conn, last_id, chunk_size):
+    rows = conn.execute(
+        f"SELECT {', '.join(READ_COLUMNS)} FROM books WHERE id > ? AND sold = 0 ORDER BY id LIMIT ?",
+        (last_id, chunk_size),
+    ).fetchall()
+    return pd.DataFrame.from_records([tuple(row) for row in rows], columns=READ_COLUMNS)
+
+def revalue(dry_run=False, chunk_size=CHUNK_SIZE, diff_limit=DIFF_LIMIT, now=None):
+    """
+    Reprices every unsold book and returns a report with counts, value totals,
+    throughput and up to diff_limit changed books.
+    Raises RevaluationRunning if another revaluation is in progress.
+    """
+    if not _running.acquire(blocking=False):
+        raise RevaluationRunning("A revaluation is already running")
+    try:
+        return _revalue(dry_run, chunk_size, diff_limit, now or time.time())
+    finally:
+        _running.release()
+
+def _revalue(dry_run, chunk_size, diff_limit, now):
+    conn = catalog.get_connection()
+    started = time.perf_counter()
+    report = {"dry_run": dry_run, "scanned": 0, "changed": 0, "unpriceable": 0,
+              "value_before": 0.0, "value_after": 0.0, "diff": []}
+    last_id = 0
+    while True:
+        with conn:
+            if not dry_run:
+                conn.execute("BEGIN IMMEDIATE")  # hold the write lock from read to write
+            chunk = _read_chunk(conn, last_id, chunk_size)
+            if chunk.empty:
+                break
+            chunk = reprice_chunk(chunk, now)
+            changed = chunk[chunk["changed"]]
+            if not dry_run and not changed.empty:
+                catalog.update_prices(conn, zip(changed["new_price"].tolist(), changed["new_discount"].tolist(),
+                                                changed["original_price"].tolist(), changed["id"].tolist()))
+
+        last_id = int(chunk["id"].iloc[-1])
+        report["scanned"] += len(chunk)
+        report["changed"] += len(changed)
+        report["unpriceable"] += int(chunk["original_price"].isna().sum())
+        report["value_before"] += float(np.nansum(changed["price"]))
+        report["value_after"] += float(changed["new_price"].sum())
+        for row in changed.head(diff_limit - len(report["diff"])).itertuples():
+            report["diff"].append({
+                "id": int(row.id), "name": row.name,
+                "price": None if pd.isna(row.price) else round(row.price, 2), "new_price": round(row.new_price, 2),
+                "discount": None if pd.isna(row.discount) else round(row.discount, 4), "new_discount": round(row.new_discount, 4),
+            })
+
+    elapsed = time.perf_counter() - started
+    report["value_before"] = round(report["value_before"], 2)
+    report["value_after"] = round(report["value_after"], 2)
+    report["elapsed_s"] = round(elapsed, 3)
+    report["rows_per_s"] = round(report["scanned"] / elapsed) if elapsed else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprice the catalog from the current rules and stock age")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing them")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--diff-limit", type=int, default=DIFF_LIMIT)
+    args = parser.parse_args()
+    print(json.dumps(revalue(args.dry_run, args.chunk_size, args.diff_limit), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+'''
+Route result cache: in-memory LRU with an optional on-disk tier
+
+Entries are keyed on a hash of the logistics CSVs plus the request
+parameters, so editing either CSV invalidates old results automatically.
+'''
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# ------------------ CONFIG ------------------
+MEMORY_MAX_ENTRIES = 64   # LRU bound for the in-process tier
+DISK_MAX_ENTRIES = 512    # Bound for the on-disk tier (oldest files are evicted first)
+CACHE_DIR = os.getenv("ROUTE_CACHE_DIR", "static/logistics/route_cache")  # Also holds the cached plots
+DISK_ENABLED = os.getenv("ROUTE_CACHE_DISK", "1") == "1"
+# --------------------------------------------
+
+_fingerprints = {}  # path -> (mtime_ns, size, sha256) so unchanged files are not re-hashed
+
+def file_fingerprint(*paths):
+    """
+    Combined SHA-256 of the given files' contents.
+    """
+    combined = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        known = _fingerprints.get(path)
+        if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            digest = known[2]
+        else:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            _fingerprints[path] = (stat.st_mtime_ns, stat.st_size, digest)
+        combined.update(digest.encode())
+    return combined.hexdigest()
+
+def make_key(fingerprint, **params):
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{fingerprint}:{payload}".encode()).hexdigest()
+
+def plot_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.png")
+
+
+class RouteCache:
+    def __init__(self, max_entries=MEMORY_MAX_ENTRIES, disk_dir=CACHE_DIR, disk_enabled=DISK_ENABLED, disk_max_entries=DISK_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_enabled = disk_enabled
+        self.disk_max_entries = disk_max_entries
+        self._entries = OrderedDict()
+        self._revisions = {}   # key -> bumped whenever the key's value is replaced
+        self._revision = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key, value, persist=True):
+        with self._lock:
+            self._store(key, value)
+        if persist and self.disk_enabled:
+            self._write_disk(key, value)
+
+    def revision(self, key):
+        """
+        Changes whenever the entry under key is replaced, e.g. by a route repair
+        or a fleet sweep, so callers can key derived data such as serialized
+        responses on (key, revision). None when the key is not in memory.
+        """
+        with self._lock:
+            return self._revisions.get(key)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _store(self, key, value):
+        if self._entries.get(key) is not value:
+            self._revision += 1
+            self._revisions[key] = self._revision
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._revisions.pop(evicted, None)
+            if not (self.disk_enabled and os.path.exists(self._entry_path(evicted))):
+                _remove(plot_path(evicted))
+
+    def _entry_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_enabled:
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r') as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        os.utime(path)  # refresh recency for disk eviction
+        return value
+
+    def _write_disk(self, key, value):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._entry_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write route cache entry: {e}")
+            _remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = [e for e in os.scandir(self.disk_dir) if e.name.endswith('.json')]
+        if len(entries) <= self.disk_max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.disk_max_entries]:
+            key = entry.name[:-len('.json')]
+            _remove(entry.path)
+            with self._lock:
+                in_memory = key in self._entries
+            if not in_memory:
+                _remove(plot_path(key))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+routes_cache = RouteCache()
@@ -0,0 +1,126 @@
+'''
+Route solving off the event loop
+
+Solves run in a bounded process pool so pandas, scikit-learn and matplotlib
+never block uvicorn. Small inputs are awaited inline; large ones become jobs
+that clients poll by ID.
+'''
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import logistics
+import route_cache
+
+# ------------------ CONFIG ------------------
+ROUTE_WORKERS = int(os.getenv("ROUTE_WORKERS", "2"))  # Processes solving routes in parallel
+MAX_PENDING_JOBS = 32         # Queued + running jobs before new submissions are rejected
+FINISHED_JOBS_KEPT = 256      # Completed jobs kept around for status polling
+SYNC_MAX_STOPS = 200          # Inputs up to this many delivery stores are answered in the request
+# --------------------------------------------
+
+class JobQueueFull(Exception):
+    pass
+
+
+_executor = None
+_jobs = OrderedDict()  # job_id -> job dict, oldest first
+_lock = threading.Lock()
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=ROUTE_WORKERS)
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _pending_count():
+    return sum(1 for job in _jobs.values() if job["status"] in ("queued", "running"))
+
+def _prune_finished():
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] in ("done", "failed")]
+    for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+        del _jobs[job_id]
+
+def _submit(known_k, num_clusters, time_budget_ms, options):
+    # Results come back from another process, so keep a copy in this process's cache too
+    cache_key = logistics.route_cache_key(known_k, num_clusters, time_budget_ms, **options)
+    future = get_executor().submit(logistics.return_routes, known_k, num_clusters, time_budget_ms, **options)
+
+    def remember(done):
+        if not done.cancelled() and done.exception() is None:
+            route_cache.routes_cache.put(cache_key, done.result(), persist=False)
+
+    future.add_done_callback(remember)
+    return future
+
+async def run(known_k=True, num_clusters=None, time_budget_ms=0, **options):
+    """
+    Solves in the pool and waits for the result without blocking the event loop.
+    options are passed on to logistics.return_routes.
+    """
+    return await asyncio.wrap_future(_submit(known_k, num_clusters, time_budget_ms, options))
+
+async def render_plot(*args):
+    """
+    Runs logistics.plot_routes in the pool, keeping matplotlib out of the API process.
+    """
+    return await asyncio.wrap_future(get_executor().submit(logistics.plot_routes, *args))
+
+def submit(known_k=True, num_clusters=None, time_budget_ms=0, **options):
+    """
+    Queues a solve and returns its job ID. Raises JobQueueFull when the pool is saturated.
+    """
+    with _lock:
+        if _pending_count() >= MAX_PENDING_JOBS:
+            raise JobQueueFull(f"Too many route jobs in progress (limit {MAX_PENDING_JOBS})")
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        _jobs[job_id] = job
+
+    future = _submit(known_k, num_clusters, time_budget_ms, options)
+
+    def finish(done):
+        with _lock:
+            job["finished_at"] = time.time()
+            if done.cancelled():
+                job["status"], job["error"] = "failed", "cancelled"
+            elif done.exception() is not None:
+                job["status"], job["error"] = "failed", str(done.exception())
+            else:
+                job["status"], job["result"] = "done", done.result()
+            _prune_finished()
+
+    with _lock:
+        job["future"] = future
+    future.add_done_callback(finish)
+    return job_id
+
+def get_job(job_id):
+    """
+    Returns a JSON-safe snapshot of the job, or None if the ID is unknown.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        future = job.get("future")
+        if job["status"] == "queued" and future is not None and future.running():
+            job["status"] = "running"
+        return {key: value for key, value in job.items() if key != "future"}
@@ -0,0 +1,241 @@
+'''
+Incremental re-routing when delivery requirements change
+
+Every routing result carries a compact plan: the stores of each route and
+its depot. When RequiresDelivery flags change, that plan is repaired instead
+of solved again. Removed stores are cut out of their route. Added stores go
+to the route whose centroid is nearest, at their cheapest insertion point;
+a capacitated plan moves on to the next nearest route when a truck is full.
+Only the routes that changed get a short 2-opt / Or-opt pass. Plans and
+their centroids are kept in memory, so a small edit costs milliseconds plus
+the plot.
+
+A full solve runs instead when there is no earlier plan, when an Indigo
+store changes (the depots may move), when more than MAX_CHANGED_SHARE of
+the stops changed since the last full solve, when distance per stop grew
+more than MAX_DEGRADATION, or when no route has room for an added store.
+'''
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import cost_matrix
+import logistics
+import route_cache
+import route_jobs
+import vrp
+
+# ------------------ CONFIG ------------------
+MAX_CHANGED_SHARE = 0.2       # Stores added or removed since the last full solve, as a share of stops
+MAX_DEGRADATION = 0.10        # Growth in distance per stop over the last full solve before re-solving
+REPAIR_BUDGET_MS = 20         # Improvement time per repaired route
+PLANS_KEPT = 16               # Repaired plans kept in memory with their centroids
+# --------------------------------------------
+
+class FullSolveNeeded(Exception):
+    pass
+
+
+class Plan:
+    """
+    Routes and depots as rows of a store_table.StoreTable, with route
+    centroids, built from the "plan" entry of a routing result.
+    """
+    def __init__(self, summary, table):
+        self.summary = summary
+        self.table = table
+        try:
+            self.routes = [table.indices(route) for route in summary["routes"]]
+            self.depots = table.indices(summary["depots"])
+        except KeyError as e:
+            raise FullSolveNeeded(f"{e.args[0]} is no longer a known store")
+        self.centroids = np.array([self._centroid(route) for route in self.routes]).reshape(-1, 2)
+
+    def _centroid(self, route):
+        return self.table.coords[route].mean(axis=0) if len(route) else np.full(2, np.nan)
+
+    def copy(self):
+        plan = Plan.__new__(Plan)
+        plan.summary = dict(self.summary)
+        plan.table = self.table
+        plan.routes = list(self.routes)  # route arrays are replaced, never changed in place
+        plan.depots = self.depots.copy()
+        plan.centroids = self.centroids.copy()
+        return plan
+
+    def points(self, r):
+        return logistics.tour_points(self.depots[r], self.routes[r], self.summary["round_trip"])
+
+    def fits(self, r, store, extra, costs):
+        capacity = self.summary.get("capacity")
+        if capacity and logistics.store_demand(self.table, self.routes[r]).sum() + logistics.store_demand(self.table, store) > capacity:
+            return False
+        max_length = self.summary.get("max_route_length")
+        if max_length and costs.legs_at(self.points(r)).sum() + extra > max_length:
+            return False
+        return True
+
+    def insert(self, store, costs):
+        """
+        Cheapest insertion into the nearest route (by centroid) that has room.
+        Returns the route index.
+        """
+        live = [r for r, route in enumerate(self.routes) if len(route)]
+        if not live:
+            raise FullSolveNeeded("no routes left to insert into")
+        distances = cost_matrix.haversine_km(self.table.coords[[store]], self.centroids[live])[0]
+        for r in (live[i] for i in np.argsort(distances, kind='stable')):
+            extra = logistics.insertion_costs(self.points(r), store, costs, self.summary["round_trip"])
+            k = int(np.argmin(extra))
+            if self.fits(r, store, extra[k], costs):
+                self.routes[r] = np.insert(self.routes[r], k, store)
+                self.centroids[r] = self._centroid(self.routes[r])
+                return r
+        raise FullSolveNeeded(f"no route has room for {self.table.names[store]}")
+
+    def remove(self, store):
+        for r, route in enumerate(self.routes):
+            at = np.flatnonzero(route == store)
+            if len(at):
+                self.routes[r] = np.delete(route, at)
+                self.centroids[r] = self._centroid(self.routes[r])
+                return r
+        return None  # not routed
+
+    def improve(self, r, costs):
+        route, depot = self.routes[r], self.depots[r]
+        deadline = time.perf_counter() + REPAIR_BUDGET_MS / 1000
+        if not self.summary["round_trip"]:
+            self.routes[r] = logistics.improve_route(self.table, depot, route, deadline, costs)
+            return
+        dist = logistics.store_costs(costs, logistics.tour_points(depot, route))
+        if dist is not None:
+            order, _ = vrp.two_opt(list(range(1, len(route) + 1)), dist, deadline)
+            self.routes[r] = route[np.asarray(order, dtype=np.intp) - 1]
+
+    def drop_empty(self):
+        keep = [r for r, route in enumerate(self.routes) if len(route)]
+        self.routes = [self.routes[r] for r in keep]
+        self.depots = self.depots[keep]
+        self.centroids = self.centroids[keep]
+        return {r: new for new, r in enumerate(keep)}
+
+    def labelled(self, multi_depot):
+        # (routes, route_depots) as logistics.plot_routes and write_route_report take them
+        routes = dict(enumerate(self.routes))
+        return routes, {label: int(depot) for label, depot in enumerate(self.depots)} if multi_depot else None
+
+
+def repair(plan, added, removed, table, multi_depot=False):
+    """
+    Applies the flag changes to a copy of plan, whose stores are looked up in
+    table. Returns (plan, report, changed route numbers). Raises
+    FullSolveNeeded when the plan should be re-solved.
+    """
+    summary = plan.summary
+    if not summary.get("repairable", True):
+        raise FullSolveNeeded("capacitated multi-depot plans are always re-solved")
+    if plan.table is not table:
+        plan = Plan(summary, table)  # stores are rows of the table the plan was built against
+    added, removed = table.indices(added), table.indices(removed)
+    if table.rows['indigo'][np.concatenate((added, removed))].any():
+        raise FullSolveNeeded("an Indigo store changed, so the depots may move")
+    changed_stores = summary["changed_stores"] + len(added) + len(removed)
+    if changed_stores > MAX_CHANGED_SHARE * max(sum(len(route) for route in plan.routes), 1):
+        raise FullSolveNeeded(f"{changed_stores} stores changed since the last full solve")
+
+    plan = plan.copy()
+    costs = logistics.load_costs(table)
+    affected = {plan.remove(store) for store in removed} - {None}
+    affected |= {plan.insert(store, costs) for store in added}
+    for r in affected:
+        if len(plan.routes[r]):
+            plan.improve(r, costs)
+    renumbered = plan.drop_empty()
+    stops = sum(len(route) for route in plan.routes)
+    if not stops:
+        raise FullSolveNeeded("no stops left to route")
+
+    routes, route_depots = plan.labelled(multi_depot)
+    report = logistics.write_route_report(table, int(plan.depots[0]), routes, route_depots, costs, summary["round_trip"])
+    distance_per_stop = report["total_distance"] / stops
+    if distance_per_stop > summary["distance_per_stop"] * (1 + MAX_DEGRADATION):
+        growth = distance_per_stop / summary["distance_per_stop"] - 1
+        raise FullSolveNeeded(f"distance per stop grew {growth:.0%} since the last full solve")
+
+    plan.summary.update(
+        routes=[table.names[route].tolist() for route in plan.routes],
+        depots=table.names[plan.depots].tolist(),
+        changed_stores=changed_stores,
+    )
+    return plan, report, sorted(renumbered[r] + 1 for r in affected if r in renumbered)
+
+
+_plans = OrderedDict()  # result cache key -> Plan
+_plans_lock = threading.Lock()
+_update_lock = asyncio.Lock()
+
+def _remember(key, plan):
+    with _plans_lock:
+        _plans[key] = plan
+        _plans.move_to_end(key)
+        while len(_plans) > PLANS_KEPT:
+            _plans.popitem(last=False)
+
+def _load_plan(key, table):
+    with _plans_lock:
+        plan = _plans.get(key)
+    if plan is not None:
+        return plan
+    result = route_cache.routes_cache.get(key)
+    if result is None or "plan" not in result:
+        raise FullSolveNeeded("no earlier plan for these options")
+    return Plan(result["plan"], table)
+
+def _load(old_key):
+    table = logistics.load_table()
+    return table, _load_plan(old_key, table)
+
+def _save_flags(changes, known_k, num_clusters, time_budget_ms, options):
+    # Runs in a thread: hashing the CSVs and the cache's disk tier both block
+    old_key = logistics.route_cache_key(known_k, num_clusters, time_budget_ms, **options)
+    added, removed = logistics.set_delivery_flags(changes)
+    new_key = logistics.route_cache_key(known_k, num_clusters, time_budget_ms, **options)
+    return old_key, new_key, added, removed, route_cache.routes_cache.get(new_key)
+
+async def _repair(old_key, new_key, added, removed, multi_depot):
+    table, plan = await asyncio.to_thread(_load, old_key)
+    started = time.perf_counter()
+    plan, report, changed_routes = await asyncio.to_thread(repair, plan, added, removed, table, multi_depot)
+    repair_ms = round((time.perf_counter() - started) * 1000, 1)
+    routes, route_depots = plan.labelled(multi_depot)
+    plot = await route_jobs.render_plot(table, int(plan.depots[0]), routes, plan.summary["mode"], route_cache.plot_path(new_key),
+                                        route_depots, plan.summary["round_trip"])
+    result = {"plot": plot, "report": report, "plan": plan.summary}
+    await asyncio.to_thread(route_cache.routes_cache.put, new_key, result)
+    _remember(new_key, plan)
+    return result, changed_routes, repair_ms
+
+async def apply(changes, known_k=True, num_clusters=None, time_budget_ms=0, **options):
+    """
+    Sets RequiresDelivery for {store name: bool} and returns the routing result
+    for the new requirements, with an "update" entry saying what was added,
+    removed and re-routed, and why a full solve ran if one did.
+    options are those of logistics.return_routes. Raises ValueError for unknown stores.
+    """
+    async with _update_lock:
+        started = time.perf_counter()
+        old_key, new_key, added, removed, result = await asyncio.to_thread(
+            _save_flags, changes, known_k, num_clusters, time_budget_ms, options)
+        update = {"added": added, "removed": removed, "routes_changed": [], "full_solve": False, "reason": None, "repair_ms": None}
+        if result is None:
+            try:
+                result, update["routes_changed"], update["repair_ms"] = await _repair(old_key, new_key, added, removed, options.get("multi_depot", False))
+            except FullSolveNeeded as e:
+                update["full_solve"], update["reason"] = True, str(e)
+                result = await route_jobs.run(known_k, num_clusters, time_budget_ms, **options)
+        update["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return {**result, "update": update}
@@ -0,0 +1,189 @@
+'''
+Routing engine: distance matrices and tour construction over NumPy arrays
+
+'''
+import time
+import numpy as np
+from scipy.spatial.distance import cdist
+
+# ------------------ CONFIG ------------------
+MATRIX_MAX_STOPS = 5000  # Above this, distance rows are computed on demand instead of a full n x n matrix
+# --------------------------------------------
+
+# Pairwise Euclidean distance matrix, built once per cluster
+def build_distance_matrix(coords):
+    coords = np.asarray(coords, dtype=float)
+    return cdist(coords, coords)
+
+# Greedy nearest-neighbour tour starting from index 0
+def nearest_neighbour_order(coords, dist=None):
+    """
+    Returns the visiting order as an index array into coords.
+    Ties go to the lowest index, matching the original list-based solver.
+    """
+    coords = np.asarray(coords, dtype=float)
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    if dist is None and n <= MATRIX_MAX_STOPS:
+        dist = build_distance_matrix(coords)
+
+    order = np.empty(n, dtype=np.intp)
+    order[0] = current = 0
+    remaining = np.arange(1, n)  # unvisited stops, kept in original order
+    for step in range(1, n):
+        if dist is not None:
+            row = dist[current, remaining]
+        else:
+            row = cdist(coords[current:current + 1], coords[remaining])[0]
+        k = int(np.argmin(row))
+        current = int(remaining[k])
+        order[step] = current
+        remaining = np.delete(remaining, k)
+    return order
+
+# ------------------ LOCAL SEARCH ------------------
+# Tours are open paths (no return leg) whose first index is fixed, matching how
+# write_route_report measures a route: start -> stop 1 -> ... -> last stop.
+IMPROVEMENT_EPS = 1e-12  # Ignore moves that gain less than this (float noise)
+OR_OPT_MAX_SEGMENT = 3   # Longest segment Or-opt will relocate
+# --------------------------------------------------
+
+def tour_length(order, dist):
+    order = np.asarray(order)
+    return float(dist[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+
+def is_symmetric(dist):
+    return bool(np.allclose(dist, dist.T))
+
+def reversal_costs(dist, path):
+    """
+    Extra cost of walking path[0..j] backwards, for every j >= 1: zero on a
+    symmetric matrix, otherwise the change in the reversed inner edges.
+    """
+    return np.cumsum(dist[path[1:], path[:-1]] - dist[path[:-1], path[1:]])
+
+def _two_opt_pass(tour, dist, deadline, symmetric=True):
+    # Reverse tour[i..j]; on a symmetric matrix the delta only touches the two edges around the segment
+    n = len(tour)
+    improved = False
+    for i in range(1, n - 1):
+        if time.perf_counter() >= deadline:
+            break
+        a, b = tour[i - 1], tour[i]
+        cs = tour[i + 1:]
+        delta = dist[a, cs] - dist[a, b]
+        delta[:-1] += dist[b, tour[i + 2:]] - dist[cs[:-1], tour[i + 2:]]
+        if not symmetric:
+            delta += reversal_costs(dist, tour[i:])
+        k = int(np.argmin(delta))
+        if delta[k] < -IMPROVEMENT_EPS:
+            j = i + 1 + k
+            tour[i:j + 1] = tour[i:j + 1][::-1]
+            improved = True
+    return improved
+
+def _or_opt_pass(tour, dist, deadline, symmetric=True):
+    # Move a segment of 1..OR_OPT_MAX_SEGMENT stops (optionally reversed) elsewhere in the tour
+    improved = False
+    for seg_len in range(1, OR_OPT_MAX_SEGMENT + 1):
+        i = 1
+        while i + seg_len <= len(tour):
+            if time.perf_counter() >= deadline:
+                return improved
+            n = len(tour)
+            s0, s1 = tour[i], tour[i + seg_len - 1]
+            prev = tour[i - 1]
+            nxt = tour[i + seg_len] if i + seg_len < n else None
+            removal_gain = dist[prev, s0] + (dist[s1, nxt] - dist[prev, nxt] if nxt is not None else 0.0)
+
+            rest = np.concatenate((tour[:i], tour[i + seg_len:]))
+            # Insert between rest[k] and rest[k + 1] (or after the last stop)
+            left = rest
+            right = np.append(rest[1:], -1)
+            has_right = right >= 0
+            right_safe = np.where(has_right, right, 0)
+            base = np.where(has_right, dist[left, right_safe], 0.0)
+            fwd = dist[left, s0] + np.where(has_right, dist[s1, right_safe], 0.0) - base
+            rev = dist[left, s1] + np.where(has_right, dist[s0, right_safe], 0.0) - base
+            if not symmetric and seg_len > 1:
+                rev += reversal_costs(dist, tour[i:i + seg_len])[-1]
+            fwd[i - 1] = rev[i - 1] = np.inf  # reinserting in place is not a move
+            best = np.minimum(fwd, rev)
+            k = int(np.argmin(best))
+            if best[k] - removal_gain < -IMPROVEMENT_EPS:
+                segment = tour[i:i + seg_len]
+                if rev[k] < fwd[k]:
+                    segment = segment[::-1]
+                tour[:] = np.concatenate((rest[:k + 1], segment, rest[k + 1:]))
+                improved = True
+            else:
+                i += 1
+    return improved
+
+# Anytime 2-opt / Or-opt improvement of an open tour with a fixed start
+def improve_tour(order, dist, deadline):
+    """
+    Applies improving 2-opt and Or-opt moves until no move helps or
+    time.perf_counter() passes deadline. Only improving moves are applied,
+    so the tour returned is always the best found so far. dist may be
+    asymmetric (e.g. road durations); reversing a stretch of the tour is then
+    charged for the change in its inner edges.
+    """
+    tour = np.array(order, dtype=np.intp)
+    if len(tour) < 3:
+        return tour
+    symmetric = is_symmetric(dist)
+    while time.perf_counter() < deadline:
+        improved = _two_opt_pass(tour, dist, deadline, symmetric)
+        improved = _or_opt_pass(tour, dist, deadline, symmetric) or improved
+        if not improved:
+            break
+    return tour
+
+# ------------------ LARGE TOURS ------------------
+# Past a full matrix, a tour starts from a space-filling curve order and is
+# improved window by window, each window seeing only WINDOW_STOPS stops.
+HILBERT_BITS = 16        # Grid resolution of the curve, per axis
+WINDOW_STOPS = 400       # Stops per local-search window on long tours
+# -------------------------------------------------
+
+def hilbert_order(coords, bits=HILBERT_BITS):
+    """
+    Index array that visits planar (x, y) coords along a Hilbert curve over their bounding box.
+    Nearby points along the curve are nearby in the plane.
+    """
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) < 2:
+        return np.arange(len(coords), dtype=np.intp)
+    side = 1 << bits
+    low, span = coords.min(axis=0), np.ptp(coords, axis=0).max() or 1.0
+    cells = np.minimum(((coords - low) / span * side).astype(np.int64), side - 1)
+    x, y = cells[:, 0].copy(), cells[:, 1].copy()
+    d = np.zeros(len(coords), dtype=np.int64)
+    s = side >> 1
+    while s > 0:
+        rx, ry = (x & s) > 0, (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        flip = ~ry & rx
+        x[flip], y[flip] = side - 1 - x[flip], side - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s >>= 1
+    return np.argsort(d, kind='stable').astype(np.intp)
+
+def improve_windows(order, coords, deadline, window=WINDOW_STOPS):
+    """
+    improve_tour over consecutive windows of a long open tour, each window
+    starting from the last stop of the one before. Distances are Euclidean
+    over coords and only ever built for one window at a time.
+    """
+    tour = np.array(order, dtype=np.intp)
+    coords = np.asarray(coords, dtype=float)
+    for start in range(1, len(tour), window):
+        if time.perf_counter() >= deadline:
+            break
+        part = tour[start - 1:start + window]
+        local = improve_tour(np.arange(len(part)), build_distance_matrix(coords[part]), deadline)
+        tour[start - 1:start + window] = part[local]
+    return tour
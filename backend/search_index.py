@@ -0,0 +1,84 @@
+'''
+In-memory inverted index over book names and authors
+
+Maps each token to the set of book IDs containing it. A sorted token list
+answers prefix queries ("mari" -> "marissa") with a binary search, so lookups
+cost O(log V + matches) regardless of catalog size.
+'''
+import bisect
+import re
+import threading
+
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold()) if text else []
+
+
+class BookSearchIndex:
+    def __init__(self):
+        self._postings = {}   # token -> set of book ids
+        self._tokens = []     # sorted vocabulary for prefix lookups
+        self._last_id = 0     # highest book id indexed so far
+        self._lock = threading.Lock()
+
+    def add(self, book_id, *texts):
+        with self._lock:
+            for token in {t for text in texts for t in tokenize(text)}:
+                ids = self._postings.get(token)
+                if ids is None:
+                    ids = self._postings[token] = set()
+                    bisect.insort(self._tokens, token)
+                ids.add(book_id)
+
+    def remove(self, book_id, *texts):
+        with self._lock:
+            for token in {t for text in texts for t in tokenize(text)}:
+                ids = self._postings.get(token)
+                if ids is None:
+                    continue
+                ids.discard(book_id)
+                if not ids:
+                    del self._postings[token]
+                    del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def refresh(self, conn):
+        """
+        Indexes books added since the last refresh (including by other processes).
+        Only refresh advances the high-water mark; add() is for re-indexing
+        an edited book, whose id may be above books not yet seen.
+        """
+        rows = conn.execute(
+            "SELECT id, name, author FROM books WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+        for row in rows:
+            self.add(row["id"], row["name"], row["author"])
+        if rows:
+            with self._lock:
+                self._last_id = max(self._last_id, rows[-1]["id"])
+
+    def _prefix_ids(self, prefix):
+        ids = set()
+        start = bisect.bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            ids |= self._postings[token]
+        return ids
+
+    def search(self, query):
+        """
+        IDs of books whose name or author has a token starting with every query
+        token, or None when the query has no tokens (no text filter).
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        with self._lock:
+            result = None
+            for token in sorted(set(tokens), key=len, reverse=True):  # longest prefixes are most selective
+                ids = self._prefix_ids(token)
+                result = ids if result is None else result & ids
+                if not result:
+                    return set()
+            return result
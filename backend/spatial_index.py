@@ -0,0 +1,78 @@
+'''
+Spatial index over store coordinates
+
+Latitude/longitude pairs are mapped to points on the unit sphere and kept in
+a scipy cKDTree. Straight-line (chord) distance between those points grows
+with great-circle distance, so nearest, k-nearest and radius queries are
+exact anywhere in the province and cost O(log n) each.
+'''
+import numpy as np
+from scipy.spatial import cKDTree
+
+# ------------------ CONFIG ------------------
+EARTH_RADIUS_KM = 6371.0088
+# --------------------------------------------
+
+def to_unit_sphere(coords):
+    """
+    (n, 2) array of (latitude, longitude) in degrees -> (n, 3) unit vectors.
+    """
+    coords = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lon = coords[:, 0], coords[:, 1]
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+def km_to_chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype=float) / (2 * EARTH_RADIUS_KM), np.pi / 2))
+
+
+class StoreIndex:
+    def __init__(self, coords):
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.tree = cKDTree(to_unit_sphere(self.coords))
+
+    def __len__(self):
+        return len(self.coords)
+
+    def nearest(self, points):
+        """
+        Nearest indexed store for each (latitude, longitude) point.
+        Returns (distances_km, indices) arrays.
+        """
+        chord, indices = self.tree.query(to_unit_sphere(points), k=1)
+        return chord_to_km(chord), indices
+
+    def k_nearest(self, point, k):
+        """
+        Up to k closest stores to one point, nearest first. Returns (distances_km, indices).
+        """
+        k = min(int(k), len(self))
+        if k <= 0:
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        chord, indices = self.tree.query(to_unit_sphere(point)[0], k=k)
+        return chord_to_km(np.atleast_1d(chord)), np.atleast_1d(indices)
+
+    def neighbour_distances(self, k=1):
+        """
+        Distance in km from every indexed store to its k-th nearest other store.
+        """
+        k = min(int(k), len(self) - 1)
+        if k <= 0:
+            return np.zeros(len(self))
+        chord, _ = self.tree.query(self.tree.data, k=k + 1)  # the first neighbour is the store itself
+        return chord_to_km(chord[:, -1])
+
+    def within_radius(self, point, radius_km):
+        """
+        Stores within radius_km of one point, nearest first. Returns (distances_km, indices).
+        """
+        center = to_unit_sphere(point)[0]
+        indices = np.asarray(self.tree.query_ball_point(center, km_to_chord(radius_km)), dtype=np.intp)
+        if not len(indices):
+            return np.empty(0), indices
+        distances = chord_to_km(np.linalg.norm(self.tree.data[indices] - center, axis=1))
+        order = np.argsort(distances, kind='stable')
+        return distances[order], indices[order]
@@ -0,0 +1,70 @@
+'''
+Array-backed store table shared by every routing stage
+
+Each store is one row of a structured NumPy array: its coordinates, whether
+it is an Indigo store, whether it needs a delivery and its demand. Names are
+interned once into a parallel object array. Routes, clusters and depots are
+index arrays into the table, so a stage gets coordinates or names for a whole
+route with one fancy index, instead of building a dict per row and reading
+fields from it one at a time.
+'''
+import sys
+
+import numpy as np
+import pandas as pd
+
+STORE_DTYPE = np.dtype([
+    ('coords', 'f8', (2,)),   # latitude, longitude
+    ('indigo', '?'),
+    ('delivery', '?'),        # RequiresDelivery == 'Yes'
+    ('demand', 'f8'),         # one unit when the requirements give none
+])
+
+class StoreTable:
+    """
+    Stores as a structured array plus interned names, in input order.
+    """
+    def __init__(self, names, coords, indigo, delivery=None, demand=None):
+        n = len(names)
+        self.names = np.array([sys.intern(str(name)) for name in names], dtype=object)
+        self.rows = np.empty(n, dtype=STORE_DTYPE)
+        self.rows['coords'] = np.asarray(coords, dtype=float).reshape(n, 2)
+        self.rows['indigo'] = indigo
+        self.rows['delivery'] = True if delivery is None else delivery
+        self.rows['demand'] = 1.0 if demand is None else np.nan_to_num(np.asarray(demand, dtype=float), nan=1.0)
+        self.positions = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_frame(cls, stores_df, demand_column=None):
+        """
+        Table over a merged stores DataFrame (Name, Latitude, Longitude, Type, RequiresDelivery).
+        """
+        demand = stores_df[demand_column] if demand_column in stores_df.columns else None
+        return cls(stores_df['Name'].to_numpy(), stores_df[['Latitude', 'Longitude']].to_numpy(dtype=float),
+                   (stores_df['Type'] == 'Indigo').to_numpy(), (stores_df['RequiresDelivery'] == 'Yes').to_numpy(),
+                   None if demand is None else pd.to_numeric(demand, errors='coerce').to_numpy())
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def coords(self):
+        return self.rows['coords']
+
+    def indices(self, names):
+        """
+        Row of each named store. Raises KeyError for an unknown name.
+        """
+        return np.fromiter((self.positions[name] for name in names), dtype=np.intp, count=len(names))
+
+    def delivery_stops(self):
+        return np.flatnonzero(self.rows['delivery'])
+
+    def starting_store(self):
+        """
+        Row of the first Indigo store needing a delivery.
+        """
+        candidates = np.flatnonzero(self.rows['indigo'] & self.rows['delivery'])
+        if not len(candidates):
+            raise ValueError("No Indigo store requires delivery")
+        return int(candidates[0])
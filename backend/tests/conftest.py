@@ -0,0 +1,74 @@
+import asyncio
+import os
+import shutil
+import sys
+import threading
+
+import pytest
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, BACKEND)
+os.chdir(BACKEND)  # modules resolve static/ and the CSVs relative to the backend directory, as when the app runs
+
+
+@pytest.fixture
+def catalog_db(tmp_path, monkeypatch):
+    """
+    Empty catalog in a temporary database, with no books.json to import.
+    """
+    import catalog
+    from search_index import BookSearchIndex
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(catalog, "CATALOG_DB", str(tmp_path / "books.db"))
+    monkeypatch.setattr(catalog, "search_index", BookSearchIndex())
+    return catalog
+
+
+class BlockingCalls:
+    """
+    Runs coroutines on a fresh event loop and records which watched blocking
+    functions were called on the loop's own thread.
+    """
+    def __init__(self, monkeypatch):
+        self.monkeypatch = monkeypatch
+        self.on_loop = []
+        self._loop_threads = set()
+
+    def watch(self, owner, name):
+        original = getattr(owner, name)
+        def wrapped(*args, **kwargs):
+            if threading.current_thread() in self._loop_threads:
+                self.on_loop.append(name)
+            return original(*args, **kwargs)
+        self.monkeypatch.setattr(owner, name, wrapped)
+
+    def run(self, coroutine):
+        async def main():
+            self._loop_threads.add(threading.current_thread())
+            return await coroutine
+        return asyncio.run(main())
+
+@pytest.fixture
+def routing_inputs(tmp_path, monkeypatch):
+    """
+    Copies of the logistics CSVs and an empty route cache, so tests may edit both.
+    """
+    import logistics
+    import route_cache
+    for name in ("LOCATIONS_CSV", "REQUIREMENTS_CSV"):
+        copy = tmp_path / os.path.basename(getattr(logistics, name))
+        shutil.copy(getattr(logistics, name), copy)
+        monkeypatch.setattr(logistics, name, str(copy))
+    monkeypatch.setattr(route_cache, "CACHE_DIR", str(tmp_path / "route_cache"))
+    monkeypatch.setattr(route_cache, "routes_cache", route_cache.RouteCache(disk_dir=str(tmp_path / "route_cache")))
+    return logistics
+
+@pytest.fixture
+def blocking_calls(routing_inputs, monkeypatch):
+    import route_cache
+    calls = BlockingCalls(monkeypatch)
+    for name in ("get", "put"):
+        calls.watch(route_cache.routes_cache, name)
+    for name in ("input_fingerprint", "route_cache_key", "count_delivery_stores", "set_delivery_flags", "load_table"):
+        calls.watch(routing_inputs, name)
+    return calls
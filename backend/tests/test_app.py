@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import ai
+import app
+import route_updates
+import upload_storage
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def apply(*args, **kwargs):
+        raise AssertionError("routing should not run")
+    monkeypatch.setattr(route_updates, "apply", apply)
+    return TestClient(app.app)
+
+
+@pytest.mark.parametrize("body", [
+    {"changes": {}, "mode": "supervised"},
+    {"changes": {}, "mode": "supervised", "num_trucks": 0},
+    {"changes": {}, "mode": "capacitated"},
+])
+def test_requirements_update_needs_trucks(client, body):
+    response = client.patch("/api/routes/requirements", json=body)
+    assert response.status_code == 422
+    assert "num_trucks" in response.json()["error"]
+
+def test_routes_need_trucks(client):
+    response = client.post("/api/routes", data={"mode": "supervised", "num_trucks": 0})
+    assert response.status_code == 422
+
+def test_trucks_error():
+    assert app.trucks_error("unsupervised", 0, None) is None
+    assert app.trucks_error("capacitated", 0, 40.0) is None
+    assert app.trucks_error("supervised", 2, None) is None
+    assert app.trucks_error("supervised", 0, None).status_code == 422
+
+def test_batch_upload_prices_books_off_the_event_loop(client, catalog_db, tmp_path, monkeypatch):
+    async def save_upload(file):
+        return str(tmp_path / file.filename), file.filename
+    def classify_many_with_cache(paths, prompt, digests):
+        return [{"book_name": "Dune", "author": "Frank Herbert", "type": "water_damage", "severity": "minor"}] * len(paths)
+    on_loop = []
+    def build_book_entry(*args):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(args[0])
+        except RuntimeError:
+            pass
+        return {"name": "Dune", "img": f"/static/{args[0]}", "sold": False}
+    monkeypatch.setattr(upload_storage, "save_upload", save_upload)
+    monkeypatch.setattr(ai, "classify_many_with_cache", classify_many_with_cache)
+    monkeypatch.setattr(ai, "build_book_entry", build_book_entry)
+
+    files = [("files", (f"book{i}.jpg", b"jpeg", "image/jpeg")) for i in range(3)]
+    response = client.post("/api/upload-images", data={"publisher": "Penguin", "original_price": "20"}, files=files)
+    assert response.json()["succeeded"] == 3
+    assert on_loop == []
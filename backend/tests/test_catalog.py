@@ -0,0 +1,56 @@
+import pytest
+
+
+def book(name, price, author="Author", sold=False):
+    return {"name": name, "author": author, "price": price, "damage-level": 1, "sold": sold}
+
+def all_pages(catalog, **query):
+    books, cursor = [], None
+    while True:
+        page = catalog.query_books(limit=2, cursor=cursor, **query)
+        books.extend(page["books"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return books
+
+
+def test_keyset_pages_cover_every_book_once(catalog_db):
+    catalog_db.add_books([book("E", 5.0), book("B", 2.0), book("D", 2.0), book("A", 1.0), book("C", 9.0)])
+    for sort, expected in (("oldest", ["E", "B", "D", "A", "C"]),
+                           ("newest", ["C", "A", "D", "B", "E"]),
+                           ("price", ["A", "B", "D", "E", "C"]),
+                           ("-price", ["C", "E", "D", "B", "A"]),
+                           ("name", ["A", "B", "C", "D", "E"])):
+        assert [b["name"] for b in all_pages(catalog_db, sort=sort)] == expected, sort
+
+def test_cursor_survives_inserts_before_it(catalog_db):
+    catalog_db.add_books([book(f"Book {i}", float(i)) for i in range(4)])
+    first = catalog_db.query_books(sort="price", limit=2)
+    catalog_db.add_books([book("Cheap", 0.5)])
+    second = catalog_db.query_books(sort="price", limit=2, cursor=first["next_cursor"])
+    assert [b["name"] for b in second["books"]] == ["Book 2", "Book 3"]
+    assert second["next_cursor"] is None
+
+def test_filters_and_text_search(catalog_db):
+    catalog_db.add_books([book("Dune", 10.0, "Frank Herbert"), book("Emma", 4.0, "Jane Austen", sold=True),
+                          book("Persuasion", 6.0, "Jane Austen")])
+    assert {b["name"] for b in all_pages(catalog_db, q="aust")} == {"Emma", "Persuasion"}
+    assert [b["name"] for b in all_pages(catalog_db, q="jane", sold=False)] == ["Persuasion"]
+    assert [b["name"] for b in all_pages(catalog_db, min_price=5, max_price=8)] == ["Persuasion"]
+
+def test_invalid_cursor_and_sort(catalog_db):
+    with pytest.raises(ValueError):
+        catalog_db.query_books(cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        catalog_db.query_books(sort="colour")
+
+def test_editing_a_book_does_not_hide_unindexed_ones(catalog_db):
+    catalog_db.add_books([book("Dune", 10.0)])
+    conn = catalog_db.get_connection()
+    with conn:
+        # Another process inserts two books this process has not indexed yet
+        conn.execute(catalog_db.INSERT_SQL, catalog_db._book_values(book("Emma", 4.0), 0.0))
+        later = conn.execute(catalog_db.INSERT_SQL, catalog_db._book_values(book("Zed", 1.0), 0.0)).lastrowid
+    catalog_db.update_book(later, {"name": "Zen"})
+    assert [b["name"] for b in catalog_db.query_books(q="emma")["books"]] == ["Emma"]
+    assert [b["name"] for b in catalog_db.query_books(q="zen")["books"]] == ["Zen"]
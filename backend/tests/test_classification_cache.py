@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import classification_cache
+
+DAMAGE = {"book_name": "Dune", "author": "Frank Herbert", "type": "water_damage", "severity": "minor"}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return classification_cache.ClassificationCache(db_path=str(tmp_path / "cache.db"), mode="perceptual")
+
+@pytest.fixture
+def hashes(monkeypatch):
+    hashed = []
+    perceptual_hash = classification_cache.perceptual_hash
+    def counted(image_path):
+        hashed.append(image_path)
+        return perceptual_hash(image_path)
+    monkeypatch.setattr(classification_cache, "perceptual_hash", counted)
+    return hashed
+
+def photo(path, quality):
+    gradient = np.add.outer(np.arange(64), np.arange(64)).astype(np.uint8) * 2
+    Image.fromarray(gradient).save(path, quality=quality)
+    return str(path)
+
+
+def test_miss_then_put_hashes_the_image_once(cache, hashes, tmp_path):
+    image = photo(tmp_path / "scan.jpg", 90)
+    digest = classification_cache.file_digest(image)
+    assert cache.get(digest, image) is None
+    cache.put(digest, DAMAGE, 1.0, image)
+    assert hashes == [image]
+
+def test_rescan_of_the_same_book_is_a_near_hit(cache, hashes, tmp_path):
+    first = photo(tmp_path / "first.jpg", 90)
+    cache.put(classification_cache.file_digest(first), DAMAGE, 1.0, first)
+    rescan = photo(tmp_path / "rescan.jpg", 70)
+    assert cache.get(classification_cache.file_digest(rescan), rescan) == DAMAGE
+    assert cache.stats()["near_hits"] == 1
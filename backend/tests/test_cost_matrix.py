@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import cost_matrix
+import routing
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(cost_matrix, "MATRIX_DIR", str(tmp_path))
+    rng = np.random.default_rng(0)
+    coords = np.column_stack((43.7 + rng.normal(0, 0.1, 40), -79.4 + rng.normal(0, 0.1, 40)))
+    return [f"Store {i}" for i in range(40)], coords
+
+# equirectangular projects at the mean latitude of whatever it is given, so its sub-matrices differ slightly
+@pytest.mark.parametrize("metric", ["haversine", "euclidean"])
+def test_full_and_on_demand_lookups_agree(stores, monkeypatch, metric):
+    full = cost_matrix.CostMatrix(*stores, metric)
+    monkeypatch.setattr(routing, "MATRIX_MAX_STOPS", 10)
+    on_demand = cost_matrix.CostMatrix(*stores, metric)
+    assert full.matrix is not None and on_demand.matrix is None
+
+    idx = np.array([5, 0, 17, 3, 9, 12])
+    np.testing.assert_allclose(on_demand.sub_at(idx), full.sub_at(idx))
+    np.testing.assert_allclose(on_demand.between_at(idx[:2], idx), full.between_at(idx[:2], idx))
+    np.testing.assert_allclose(on_demand.legs_at(idx), full.legs_at(idx))
+    np.testing.assert_allclose(full.legs_at(idx), full.sub_at(idx)[np.arange(5), np.arange(1, 6)])
+    assert on_demand.sub_at(np.arange(11)) is None  # past the matrix limit
+
+def test_haversine_matches_a_known_distance():
+    toronto, ottawa = (43.6532, -79.3832), (45.4215, -75.6972)
+    assert cost_matrix.haversine_km([toronto], [ottawa])[0, 0] == pytest.approx(352, abs=2)
@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import fleet_sweep
+import logistics
+
+
+def test_pareto_front_and_recommendation():
+    candidates = [
+        {"trucks": 2, "total_distance": 90.0, "longest_route": 50.0, "surcharge_total": 0.0, "unrouted": 0},
+        {"trucks": 3, "total_distance": 80.0, "longest_route": 30.0, "surcharge_total": 0.0, "unrouted": 0},
+        {"trucks": 3, "total_distance": 95.0, "longest_route": 40.0, "surcharge_total": 0.0, "unrouted": 0},  # beaten by 1
+        {"trucks": 1, "total_distance": 60.0, "longest_route": 60.0, "surcharge_total": 0.0, "unrouted": 4},
+    ]
+    for candidate in candidates:
+        candidate["cost"] = fleet_sweep.daily_cost(candidate)
+    front = fleet_sweep.pareto_front(candidates)
+    assert front == [0, 1, 3]
+    assert fleet_sweep.recommend(candidates, front) == 0  # the cheapest plan that routes every store
+
+
+@pytest.fixture
+def sweep_pool(monkeypatch, blocking_calls):
+    monkeypatch.setattr(logistics, "plot_plan", lambda plan, path, multi_depot=False: "/plot.png")
+    executor = ThreadPoolExecutor(2)
+    monkeypatch.setattr(fleet_sweep, "get_executor", lambda: executor)
+    yield
+    executor.shutdown()
+
+def test_sweep_keeps_blocking_work_off_the_event_loop(sweep_pool, blocking_calls):
+    result = blocking_calls.run(fleet_sweep.sweep([2, 3], [None]))
+    assert len(result["candidates"]) == 3
+    assert result["plot"] == "/plot.png"
+    assert blocking_calls.on_loop == []
+    assert blocking_calls.run(fleet_sweep.sweep([2, 3], [None])) == result  # the second sweep is a cache hit
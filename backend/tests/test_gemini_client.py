@@ -0,0 +1,84 @@
+import pytest
+
+import gemini_client
+
+
+class Response:
+    def __init__(self, status_code, headers=None, body=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self.text = ""
+
+    def json(self):
+        return self._body
+
+OK = Response(200, body={"candidates": [{"content": {"parts": [{"text": "Damage Type: Torn"}]}}]})
+
+def client(monkeypatch, responses):
+    monkeypatch.setattr(gemini_client.time, "sleep", lambda seconds: None)
+    classifier = gemini_client.ClassifierClient("key", rpm=60_000, burst=1000, breaker=gemini_client.CircuitBreaker(threshold=100))
+    sent = []
+    def post(url, **kwargs):
+        sent.append(url)
+        return responses[min(len(sent), len(responses)) - 1]
+    monkeypatch.setattr(classifier.session, "post", post)
+    return classifier, sent
+
+
+def test_retries_then_succeeds(monkeypatch):
+    classifier, sent = client(monkeypatch, [Response(503), Response(429, {"Retry-After": "2"}), OK])
+    assert classifier.generate(["prompt"]) == "Damage Type: Torn"
+    assert len(sent) == 3
+
+def test_gives_up_after_max_retries(monkeypatch):
+    classifier, sent = client(monkeypatch, [Response(429)])
+    with pytest.raises(gemini_client.RetryableError):
+        classifier.generate(["prompt"])
+    assert len(sent) == 1 + gemini_client.MAX_RETRIES
+
+def test_long_retry_after_is_left_to_the_caller(monkeypatch):
+    classifier, sent = client(monkeypatch, [Response(429, {"Retry-After": "3600"})])
+    with pytest.raises(gemini_client.RetryableError) as raised:
+        classifier.generate(["prompt"])
+    assert raised.value.retry_after == 3600
+    assert len(sent) == 1
+
+def test_bad_request_is_not_retried(monkeypatch):
+    classifier, sent = client(monkeypatch, [Response(400)])
+    with pytest.raises(gemini_client.ClassifierError) as raised:
+        classifier.generate(["prompt"])
+    assert not isinstance(raised.value, gemini_client.TRANSIENT_ERRORS)
+    assert len(sent) == 1
+
+
+def batch_response(numbers):
+    text = "\n".join(f"Image {n}:\nDamage Type: Torn\nSeverity: {n % 5 + 1}\nAuthor: A\nBook Name: B" for n in numbers)
+    return Response(200, body={"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+@pytest.fixture
+def batch_client(monkeypatch):
+    import ai
+    monkeypatch.setattr(ai, "load_image_part", lambda image_path: ("image/png", b""))
+    def use(responses):
+        classifier, sent = client(monkeypatch, responses)
+        monkeypatch.setattr(ai, "get_classifier", lambda: classifier)
+        return ai, sent
+    return use
+
+def test_rate_limited_batch_is_not_split(batch_client):
+    ai, sent = batch_client([Response(429)])
+    assert ai.classify_book_damage_batch([f"{i}.jpg" for i in range(8)]) == [None] * 8
+    assert len(sent) == 1 + gemini_client.MAX_RETRIES  # one batch request and its retries, nothing more
+
+def test_failed_batch_is_not_split(batch_client):
+    ai, sent = batch_client([Response(400)])
+    assert ai.classify_book_damage_batch([f"{i}.jpg" for i in range(4)]) == [None] * 4
+    assert len(sent) == 1
+
+def test_malformed_images_are_retried_in_halves(batch_client):
+    # The batch answers for images 1 and 3 only; 2 and 4 are split in half, one request each
+    ai, sent = batch_client([batch_response([1, 3]), batch_response([1])])
+    results = ai.classify_book_damage_batch([f"{i}.jpg" for i in range(4)])
+    assert all(results)
+    assert len(sent) == 3
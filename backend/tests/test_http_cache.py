@@ -0,0 +1,59 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import http_cache
+import route_cache
+
+snapshot = http_cache.Snapshot(http_cache.dumps({"books": ["x" * 2000]}), last_modified=1_700_000_000)
+app = FastAPI()
+
+@app.get("/snapshot")
+async def get_snapshot(request: Request):
+    return http_cache.respond(request, snapshot)
+
+@app.post("/snapshot")
+async def post_snapshot(request: Request):
+    return http_cache.respond(request, snapshot)
+
+client = TestClient(app)
+
+
+def test_get_revalidates_with_etag():
+    first = client.get("/snapshot")
+    assert first.status_code == 200
+    assert first.headers["etag"] == snapshot.etag
+    again = client.get("/snapshot", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert client.get("/snapshot", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_get_revalidates_with_last_modified():
+    since = client.get("/snapshot").headers["last-modified"]
+    assert client.get("/snapshot", headers={"If-Modified-Since": since}).status_code == 304
+    assert client.get("/snapshot", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"}).status_code == 200
+
+def test_post_has_no_validators_and_never_304():
+    response = client.post("/snapshot", headers={"If-None-Match": snapshot.etag})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert "last-modified" not in response.headers
+    assert response.json() == {"books": ["x" * 2000]}
+
+def test_compressed_variants():
+    response = client.get("/snapshot", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == {"books": ["x" * 2000]}
+
+
+def test_route_cache_revision_changes_when_entry_is_replaced():
+    cache = route_cache.RouteCache(max_entries=2, disk_enabled=False)
+    assert cache.revision("plan") is None
+    cache.put("plan", {"report": 1})
+    first = cache.revision("plan")
+    cache.get("plan")
+    assert cache.revision("plan") == first
+    cache.put("plan", {"report": 2})
+    assert cache.revision("plan") != first
+    cache.put("a", {})
+    cache.put("b", {})
+    assert cache.revision("plan") is None  # evicted
@@ -0,0 +1,149 @@
+import time
+
+import pytest
+
+import ai
+import gemini_client
+import ingest_queue
+
+
+@pytest.fixture
+def queue(catalog_db, monkeypatch):
+    monkeypatch.setattr(ai, "build_book_entry", lambda image_path, price, publisher, damage_info: {
+        "name": "Dune", "author": "Frank Herbert", "price": price, "damage-level": damage_info["severity"]})
+    return ingest_queue
+
+def classify_with(monkeypatch, outcome):
+    def classify(image_path, digest=None, raise_transient=False):
+        assert raise_transient
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    monkeypatch.setattr(ai, "classify_with_cache", classify)
+
+def run_next(queue):
+    conn = queue._conn()
+    with conn:
+        conn.execute("UPDATE ingest_jobs SET available_at = 0 WHERE status = 'queued'")  # skip any backoff
+    job = queue._claim()
+    queue._run_job(job)
+    return conn.execute("SELECT status, attempts, available_at, error FROM ingest_jobs WHERE job_id = ?",
+                        (job["job_id"],)).fetchone()
+
+
+def test_classified_job_adds_book(queue, monkeypatch):
+    classify_with(monkeypatch, {"damage_type": "Torn", "severity": 2})
+    job_id = queue.enqueue("upload.jpg", 20.0, "Penguin")
+    assert run_next(queue)["status"] == "done"
+    job = queue.get_job(job_id)
+    assert job["result"]["name"] == "Dune"
+    assert [b["name"] for b in queue.catalog.query_books(q="dune")["books"]] == ["Dune"]
+
+def test_unclassifiable_image_fails_for_good(queue, monkeypatch):
+    classify_with(monkeypatch, None)
+    queue.enqueue("upload.jpg", 20.0, "Penguin")
+    row = run_next(queue)
+    assert (row["status"], row["error"]) == ("failed", "Could not classify book")
+
+@pytest.mark.parametrize("error, delay", [
+    (gemini_client.RetryableError("rate limited", retry_after=42), 42),
+    (gemini_client.RetryableError("server error"), ingest_queue.RETRY_DELAY),
+    (gemini_client.CircuitOpenError("circuit open"), gemini_client.BREAKER_RESET),
+])
+def test_transient_classifier_errors_are_retried_without_using_attempts(queue, monkeypatch, error, delay):
+    classify_with(monkeypatch, error)
+    queue.enqueue("upload.jpg", 20.0, "Penguin")
+    for _ in range(ingest_queue.MAX_ATTEMPTS + 2):
+        started = time.time()
+        row = run_next(queue)
+        assert (row["status"], row["attempts"], row["error"]) == ("queued", 0, str(error))
+        assert row["available_at"] == pytest.approx(started + delay, abs=1)
+
+    classify_with(monkeypatch, {"damage_type": "Torn", "severity": 2})
+    assert run_next(queue)["status"] == "done"
+
+def test_unexpected_errors_back_off_then_fail(queue, monkeypatch):
+    classify_with(monkeypatch, OSError("disk full"))
+    queue.enqueue("upload.jpg", 20.0, "Penguin")
+    for attempt in range(1, ingest_queue.MAX_ATTEMPTS):
+        row = run_next(queue)
+        assert (row["status"], row["attempts"]) == ("queued", attempt)
+    row = run_next(queue)
+    assert (row["status"], row["error"]) == ("failed", "disk full")
+
+
+class FakeClassifier:
+    def __init__(self, error):
+        self.error = error
+
+    def generate(self, parts):
+        raise self.error
+
+@pytest.mark.parametrize("error, raised", [
+    (gemini_client.RetryableError("rate limited"), True),
+    (gemini_client.CircuitOpenError("circuit open"), True),
+    (gemini_client.ClassifierError("bad request"), False),
+])
+def test_classify_book_damage_raises_only_transient_errors(monkeypatch, error, raised):
+    monkeypatch.setattr(ai, "get_classifier", lambda: FakeClassifier(error))
+    monkeypatch.setattr(ai, "load_image_part", lambda image_path: ("image/png", b""))
+    assert ai.classify_book_damage("upload.jpg") is None
+    if raised:
+        with pytest.raises(type(error)):
+            ai.classify_book_damage("upload.jpg", raise_transient=True)
+    else:
+        assert ai.classify_book_damage("upload.jpg", raise_transient=True) is None
+
+
+def books_in_catalog(queue):
+    return queue._conn().execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+def test_reclaimed_job_adds_its_book_once(queue, monkeypatch):
+    queue.enqueue("upload.jpg", 20.0, "Penguin")
+    first = queue._claim()
+    second = []
+
+    def classify(image_path, digest=None, raise_transient=False):
+        if not second:
+            # The first worker stalls past its lease; a second worker reclaims the job and finishes it
+            conn = queue._conn()
+            with conn:
+                conn.execute("UPDATE ingest_jobs SET lease_until = 0 WHERE job_id = ?", (first["job_id"],))
+            second.append(queue._claim())
+            queue._run_job(second[0])
+        return {"damage_type": "Torn", "severity": 2}
+    monkeypatch.setattr(ai, "classify_with_cache", classify)
+
+    queue._run_job(first)
+    assert second[0]["job_id"] == first["job_id"]
+    assert books_in_catalog(queue) == 1
+    job = queue.get_job(first["job_id"])
+    assert (job["status"], job["attempts"]) == ("done", 2)
+
+def test_stale_worker_cannot_requeue_or_fail_a_reclaimed_job(queue, monkeypatch):
+    queue.enqueue("upload.jpg", 20.0, "Penguin")
+    stale = queue._claim()
+    conn = queue._conn()
+    with conn:
+        conn.execute("UPDATE ingest_jobs SET lease_until = 0")
+    current = queue._claim()
+    queue._retry_later(stale, "late error")
+    queue._fail(stale, "late failure")
+    row = conn.execute("SELECT status, attempts, error FROM ingest_jobs").fetchone()
+    assert tuple(row) == ("running", current["attempts"], None)
+
+def test_heartbeat_keeps_a_slow_job_leased(queue, monkeypatch):
+    monkeypatch.setattr(ingest_queue, "LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(ingest_queue, "HEARTBEAT_SECONDS", 0.05)
+    reclaimed = []
+
+    def slow_classify(image_path, digest=None, raise_transient=False):
+        time.sleep(0.8)  # well past the lease
+        reclaimed.append(queue._claim())
+        return {"damage_type": "Torn", "severity": 2}
+    monkeypatch.setattr(ai, "classify_with_cache", slow_classify)
+
+    queue.enqueue("upload.jpg", 20.0, "Penguin")
+    queue._run_job(queue._claim())
+    assert reclaimed == [None]
+    assert books_in_catalog(queue) == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import large_routing
+import logistics
+import store_table
+
+
+@pytest.fixture
+def csvs(tmp_path):
+    locations = pd.DataFrame({
+        'Name': ['Indigo A', 'Shop B', 'Shop C', 'Shop D', 'Indigo E', 'Unlisted F'],
+        'Latitude': [43.65, 43.70, 43.60, 43.75, 43.80, 43.50],
+        'Longitude': [-79.38, -79.40, -79.30, -79.50, -79.20, -79.10],
+        'Type': ['Indigo', 'Retailer', 'Retailer', 'Retailer', 'Indigo', 'Retailer'],
+    })
+    requirements = pd.DataFrame({
+        'Name': ['Shop D', 'Indigo A', 'Shop B', 'Shop C', 'Indigo E', 'Not A Location'],
+        'RequiresDelivery': ['Yes', 'Yes', 'No', 'Yes', 'No', 'Yes'],
+        'Demand': [3, None, 2, 5, 1, 4],
+    })
+    paths = tmp_path / 'locations.csv', tmp_path / 'requirements.csv'
+    locations.to_csv(paths[0], index=False)
+    requirements.to_csv(paths[1], index=False)
+    return paths
+
+def assert_same_table(a, b):
+    assert a.names.tolist() == b.names.tolist()
+    for field in store_table.STORE_DTYPE.names:
+        np.testing.assert_array_equal(a.rows[field], b.rows[field])
+
+
+@pytest.mark.parametrize("demand_column", ['Demand', None])
+def test_chunked_load_matches_merge(csvs, demand_column):
+    merged = pd.merge(pd.read_csv(csvs[0]), pd.read_csv(csvs[1]), on='Name')
+    expected = store_table.StoreTable.from_frame(merged, demand_column)
+    assert_same_table(large_routing.load_stores(*csvs, demand_column, chunk_rows=2), expected)
+
+def test_chunked_load_without_demand_column(csvs):
+    pd.read_csv(csvs[1]).drop(columns='Demand').to_csv(csvs[1], index=False)
+    table = large_routing.load_stores(*csvs, 'Demand', chunk_rows=4)
+    assert table.rows['demand'].tolist() == [1.0] * len(table)
+
+
+@pytest.fixture
+def many_stores():
+    rng = np.random.default_rng(0)
+    n = 600
+    coords = np.column_stack((43.7 + rng.normal(0, 0.2, n), -79.4 + rng.normal(0, 0.2, n)))
+    yield store_table.StoreTable([f"Store {i}" for i in range(n)], coords, np.arange(n) == 0, rng.random(n) < 0.9)
+    large_routing.shutdown()
+
+@pytest.mark.parametrize("scheme", ["grid", "minibatch"])
+def test_plan_routes_every_stop_once(many_stores, scheme):
+    stops = many_stores.delivery_stops()
+    routes = large_routing.plan(many_stores, 0, stops, 8, scheme=scheme)
+    assert 1 <= len(routes) <= 8
+    assert sorted(np.concatenate(routes).tolist()) == sorted(stops[stops != 0].tolist())
+
+def test_large_k_means_goes_through_plan(many_stores, monkeypatch):
+    monkeypatch.setattr(large_routing, "LARGE_INSTANCE_STOPS", 100)
+    calls = []
+    plan = large_routing.plan
+    monkeypatch.setattr(large_routing, "plan", lambda *args, **kwargs: calls.append(args) or plan(*args, **kwargs))
+    stops = many_stores.delivery_stops()
+    routes = logistics.apply_clustering_and_tsp(many_stores, stops, 'K', 5, 0)
+    assert len(calls) == 1
+    assert sorted(np.concatenate(list(routes.values())).tolist()) == sorted(stops[stops != 0].tolist())
+
+
+@pytest.mark.parametrize("limit, labelled", [(10_000, True), (100, False)])
+def test_plot_labels_stops_only_below_the_large_instance_size(many_stores, monkeypatch, tmp_path, limit, labelled):
+    monkeypatch.setattr(large_routing, "LARGE_INSTANCE_STOPS", limit)
+    texts = []
+    monkeypatch.setattr(logistics.plt, "text", lambda *args, **kwargs: texts.append(args))
+    stops = many_stores.delivery_stops()[1:]
+    logistics.plot_routes(many_stores, 0, {0: stops[:300], 1: stops[300:]}, "test", str(tmp_path / "plot.png"))
+    assert len(texts) == (1 + len(stops) if labelled else 1)  # the depot is always labelled
@@ -0,0 +1,24 @@
+import pandas as pd
+import pytest
+
+
+def unflag_indigo_stores(logistics):
+    requirements = pd.read_csv(logistics.REQUIREMENTS_CSV)
+    logistics.set_delivery_flags({name: False for name in requirements['Name'] if name.startswith("Indigo")})
+
+
+@pytest.mark.parametrize("known_k, capacitated", [(True, False), (True, True), (False, False)])
+def test_multi_depot_needs_no_flagged_indigo_store(routing_inputs, known_k, capacitated):
+    unflag_indigo_stores(routing_inputs)
+    planned = routing_inputs.plan_routes(known_k, 2, multi_depot=True, capacitated=capacitated)
+
+    table = planned["table"]
+    retailers = table.delivery_stops()
+    visited = [stop for route in planned["routes"].values() for stop in route]
+    assert sorted(visited) == sorted(retailers.tolist())
+    assert planned["starting_indigo"] in planned["route_depots"].values()
+
+def test_single_depot_still_needs_a_flagged_indigo_store(routing_inputs):
+    unflag_indigo_stores(routing_inputs)
+    with pytest.raises(ValueError):
+        routing_inputs.plan_routes(True, 2)
@@ -0,0 +1,35 @@
+import asyncio
+
+import pandas as pd
+import pytest
+
+import route_jobs
+import route_updates
+
+
+@pytest.fixture
+def no_plot(monkeypatch):
+    async def render_plot(*args):
+        return "/plot.png"
+    monkeypatch.setattr(route_jobs, "render_plot", render_plot)
+
+def retailer_without_delivery(logistics):
+    stores = pd.merge(pd.read_csv(logistics.LOCATIONS_CSV), pd.read_csv(logistics.REQUIREMENTS_CSV), on='Name')
+    return stores.query("RequiresDelivery == 'No' and Type == 'Retailer'")["Name"].iloc[0]
+
+
+def test_adding_a_store_repairs_the_plan_off_the_event_loop(routing_inputs, blocking_calls, no_plot):
+    before = routing_inputs.return_routes(True, 3)
+    store = retailer_without_delivery(routing_inputs)
+    result = blocking_calls.run(route_updates.apply({store: True}, True, 3))
+
+    update = result["update"]
+    assert (update["added"], update["removed"], update["full_solve"]) == ([store], [], False)
+    assert len(update["routes_changed"]) == 1
+    assert any(store in route for route in result["plan"]["routes"])
+    assert sum(map(len, result["plan"]["routes"])) == sum(map(len, before["plan"]["routes"])) + 1
+    assert blocking_calls.on_loop == []
+
+def test_unknown_store_is_rejected(routing_inputs, no_plot):
+    with pytest.raises(ValueError):
+        asyncio.run(route_updates.apply({"No Such Store": True}, True, 3))
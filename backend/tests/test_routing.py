@@ -0,0 +1,79 @@
+import itertools
+import time
+
+import numpy as np
+import pytest
+
+import routing
+import vrp
+
+
+def euclidean(n, seed):
+    coords = np.random.default_rng(seed).random((n, 2))
+    return coords, routing.build_distance_matrix(coords)
+
+def asymmetric(n, seed):
+    # Road-like durations: a symmetric base plus a direction-dependent penalty
+    _, dist = euclidean(n, seed)
+    return dist + np.random.default_rng(seed + 1).random((n, n)) * dist
+
+def improved(dist, order=None):
+    order = np.arange(len(dist)) if order is None else order
+    return routing.improve_tour(order, dist, time.perf_counter() + 1)
+
+def closed_length(route, dist):
+    return routing.tour_length([0] + list(route) + [0], dist)
+
+
+def test_symmetric_tour_is_a_permutation_and_no_longer():
+    for seed in range(20):
+        coords, dist = euclidean(40, seed)
+        start = routing.nearest_neighbour_order(coords, dist)
+        tour = improved(dist, start)
+        assert tour[0] == 0
+        assert sorted(tour) == list(range(40))
+        assert routing.tour_length(tour, dist) <= routing.tour_length(start, dist) + 1e-9
+
+def test_symmetric_tour_is_two_opt_optimal():
+    _, dist = euclidean(30, 0)
+    tour = improved(dist)
+    length = routing.tour_length(tour, dist)
+    for i, j in itertools.combinations(range(1, 30), 2):
+        moved = tour.copy()
+        moved[i:j + 1] = moved[i:j + 1][::-1]
+        assert routing.tour_length(moved, dist) >= length - 1e-9
+
+@pytest.mark.parametrize("n", [5, 12, 60])
+def test_asymmetric_tour_never_gets_longer(n):
+    for seed in range(30):
+        dist = asymmetric(n, seed)
+        start = np.random.default_rng(seed).permutation(np.arange(1, n))
+        start = np.concatenate(([0], start))
+        tour = improved(dist, start)
+        assert sorted(tour) == list(range(n))
+        assert routing.tour_length(tour, dist) <= routing.tour_length(start, dist) + 1e-9
+
+def test_asymmetric_tour_finds_the_optimum_on_a_directed_cycle():
+    # Cheap only in one direction round a ring: 0 -> 1 -> ... -> n-1
+    n = 8
+    dist = np.full((n, n), 10.0)
+    np.fill_diagonal(dist, 0.0)
+    dist[np.arange(n - 1), np.arange(1, n)] = 1.0
+    start = np.concatenate(([0], np.arange(n - 1, 0, -1)))  # the same ring, walked backwards
+    tour = improved(dist, start)
+    assert routing.tour_length(tour, dist) == n - 1
+
+def test_reversal_costs():
+    dist = np.array([[0, 1, 5], [2, 0, 1], [9, 3, 0]], dtype=float)
+    path = np.array([0, 1, 2])
+    # Reversing 0..1 swaps 0->1 for 1->0; reversing 0..2 also swaps 1->2 for 2->1
+    assert routing.reversal_costs(dist, path).tolist() == [1.0, 3.0]
+    assert not routing.reversal_costs(dist + dist.T, path).any()
+
+def test_vrp_two_opt_on_asymmetric_costs_never_gets_longer():
+    for seed in range(30):
+        dist = asymmetric(15, seed)
+        route = list(np.random.default_rng(seed).permutation(np.arange(1, 15)))
+        better, _ = vrp.two_opt(route, dist)
+        assert sorted(better) == sorted(route)
+        assert closed_length(better, dist) <= closed_length(route, dist) + 1e-9
@@ -0,0 +1,104 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import cost_matrix
+import logistics
+import routing
+import store_table
+import vrp
+
+
+def instance(n, seed=0):
+    coords = np.random.default_rng(seed).random((n + 1, 2))
+    demand = np.concatenate(([0.0], np.random.default_rng(seed + 1).integers(1, 5, n)))
+    return routing.build_distance_matrix(coords), demand
+
+def round_trip(route, dist):
+    return routing.tour_length([0] + list(route) + [0], dist)
+
+def assert_covers(routes, n):
+    visited = [stop for route in routes for stop in route]
+    assert sorted(visited) == list(range(1, n + 1))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_solve_visits_every_stop_once_within_capacity(seed):
+    dist, demand = instance(120, seed)
+    routes = vrp.solve(dist, demand, capacity=25)
+    assert_covers(routes, 120)
+    assert all(route for route in routes)
+    assert max(demand[route].sum() for route in routes) <= 25
+    assert len(routes) >= np.ceil(demand.sum() / 25)
+
+def test_solve_respects_max_route_length():
+    dist, demand = instance(60)
+    longest = 2 * dist[0].max() + 1e-9  # every stop can still be served alone
+    routes = vrp.solve(dist, demand, capacity=np.inf, max_length=longest)
+    assert_covers(routes, 60)
+    assert max(round_trip(route, dist) for route in routes) <= longest
+
+def test_solve_without_limits_is_one_route():
+    dist, _ = instance(30)
+    routes = vrp.solve(dist)
+    assert len(routes) == 1
+    assert_covers(routes, 30)
+
+def test_solve_averages_asymmetric_costs():
+    dist, demand = instance(40)
+    skew = dist * np.random.default_rng(3).random(dist.shape)
+    routes = vrp.solve(dist + skew, demand, capacity=20)
+    assert_covers(routes, 40)
+    assert max(demand[route].sum() for route in routes) <= 20
+
+def test_improve_never_lengthens_the_plan():
+    dist, demand = instance(80)
+    start = vrp.clarke_wright(dist, demand, 20, np.inf, vrp.neighbour_lists(dist))
+    better = vrp.improve(start, dist, demand, 20)
+    assert_covers(better, 80)
+    assert sum(round_trip(r, dist) for r in better) <= sum(round_trip(r, dist) for r in start) + 1e-9
+
+
+def test_solve_vrp_splits_past_the_matrix_limit(monkeypatch):
+    rng = np.random.default_rng(0)
+    n = 100
+    coords = np.column_stack((43.7 + rng.normal(0, 0.1, n), -79.4 + rng.normal(0, 0.1, n)))
+    table = store_table.StoreTable([f"Store {i}" for i in range(n)], coords, np.arange(n) == 0)
+    sizes = []
+    compute = cost_matrix.compute
+    def counted(coords, names, metric):
+        sizes.append(len(coords))
+        return compute(coords, names, metric)
+    monkeypatch.setattr(cost_matrix, "compute", counted)
+    monkeypatch.setattr(routing, "MATRIX_MAX_STOPS", 30)
+
+    routes = logistics.solve_vrp(table, 0, np.arange(n), num_trucks=6)
+    visited = np.concatenate(routes)
+    assert sorted(visited.tolist()) == list(range(1, n))
+    assert len(sizes) == 4 and max(sizes) <= 30
+    capacity = logistics.truck_capacity(n - 1, 6)
+    assert max(len(route) for route in routes) <= capacity
+
+def test_solve_past_the_deadline_skips_construction():
+    dist, demand = instance(3000)
+    routes = vrp.solve(dist, demand, capacity=25, deadline=time.perf_counter())
+    assert_covers(routes, 3000)
+    assert len(routes) == 3000  # every stop alone, nothing merged
+
+def test_clarke_wright_keeps_merged_routes_at_the_deadline(monkeypatch):
+    dist, demand = instance(3000)
+    neighbours = vrp.neighbour_lists(dist)
+    full = vrp.clarke_wright(dist, demand, 25, np.inf, neighbours)
+    checks = iter([0.0, 0.0])  # the deadline passes at the third check
+    monkeypatch.setattr(vrp, "time", SimpleNamespace(perf_counter=lambda: next(checks, 1.0)))
+    routes = vrp.clarke_wright(dist, demand, 25, np.inf, neighbours, deadline=0.5)
+    assert_covers(routes, 3000)
+    assert max(demand[route].sum() for route in routes) <= 25
+    assert len(full) < len(routes) < 3000
+
+def test_neighbour_lists_leave_off_rows_past_the_deadline():
+    dist, _ = instance(3000)
+    assert len(vrp.neighbour_lists(dist, deadline=time.perf_counter())) == 0
+    assert len(vrp.neighbour_lists(dist)) == 3000
@@ -0,0 +1,86 @@
+'''
+Streaming, content-addressed storage for uploaded book images
+
+Uploads are read in chunks. Each chunk is hashed and written in the
+threadpool, so the event loop never blocks on disk. Writes go to a temporary
+file that is renamed into place as static/<sha256><ext>, so identical images
+are stored once and readers never see a partial file. Oversized uploads are
+rejected as soon as they cross the limit.
+'''
+import hashlib
+import os
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+# ------------------ CONFIG ------------------
+UPLOAD_DIR = "static"
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+CHUNK_SIZE = 1024 * 1024
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".heic", ".heif", ".tif", ".tiff"}
+# --------------------------------------------
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def _extension(filename):
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if extension in IMAGE_EXTENSIONS else ""
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _commit(tmp_path, final_path):
+    if os.path.exists(final_path):
+        os.remove(tmp_path)  # same content already stored
+    else:
+        os.replace(tmp_path, final_path)
+
+async def save_upload(upload, upload_dir=UPLOAD_DIR, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Streams an UploadFile to disk. Returns (file_path, sha256 hex digest).
+    Raises UploadTooLarge past max_bytes.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(f"{upload.filename} is larger than {max_bytes} bytes")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    tmp_path = os.path.join(upload_dir, f".upload-{uuid.uuid4().hex}.tmp")
+    sha = hashlib.sha256()
+    size = 0
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"{upload.filename} is larger than {max_bytes} bytes")
+            sha.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+        await run_in_threadpool(f.close)
+    except BaseException:
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(_discard, tmp_path)
+        raise
+
+    digest = sha.hexdigest()
+    final_path = os.path.join(upload_dir, f"{digest}{_extension(upload.filename)}")
+    await run_in_threadpool(_commit, tmp_path, final_path)
+    return final_path, digest
+
+def delete_image(img, upload_dir=UPLOAD_DIR):
+    """
+    Removes the stored file behind a catalog img URL ("/static/<name>").
+    Returns True if a file was removed.
+    """
+    path = os.path.join(upload_dir, os.path.basename(img or ""))
+    if not os.path.basename(path) or not os.path.isfile(path):
+        return False
+    _discard(path)
+    return True
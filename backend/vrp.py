@@ -0,0 +1,275 @@
+'''
+Capacitated vehicle routing over one shared cost matrix
+
+Clarke-Wright savings builds closed depot -> stops -> depot tours that keep
+each truck within its capacity and a maximum route length. Inter-route
+relocate and exchange moves, plus 2-opt inside each tour, then shorten the
+plan until no move helps or the deadline passes. Index 0 of the matrix is the
+depot. Savings pairs and moves are limited to each stop's NEIGHBOURS nearest
+stops, so both stages stay close to linear in the number of stops. The
+deadline covers construction too: once it passes, the stops not yet merged
+keep a route of their own.
+
+Costs are treated as symmetric; an asymmetric travel-time matrix is averaged
+with its transpose first.
+'''
+import time
+from collections import deque
+
+import numpy as np
+
+import routing
+
+# ------------------ CONFIG ------------------
+NEIGHBOURS = 40               # Nearest stops considered for savings and moves
+MAX_PASSES = 50               # Local search passes at most, with or without a deadline
+IMPROVEMENT_EPS = 1e-9        # Ignore moves that gain less than this (float noise)
+NEIGHBOUR_BLOCK = 1024        # Matrix rows ranked, or savings tried, between deadline checks
+# --------------------------------------------
+
+def route_length(route, dist):
+    """
+    Cost of the round trip depot -> route -> depot.
+    """
+    if not len(route):
+        return 0.0
+    route = np.asarray(route, dtype=np.intp)
+    return float(dist[0, route[0]] + dist[route[:-1], route[1:]].sum() + dist[route[-1], 0])
+
+def neighbour_lists(dist, k=NEIGHBOURS, deadline=None):
+    """
+    (n, k) array; row i - 1 holds the k stops closest to stop i, as matrix indices.
+    Rows not ranked before time.perf_counter() passes deadline are left off,
+    so the array can be shorter than n.
+    """
+    n = len(dist) - 1
+    k = min(k, n - 1)
+    if k <= 0:
+        return np.empty((n, 0), dtype=np.intp)
+    near = np.empty((n, k), dtype=np.intp)
+    deadline = np.inf if deadline is None else deadline
+    for start in range(0, n, NEIGHBOUR_BLOCK):
+        if time.perf_counter() >= deadline:
+            return near[:start]
+        rows = np.array(dist[start + 1:start + 1 + NEIGHBOUR_BLOCK, 1:], dtype=float)
+        rows[np.arange(len(rows)), np.arange(start, start + len(rows))] = np.inf
+        near[start:start + len(rows)] = np.argpartition(rows, k - 1, axis=1)[:, :k] + 1
+    return near
+
+def clarke_wright(dist, demand, capacity=np.inf, max_length=np.inf, neighbours=None, deadline=None):
+    """
+    Parallel savings construction. demand[i] is the load of stop i (demand[0] is ignored).
+    Returns a list of routes, each a list of stop indices without the depot.
+    A stop that alone exceeds the capacity or the length limit gets a route of its own,
+    as does every stop not merged by the time time.perf_counter() passes deadline.
+    """
+    n = len(dist) - 1
+    if n == 0:
+        return []
+    deadline = np.inf if deadline is None else deadline
+    if neighbours is None:
+        neighbours = neighbour_lists(dist, deadline=deadline)
+    first = np.repeat(np.arange(1, len(neighbours) + 1), neighbours.shape[1])
+    second = neighbours.ravel()
+    pairs = np.unique(np.minimum(first, second) * (n + 1) + np.maximum(first, second))
+    a, b = pairs // (n + 1), pairs % (n + 1)
+    savings = dist[0, a] + dist[0, b] - dist[a, b]
+    order = np.argsort(-savings, kind='stable')
+    order = order[savings[order] > IMPROVEMENT_EPS]
+
+    routes = {stop: deque([stop]) for stop in range(1, n + 1)}
+    route_of = np.arange(n + 1)
+    load = np.asarray(demand, dtype=float).copy()
+    length = dist[0, :] + dist[:, 0]
+    for count, (i, j, saving) in enumerate(zip(a[order].tolist(), b[order].tolist(), savings[order].tolist())):
+        if count % NEIGHBOUR_BLOCK == 0 and time.perf_counter() >= deadline:
+            break
+        ri, rj = route_of[i], route_of[j]
+        if ri == rj:
+            continue
+        A, B = routes[ri], routes[rj]
+        if i not in (A[0], A[-1]) or j not in (B[0], B[-1]):
+            continue
+        if load[ri] + load[rj] > capacity or length[ri] + length[rj] - saving > max_length:
+            continue
+        if len(A) < len(B):  # relabel the shorter route only
+            i, j, ri, rj, A, B = j, i, rj, ri, B, A
+        if B[0] != j:
+            B.reverse()
+        if A[-1] == i:
+            A.extend(B)
+        else:
+            A.extendleft(B)  # extendleft reverses B, so j ends up next to i
+        for stop in B:
+            route_of[stop] = ri
+        load[ri] += load[rj]
+        length[ri] += length[rj] - saving
+        del routes[rj]
+    return [list(route) for route in routes.values()]
+
+
+def two_opt(route, dist, deadline=None, symmetric=None):
+    """
+    2-opt inside one closed tour; the depot stays at both ends.
+    Pass symmetric when already known; otherwise dist is checked.
+    Returns (route, improved).
+    """
+    if len(route) < 3:
+        return list(route), False
+    deadline = np.inf if deadline is None else deadline
+    if symmetric is None:
+        symmetric = routing.is_symmetric(dist)
+    tour = np.array([0] + list(route) + [0], dtype=np.intp)
+    m = len(tour)
+    improved = False
+    changed = True
+    while changed and time.perf_counter() < deadline:
+        changed = False
+        for i in range(1, m - 2):
+            a, b = tour[i - 1], tour[i]
+            c, e = tour[i + 1:m - 1], tour[i + 2:m]
+            delta = dist[a, c] + dist[b, e] - dist[a, b] - dist[c, e]
+            if not symmetric:
+                delta += routing.reversal_costs(dist, tour[i:m - 1])
+            k = int(np.argmin(delta))
+            if delta[k] < -IMPROVEMENT_EPS:
+                j = i + 1 + k
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                changed = improved = True
+    return tour[1:-1].tolist(), improved
+
+
+class _Plan:
+    """
+    Routes with per-stop predecessor, successor and route lookups kept in
+    arrays, so candidate moves for a stop are scored in one vectorized step.
+    """
+    def __init__(self, routes, dist, demand, capacity, max_length):
+        self.routes = [list(route) for route in routes]
+        self.dist = dist
+        self.demand = demand
+        self.capacity = capacity
+        self.max_length = max_length
+        n = len(dist)
+        self.pred = np.zeros(n, dtype=np.intp)
+        self.succ = np.zeros(n, dtype=np.intp)
+        self.route_of = np.full(n, -1, dtype=np.intp)
+        self.load = np.zeros(len(self.routes))
+        self.length = np.zeros(len(self.routes))
+        for r in range(len(self.routes)):
+            self._refresh(r)
+
+    def _refresh(self, r):
+        route = self.routes[r]
+        self.load[r] = self.demand[route].sum() if route else 0.0
+        self.length[r] = route_length(route, self.dist)
+        if route:
+            self.pred[route] = [0] + route[:-1]
+            self.succ[route] = route[1:] + [0]
+            self.route_of[route] = r
+
+    def relocate(self, u, candidates):
+        # Move u next to the best candidate stop in another route
+        d, r = self.dist, self.route_of[u]
+        p, q = self.pred[u], self.succ[u]
+        removal_gain = d[p, u] + d[u, q] - d[p, q]
+        s = self.route_of[candidates]
+        feasible = (s != r) & (self.load[s] + self.demand[u] <= self.capacity)
+        if not feasible.any():
+            return False
+        v, s = candidates[feasible], s[feasible]
+        before = self.pred[v]
+        after = self.succ[v]
+        cost_before = d[before, u] + d[u, v] - d[before, v]
+        cost_after = d[v, u] + d[u, after] - d[v, after]
+        cost = np.minimum(cost_before, cost_after)
+        cost[self.length[s] + cost > self.max_length] = np.inf
+        k = int(np.argmin(cost))
+        if cost[k] - removal_gain >= -IMPROVEMENT_EPS:
+            return False
+        target, anchor = int(s[k]), int(v[k])
+        self.routes[r].remove(u)
+        position = self.routes[target].index(anchor) + (0 if cost_before[k] <= cost_after[k] else 1)
+        self.routes[target].insert(position, u)
+        self._refresh(r)
+        self._refresh(target)
+        return True
+
+    def exchange(self, u, candidates):
+        # Swap u with the best candidate stop in another route
+        d, r = self.dist, self.route_of[u]
+        s = self.route_of[candidates]
+        v = candidates[s != r]
+        if not len(v):
+            return False
+        s = self.route_of[v]
+        pu, su, pv, sv = self.pred[u], self.succ[u], self.pred[v], self.succ[v]
+        delta_r = d[pu, v] + d[v, su] - d[pu, u] - d[u, su]
+        delta_s = d[pv, u] + d[u, sv] - d[pv, v] - d[v, sv]
+        feasible = ((self.load[r] - self.demand[u] + self.demand[v] <= self.capacity)
+                    & (self.load[s] - self.demand[v] + self.demand[u] <= self.capacity)
+                    & (self.length[r] + delta_r <= self.max_length)
+                    & (self.length[s] + delta_s <= self.max_length))
+        delta = np.where(feasible, delta_r + delta_s, np.inf)
+        k = int(np.argmin(delta))
+        if delta[k] >= -IMPROVEMENT_EPS:
+            return False
+        other, target = int(v[k]), int(s[k])
+        self.routes[r][self.routes[r].index(u)] = other
+        self.routes[target][self.routes[target].index(other)] = u
+        self._refresh(r)
+        self._refresh(target)
+        return True
+
+    def two_opt(self, r, deadline):
+        route, improved = two_opt(self.routes[r], self.dist, deadline, symmetric=True)  # solve() symmetrises
+        if improved:
+            self.routes[r] = route
+            self._refresh(r)
+        return improved
+
+
+def improve(routes, dist, demand, capacity=np.inf, max_length=np.inf, deadline=None, neighbours=None, max_passes=MAX_PASSES):
+    """
+    Relocate, exchange and 2-opt moves until none improves, max_passes runs out
+    or time.perf_counter() passes deadline. Only improving, feasible moves are
+    applied. Routes emptied by relocation are dropped.
+    """
+    deadline = np.inf if deadline is None else deadline
+    if neighbours is None:
+        neighbours = neighbour_lists(dist)
+    plan = _Plan(routes, dist, np.asarray(demand, dtype=float), capacity, max_length)
+    stops = [stop for route in plan.routes for stop in route]
+    for _ in range(max_passes):
+        improved = False
+        for r in range(len(plan.routes)):
+            improved = plan.two_opt(r, deadline) or improved
+        for u in stops:
+            if time.perf_counter() >= deadline:
+                break
+            moved = plan.relocate(u, neighbours[u - 1])
+            improved = plan.exchange(u, neighbours[u - 1]) or moved or improved
+        if not improved or time.perf_counter() >= deadline:
+            break
+    return [route for route in plan.routes if route]
+
+def solve(dist, demand=None, capacity=None, max_length=None, deadline=None, max_passes=MAX_PASSES):
+    """
+    Capacitated routes from the depot at index 0 of dist.
+    demand defaults to one unit per stop; capacity and max_length to no limit.
+    The deadline bounds construction as well as improvement.
+    Returns a list of routes, each a list of stop indices into dist.
+    """
+    dist = np.asarray(dist, dtype=float)
+    if not np.allclose(dist, dist.T):
+        dist = (dist + dist.T) / 2
+    n = len(dist) - 1
+    demand = np.ones(n + 1) if demand is None else np.array(demand, dtype=float)
+    demand[0] = 0.0
+    capacity = np.inf if not capacity else capacity
+    max_length = np.inf if not max_length else max_length
+    neighbours = neighbour_lists(dist, deadline=deadline)
+    routes = clarke_wright(dist, demand, capacity, max_length, neighbours, deadline)
+    if len(neighbours) < n:
+        return routes  # the deadline passed while ranking neighbours
+    return improve(routes, dist, demand, capacity, max_length, deadline, neighbours, max_passes)
@@ -24,6 +24,7 @@ interface BookPageProps {
 
 export default function BookPage({ params }: BookPageProps) {
   const { name } = use(params);
+  const title = decodeURIComponent(name);
   const [book, setBook] = useState<Book | null>(null);
   const [quantity, setQuantity] = useState(1);
   const [isLoading, setIsLoading] = useState(true);
@@ -35,14 +36,14 @@ export default function BookPage({ params }: BookPageProps) {
     const fetchBook = async () => {
       try {
         const response = await fetch(
-          `${process.env.NEXT_PUBLIC_BACKEND_URL}/books`
+          `${process.env.NEXT_PUBLIC_BACKEND_URL}/books?name=${encodeURIComponent(title)}`
         );
         if (!response.ok) {
           throw new Error("Failed to fetch books");
         }
         const data = await response.json();
         const foundBook = data.books.find(
-          (b: Book) => b.name === decodeURIComponent(name)
+          (b: Book) => b.name === title
         );
         if (!foundBook) {
           throw new Error("Book not found");
@@ -56,7 +57,7 @@ export default function BookPage({ params }: BookPageProps) {
     };
 
     fetchBook();
-  }, [name]);
+  }, [title]);
 
   if (isLoading) {
     return (
@@ -18,47 +18,72 @@ interface Book {
 
 interface BooksResponse {
   books: Book[];
+  next_cursor: string | null;
+}
+
+function booksUrl(
+  searchQuery: string,
+  selectedDamages: number[],
+  cursor: string | null
+) {
+  const params = new URLSearchParams();
+  if (searchQuery.trim()) {
+    params.set("q", searchQuery.trim());
+  }
+  selectedDamages.forEach((damage) =>
+    params.append("damage_level", String(damage))
+  );
+  if (cursor) {
+    params.set("cursor", cursor);
+  }
+  return `${process.env.NEXT_PUBLIC_BACKEND_URL}/books?${params.toString()}`;
 }
 
 export default function Home() {
   const [searchQuery, setSearchQuery] = useState("");
   const [selectedDamages, setSelectedDamages] = useState<number[]>([]);
   const [books, setBooks] = useState<Book[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
+  const fetchBooks = async (cursor: string | null) => {
+    const response = await fetch(
+      booksUrl(searchQuery, selectedDamages, cursor)
+    );
+    if (!response.ok) {
+      throw new Error("Failed to fetch books");
+    }
+    const data: BooksResponse = await response.json();
+    setBooks((previous) =>
+      cursor ? [...previous, ...data.books] : data.books
+    );
+    setNextCursor(data.next_cursor);
+  };
+
+  // Filtering happens on the server; debounce typing before refetching
   useEffect(() => {
-    const fetchBooks = async () => {
+    const timeout = setTimeout(async () => {
       try {
-        const response = await fetch(
-          `${process.env.NEXT_PUBLIC_BACKEND_URL}/books`
-        );
-        if (!response.ok) {
-          throw new Error("Failed to fetch books");
-        }
-        const data: BooksResponse = await response.json();
-        setBooks(data.books);
+        await fetchBooks(null);
+        setError(null);
       } catch (err) {
         setError(err instanceof Error ? err.message : "An error occurred");
       } finally {
         setIsLoading(false);
       }
-    };
-
-    fetchBooks();
-  }, []);
-
-  const filteredBooks = books.filter((book) => {
-    const matchesSearch =
-      book.name.toLowerCase().includes(searchQuery.toLowerCase()) ||
-      book.author.toLowerCase().includes(searchQuery.toLowerCase());
-
-    const matchesDamage =
-      selectedDamages.length === 0 ||
-      selectedDamages.includes(book["damage-level"]);
+    }, 250);
+    return () => clearTimeout(timeout);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [searchQuery, selectedDamages]);
 
-    return matchesSearch && matchesDamage;
-  });
+  const loadMore = async () => {
+    try {
+      await fetchBooks(nextCursor);
+    } catch (err) {
+      setError(err instanceof Error ? err.message : "An error occurred");
+    }
+  };
 
   if (isLoading) {
     return (
@@ -91,7 +116,7 @@ export default function Home() {
       </header>
 
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-        {filteredBooks.map((book) => (
+        {books.map((book) => (
           <BookCard
             key={book.name}
             title={book.name}
@@ -104,7 +129,18 @@ export default function Home() {
         ))}
       </div>
 
-      {filteredBooks.length === 0 && (
+      {nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            onClick={loadMore}
+            className="px-4 py-2 rounded-lg bg-white border border-gray-300 text-gray-700 hover:bg-gray-50"
+          >
+            Load more
+          </button>
+        </div>
+      )}
+
+      {books.length === 0 && (
         <div className="text-gray-700 text-center mt-8">
           No books found matching your criteria
         </div>
@@ -30,8 +30,29 @@ interface RouteReport {
   routes: Route[];
 }
 
+async function waitForRouteJob(jobId: string) {
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    const response = await fetch(
+      `${process.env.NEXT_PUBLIC_BACKEND_URL}/routes/jobs/${jobId}`
+    );
+    if (!response.ok) {
+      throw new Error("Failed to generate routes");
+    }
+    const job = await response.json();
+    if (job.status === "done") {
+      return job.result;
+    }
+    if (job.status === "failed") {
+      throw new Error(job.error || "Failed to generate routes");
+    }
+  }
+}
+
 export default function OrdersPage() {
-  const [mode, setMode] = useState<"known" | "unknown">("unknown");
+  const [mode, setMode] = useState<"known" | "unknown" | "capacitated">(
+    "unknown"
+  );
   const [numTrucks, setNumTrucks] = useState("3");
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -49,8 +70,15 @@ export default function OrdersPage() {
       setRoutesImage(null);
 
       const formData = new FormData();
-      formData.append("mode", mode === "known" ? "supervised" : "unsupervised");
-      formData.append("num_trucks", mode === "known" ? numTrucks : "0");
+      formData.append(
+        "mode",
+        mode === "known"
+          ? "supervised"
+          : mode === "capacitated"
+          ? "capacitated"
+          : "unsupervised"
+      );
+      formData.append("num_trucks", mode === "unknown" ? "0" : numTrucks);
 
       const response = await fetch(
         `${process.env.NEXT_PUBLIC_BACKEND_URL}/routes`,
@@ -64,7 +92,11 @@ export default function OrdersPage() {
         throw new Error("Failed to generate routes");
       }
 
-      const data = await response.json();
+      let data = await response.json();
+      // Large inputs are solved as a background job; poll until it finishes
+      if (response.status === 202 && data.job_id) {
+        data = await waitForRouteJob(data.job_id);
+      }
       const timestamp = new Date().getTime();
       setRoutesImage(
         `${process.env.NEXT_PUBLIC_BACKEND_URL}${data.plot}?t=${timestamp}`
@@ -118,10 +150,21 @@ export default function OrdersPage() {
               >
                 Unknown
               </button>
+              <button
+                type="button"
+                onClick={() => setMode("capacitated")}
+                className={`px-4 py-2 rounded-lg ${
+                  mode === "capacitated"
+                    ? "bg-blue-600 text-white"
+                    : "bg-white text-gray-700 border border-gray-300"
+                }`}
+              >
+                Balanced
+              </button>
             </div>
           </div>
 
-          {mode === "known" && (
+          {mode !== "unknown" && (
             <div className="space-y-4">
               <div className="flex justify-between items-center">
                 <label
@@ -208,7 +251,7 @@ export default function OrdersPage() {
                       <p className="text-sm text-gray-600">
                         Total Distance:{" "}
                         <span className="font-medium">
-                          {route.total_distance.toFixed(3)} units
+                          {route.total_distance.toFixed(3)} km
                         </span>
                       </p>
                       {route.surcharge_total > 0 && (